@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Génération en masse (jobs de nuit) sur les endpoints vLLM du modèle Llama-3.2-1B-Instruct
+
+Lit un JSONL de prompts ({"id", "prompt"} → /v1/completions) ou de conversations
+({"id", "messages"} → /v1/chat/completions) et les envoie avec une concurrence
+adaptative (AIMD):
+  - augmentation additive tant que la latence par token reste proche de la meilleure observée
+  - diminution multiplicative sur 429/503 ou quand la latence par token dérive (file d'attente vLLM)
+
+Les requêtes rejetées (429/503) ou en erreur transitoire sont réessayées avec
+backoff exponentiel (Retry-After respecté). Chaque résultat est ajouté au JSONL
+de sortie dès sa réception: relancer la même commande reprend le job en
+ignorant les id déjà réussis.
+
+Exemple:
+  python3 llama_bulk.py --input prompts.jsonl --output resultats.jsonl --max-concurrency 128
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import aiohttp
+
+from llama_client import (
+    build_endpoints,
+    chat_payload,
+    completion_payload,
+    format_ms,
+    get_model_url,
+    summarize_latencies,
+)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+OVERLOAD_STATUS = {429, 503}
+
+
+class AdaptiveLimiter:
+    """Limite de requêtes en vol ajustée en AIMD"""
+
+    def __init__(self, initial=8, minimum=1, maximum=256, latency_tolerance=2.0, decrease_factor=0.7):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.best_latency = None
+        self.smoothed_latency = None
+        self.request_latency = None
+        self.last_decrease = 0.0
+        self.decreases = 0
+        self.history = []
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def _decrease(self, reason):
+        # Une seule diminution par fenêtre d'environ une latence de requête
+        now = time.perf_counter()
+        window = self.request_latency or 1.0
+        if now - self.last_decrease < window:
+            return
+        self.last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+        self.decreases += 1
+        self.history.append((round(now, 3), round(self.limit, 2), reason))
+
+    async def on_success(self, latency, completion_tokens=None):
+        """Ajuste la limite après une réponse réussie (dérive jugée sur la latence par token généré)"""
+        async with self.condition:
+            self.request_latency = latency if self.request_latency is None else 0.8 * self.request_latency + 0.2 * latency
+            if completion_tokens:
+                latency_per_token = latency / completion_tokens
+                self.best_latency = min(self.best_latency or latency_per_token, latency_per_token)
+                self.smoothed_latency = (latency_per_token if self.smoothed_latency is None
+                                         else 0.8 * self.smoothed_latency + 0.2 * latency_per_token)
+                if self.smoothed_latency > self.best_latency * self.latency_tolerance:
+                    self._decrease("latence")
+                    return
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+    async def on_overload(self, status):
+        async with self.condition:
+            self._decrease(f"HTTP {status}")
+
+
+def read_jobs(path, done_ids):
+    """Itère sur les lignes du JSONL d'entrée qui restent à traiter"""
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            job.setdefault("id", str(number))
+            if str(job["id"]) not in done_ids:
+                yield job
+
+
+def load_done_ids(path):
+    """Id déjà traités avec succès dans le JSONL de sortie (reprise)"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # ligne illisible (sortie d'une version antérieure)
+            if row.get("error") is None:
+                done.add(str(row["id"]))
+    return done
+
+
+def truncate_partial_line(path, block_size=65536):
+    """Coupe la sortie après son dernier saut de ligne (ligne tronquée par un arrêt brutal)
+
+    Sans cela, la première ligne ajoutée à la reprise serait collée au fragment
+    et deviendrait illisible à la reprise suivante. Retourne le nombre d'octets retirés.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r+b") as f:
+        size = end = f.seek(0, os.SEEK_END)
+        keep = 0
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            end = start
+        if keep < size:
+            f.truncate(keep)
+    return size - keep
+
+
+def job_request(job, endpoints, max_tokens, temperature):
+    """(url, payload, endpoint) pour une ligne du JSONL"""
+    max_tokens = job.get("max_tokens", max_tokens)
+    temperature = job.get("temperature", temperature)
+    if "messages" in job:
+        return endpoints["chat"], chat_payload(job["messages"], max_tokens=max_tokens, temperature=temperature), "chat"
+    return endpoints["completion"], completion_payload(job["prompt"], max_tokens=max_tokens, temperature=temperature), "completion"
+
+
+def response_text(body, endpoint):
+    choice = (body.get("choices") or [{}])[0]
+    if endpoint == "chat":
+        return (choice.get("message") or {}).get("content", "")
+    return choice.get("text", "")
+
+
+def retry_delay(attempt, response=None, base=0.5, cap=30.0):
+    """Backoff exponentiel avec jitter, ou Retry-After si le serveur l'indique"""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def process_job(session, limiter, job, endpoints, args, stats):
+    """Envoie une ligne (avec réessais) et retourne la ligne de résultat"""
+    url, payload, endpoint = job_request(job, endpoints, args.max_tokens, args.temperature)
+    result = {"id": job["id"], "endpoint": endpoint, "text": None, "usage": None,
+              "latency_s": None, "attempts": 0, "error": None}
+
+    for attempt in range(args.max_retries + 1):
+        result["attempts"] = attempt + 1
+        await limiter.acquire()
+        start = time.perf_counter()
+        response = None
+        try:
+            async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=args.timeout)) as response:
+                body = await response.read()
+                latency = time.perf_counter() - start
+                if response.status == 200:
+                    data = json.loads(body)
+                    result.update(text=response_text(data, endpoint), usage=data.get("usage"), latency_s=latency, error=None)
+                    await limiter.on_success(latency, (data.get("usage") or {}).get("completion_tokens"))
+                    return result
+                result["error"] = f"HTTP {response.status}: {body[:200].decode(errors='replace')}"
+                if response.status in OVERLOAD_STATUS:
+                    stats["overloads"] += 1
+                    await limiter.on_overload(response.status)
+                if response.status not in RETRYABLE_STATUS:
+                    return result
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            result["error"] = repr(e)
+        finally:
+            await limiter.release()
+
+        if attempt < args.max_retries:
+            stats["retries"] += 1
+            await asyncio.sleep(retry_delay(attempt, response))
+    return result
+
+
+async def run_bulk(model_url, args):
+    """Traite le JSONL d'entrée et retourne le résumé du job"""
+    endpoints = build_endpoints(model_url)
+    dropped = truncate_partial_line(args.output)
+    if dropped:
+        print(f"✂️  Reprise: dernière ligne tronquée de la sortie retirée ({dropped} octets)")
+    done_ids = load_done_ids(args.output)
+    limiter = AdaptiveLimiter(args.initial_concurrency, args.min_concurrency, args.max_concurrency, args.latency_tolerance)
+    stats = {"skipped": len(done_ids), "ok": 0, "errors": 0, "retries": 0, "overloads": 0,
+             "completion_tokens": 0, "latencies": []}
+    if done_ids:
+        print(f"⏭️  Reprise: {len(done_ids)} lignes déjà traitées ignorées")
+
+    connector = aiohttp.TCPConnector(limit=args.max_concurrency, keepalive_timeout=60)
+    start = time.perf_counter()
+    last_report = start
+    pending = set()
+
+    with open(args.output, "a") as out:
+        def write(result):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            if result["error"] is None:
+                stats["ok"] += 1
+                stats["latencies"].append(result["latency_s"])
+                stats["completion_tokens"] += (result["usage"] or {}).get("completion_tokens", 0)
+            else:
+                stats["errors"] += 1
+
+        async with aiohttp.ClientSession(connector=connector, headers={"Content-Type": "application/json"}) as session:
+            for number, job in enumerate(read_jobs(args.input, done_ids)):
+                if args.limit is not None and number >= args.limit:
+                    break
+                # Pas plus de lignes lues que de places disponibles (réessais compris)
+                while len(pending) >= int(limiter.limit):
+                    finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in finished:
+                        write(task.result())
+                pending.add(asyncio.ensure_future(process_job(session, limiter, job, endpoints, args, stats)))
+
+                now = time.perf_counter()
+                if now - last_report >= args.progress_interval:
+                    last_report = now
+                    print(f"⏳ {stats['ok']} ok, {stats['errors']} erreurs | {stats['ok'] / (now - start):.1f} req/s "
+                          f"| concurrence {int(limiter.limit)} ({limiter.in_flight} en vol)")
+
+            for task in asyncio.as_completed(pending):
+                write(await task)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "input": args.input,
+        "output": args.output,
+        "skipped": stats["skipped"],
+        "ok": stats["ok"],
+        "errors": stats["errors"],
+        "retries": stats["retries"],
+        "overloads": stats["overloads"],
+        "duration_s": elapsed,
+        "throughput_rps": stats["ok"] / elapsed if elapsed else 0.0,
+        "output_tokens_per_s": stats["completion_tokens"] / elapsed if elapsed else 0.0,
+        "latency_s": summarize_latencies(stats["latencies"]),
+        "final_concurrency": int(limiter.limit),
+        "concurrency_decreases": limiter.decreases,
+        "concurrency_history": limiter.history,
+    }
+
+
+def print_bulk_summary(summary):
+    latency = summary["latency_s"]
+    print("\n" + "=" * 60)
+    print("📦 RÉSULTATS DU JOB DE GÉNÉRATION")
+    print("=" * 60)
+    print(f"✅ {summary['ok']} réussies, ❌ {summary['errors']} en échec, ⏭️  {summary['skipped']} déjà traitées")
+    print(f"🔁 {summary['retries']} réessais dont {summary['overloads']} rejets 429/503")
+    print(f"🚀 Débit: {summary['throughput_rps']:.2f} req/s, {summary['output_tokens_per_s']:.1f} tokens générés/s "
+          f"en {summary['duration_s']:.1f} s")
+    print(f"⏳ Latence p50: {format_ms(latency['p50'])} | p95: {format_ms(latency['p95'])} | p99: {format_ms(latency['p99'])}")
+    print(f"🎚️  Concurrence finale: {summary['final_concurrency']} ({summary['concurrency_decreases']} diminutions)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génération en masse à partir d'un JSONL de prompts")
+    parser.add_argument("--url", default=None, help="URL de base du modèle (défaut: LLAMA_MODEL_URL ou route OpenShift)")
+    parser.add_argument("--input", required=True, help="JSONL d'entrée ({id, prompt} ou {id, messages})")
+    parser.add_argument("--output", required=True, help="JSONL de sortie (reprise si le fichier existe)")
+    parser.add_argument("--max-tokens", type=int, default=256, help="max_tokens par défaut")
+    parser.add_argument("--temperature", type=float, default=0.7, help="Température par défaut")
+    parser.add_argument("--initial-concurrency", type=int, default=8, help="Requêtes en vol au démarrage")
+    parser.add_argument("--min-concurrency", type=int, default=1, help="Requêtes en vol minimum")
+    parser.add_argument("--max-concurrency", type=int, default=128, help="Requêtes en vol maximum")
+    parser.add_argument("--latency-tolerance", type=float, default=2.0,
+                        help="Dérive tolérée de la latence par token avant de réduire la concurrence")
+    parser.add_argument("--max-retries", type=int, default=5, help="Réessais par ligne (429/503/5xx, erreurs réseau)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Timeout par requête (s)")
+    parser.add_argument("--limit", type=int, default=None, help="Nombre maximum de lignes à traiter")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Intervalle d'affichage de la progression (s)")
+    parser.add_argument("--json", default=None, help="Fichier JSON du résumé")
+    args = parser.parse_args()
+
+    model_url = get_model_url(args.url)
+    if not model_url:
+        print("❌ Aucune URL de modèle: utilisez --url, LLAMA_MODEL_URL ou OPENSHIFT_CLUSTER_DOMAIN")
+        sys.exit(1)
+
+    print(f"📦 Job {args.input} → {args.output} sur {model_url}")
+    summary = asyncio.run(run_bulk(model_url, args))
+    print_bulk_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"💾 Résumé écrit dans {args.json}")
+    sys.exit(0 if summary["errors"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Client partagé pour les endpoints OpenAI-compatibles du modèle Llama-3.2-1B-Instruct
+(construction des URLs, payloads de test, streaming SSE, session HTTP partagée
+et statistiques de latence)
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+MODEL_NAME = os.getenv("MODEL_NAME", "llama-32-1b-instruct")
+
+DEFAULT_SYSTEM_PROMPT = "Tu es un assistant IA utile et amical. Réponds en français de manière claire et concise."
+DEFAULT_CHAT_QUESTION = "Salut ! Peux-tu me dire en quoi consiste le modèle Llama-3.2-1B-Instruct ?"
+DEFAULT_COMPLETION_PROMPT = "Explique-moi ce qu'est l'intelligence artificielle en 2 phrases:"
+
+
+def get_model_url(url=None):
+    """URL de base du modèle: argument, LLAMA_MODEL_URL, ou route OpenShift de l'InferenceService"""
+    url = url or os.getenv("LLAMA_MODEL_URL")
+    if url:
+        return url.rstrip("/")
+
+    project = os.getenv("OPENSHIFT_PROJECT", "llama-instruct-32-1b-demo")
+    domain = os.getenv("OPENSHIFT_CLUSTER_DOMAIN")
+    if not domain:
+        return None
+    return f"https://llama-32-1b-instruct-{project}.apps.{domain}"
+
+
+def build_endpoints(model_url):
+    """Endpoints OpenAI-compatibles exposés par vLLM pour une URL de base"""
+    return {
+        "models": f"{model_url}/v1/models",
+        "chat": f"{model_url}/v1/chat/completions",
+        "completion": f"{model_url}/v1/completions",
+    }
+
+
+def chat_payload(messages=None, max_tokens=200, temperature=0.7, stream=False, model=MODEL_NAME):
+    """Payload /v1/chat/completions (par défaut la question de test en français)"""
+    if messages is None:
+        messages = [
+            {"role": "system", "content": DEFAULT_SYSTEM_PROMPT},
+            {"role": "user", "content": DEFAULT_CHAT_QUESTION},
+        ]
+    return {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": stream,
+    }
+
+
+def completion_payload(prompt=DEFAULT_COMPLETION_PROMPT, max_tokens=100, temperature=0.5, stream=False, model=MODEL_NAME):
+    """Payload /v1/completions (format legacy)"""
+    return {
+        "model": model,
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": stream,
+    }
+
+
+def percentile(values, pct):
+    """Percentile par interpolation linéaire (None si aucune valeur)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return ordered[low]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize_latencies(values):
+    """Résumé p50/p95/p99/moyenne/max d'une série de latences (en secondes)"""
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def format_ms(seconds):
+    """Formatage d'une durée en millisecondes pour l'affichage"""
+    if seconds is None:
+        return "N/A"
+    return f"{seconds * 1000:.1f} ms"
+
+
+def print_stream_summary(ttft, itl, decode_tps):
+    """Affichage TTFT / latence inter-token / débit de décodage (résumés de summarize_latencies)"""
+    print(f"⚡ TTFT p50: {format_ms(ttft['p50'])} | p95: {format_ms(ttft['p95'])} | p99: {format_ms(ttft['p99'])}")
+    print(f"⏱️  Inter-token p50: {format_ms(itl['p50'])} | p95: {format_ms(itl['p95'])} | p99: {format_ms(itl['p99'])}")
+    if decode_tps["p50"] is not None:
+        print(f"🔁 Décodage p50: {decode_tps['p50']:.1f} tokens/s")
+
+
+# Buckets (ms) de l'histogramme de latence inter-token
+ITL_BUCKETS_MS = [5, 10, 20, 30, 50, 75, 100, 150, 250, 500, 1000]
+
+SSE_DONE = object()
+
+
+def parse_sse_line(line):
+    """Décode une ligne SSE "data: {...}" (None si ligne vide/commentaire, SSE_DONE pour [DONE])"""
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    line = line.strip()
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return SSE_DONE
+    return json.loads(data)
+
+
+def chunk_text(chunk):
+    """Texte porté par un chunk de streaming (chat: delta.content, completion: text)"""
+    choices = chunk.get("choices") or []
+    if not choices:
+        return ""
+    choice = choices[0]
+    if "delta" in choice:
+        return choice["delta"].get("content") or ""
+    return choice.get("text") or ""
+
+
+def stream_options(payload):
+    """Active stream=True et demande le champ usage dans le dernier chunk"""
+    payload = dict(payload)
+    payload["stream"] = True
+    payload["stream_options"] = {"include_usage": True}
+    return payload
+
+
+class StreamMetrics:
+    """Mesures TTFT / latence inter-token / débit de décodage d'une réponse en streaming"""
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.token_times = []
+        self.usage = {}
+        self.parts = []
+        self.end = None
+
+    def feed(self, chunk, now=None):
+        """Enregistre un chunk SSE décodé"""
+        now = time.perf_counter() if now is None else now
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        text = chunk_text(chunk)
+        if text:
+            self.token_times.append(now)
+            self.parts.append(text)
+
+    def finish(self, now=None):
+        self.end = time.perf_counter() if now is None else now
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    @property
+    def ttft(self):
+        """Délai jusqu'au premier token (s)"""
+        return self.token_times[0] - self.start if self.token_times else None
+
+    @property
+    def inter_token_latencies(self):
+        """Écarts successifs entre tokens reçus (s)"""
+        times = self.token_times
+        return [b - a for a, b in zip(times, times[1:])]
+
+    @property
+    def completion_tokens(self):
+        return self.usage.get("completion_tokens") or len(self.token_times)
+
+    @property
+    def decode_tokens_per_s(self):
+        """Débit de décodage après le premier token"""
+        if len(self.token_times) < 2:
+            return None
+        decode_time = self.token_times[-1] - self.token_times[0]
+        return (self.completion_tokens - 1) / decode_time if decode_time > 0 else None
+
+
+def latency_histogram(values, buckets_ms=ITL_BUCKETS_MS):
+    """Histogramme non cumulatif: nombre de valeurs (s) par bucket "<= N ms" (+ "> max")"""
+    counts = {f"<={b}ms": 0 for b in buckets_ms}
+    counts[f">{buckets_ms[-1]}ms"] = 0
+    for value in values:
+        ms = value * 1000
+        for bucket in buckets_ms:
+            if ms <= bucket:
+                counts[f"<={bucket}ms"] += 1
+                break
+        else:
+            counts[f">{buckets_ms[-1]}ms"] += 1
+    return counts
+
+
+class PooledHTTPClient:
+    """Session HTTP partagée: pool de connexions keep-alive, HTTP/2 optionnel (httpx)
+
+    Compte les connexions ouvertes et réutilisées et sépare les latences des requêtes
+    qui ont payé l'établissement TCP+TLS de celles servies sur une connexion existante.
+    """
+
+    def __init__(self, pool_size=10, http2=False, timeout=60, verify=True):
+        self.pool_size = pool_size
+        self.http2 = http2
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.requests_sent = 0
+        self.new_connections = 0
+        self.latency_new_connection = []
+        self.latency_reused = []
+        self._streams = set()
+
+        if http2:
+            try:
+                import httpx
+            except ImportError:
+                raise RuntimeError("HTTP/2 nécessite httpx: pip install 'httpx[http2]'")
+            self._client = httpx.Client(
+                http2=True,
+                timeout=timeout,
+                verify=verify,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                headers={"Content-Type": "application/json"},
+            )
+        else:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self._client = requests.Session()
+            self._client.verify = verify
+            self._client.headers.update({"Content-Type": "application/json", "Connection": "keep-alive"})
+            self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self._client.mount("http://", self._adapter)
+            self._client.mount("https://", self._adapter)
+
+    def _opened_connections(self):
+        """Nombre cumulé de connexions ouvertes par les pools urllib3"""
+        pools = self._adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in list(pools.keys()) if key in pools)
+
+    def _record(self, response, start, opened_before):
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.requests_sent += 1
+            if self.http2:
+                stream = response.extensions.get("network_stream")
+                new = stream is not None and stream not in self._streams
+                if new:
+                    self._streams.add(stream)
+            else:
+                new = self._opened_connections() > opened_before
+            if new:
+                self.new_connections += 1
+                self.latency_new_connection.append(elapsed)
+            else:
+                self.latency_reused.append(elapsed)
+
+    def _send(self, method, url, stream=False, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        opened_before = 0 if self.http2 else self._opened_connections()
+        start = time.perf_counter()
+        if self.http2:
+            if stream:
+                request = self._client.build_request(method, url, **kwargs)
+                response = self._client.send(request, stream=True)
+            else:
+                response = self._client.request(method, url, **kwargs)
+        else:
+            response = self._client.request(method, url, stream=stream, **kwargs)
+        self._record(response, start, opened_before)
+        return response
+
+    def get(self, url, **kwargs):
+        return self._send("GET", url, **kwargs)
+
+    def post(self, url, json=None, **kwargs):
+        return self._send("POST", url, json=json, **kwargs)
+
+    @contextmanager
+    def stream_post(self, url, json=None, **kwargs):
+        """POST en streaming: la réponse expose status_code, text et iter_lines()"""
+        response = self._send("POST", url, stream=True, json=json, **kwargs)
+        try:
+            if self.http2 and response.status_code != 200:
+                response.read()
+            yield response
+        finally:
+            response.close()
+
+    def connection_stats(self):
+        """Statistiques de réutilisation des connexions et latences associées"""
+        with self.lock:
+            reused = self.requests_sent - self.new_connections
+            return {
+                "protocol": "HTTP/2" if self.http2 else "HTTP/1.1",
+                "pool_size": self.pool_size,
+                "requests": self.requests_sent,
+                "new_connections": self.new_connections,
+                "reused_connections": reused,
+                "reuse_ratio": reused / self.requests_sent if self.requests_sent else 0.0,
+                "latency_new_connection_s": summarize_latencies(self.latency_new_connection),
+                "latency_reused_s": summarize_latencies(self.latency_reused),
+            }
+
+    def close(self):
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
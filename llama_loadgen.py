@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Générateur de charge asynchrone pour les endpoints vLLM du modèle Llama-3.2-1B-Instruct
+
+Deux modes:
+  - boucle fermée: N utilisateurs virtuels enchaînent les requêtes sans pause
+  - débit fixe:    arrivées à --rate req/s, au plus N requêtes en vol
+
+Avec --stream, les réponses sont lues en SSE et le rapport inclut TTFT,
+latence inter-token et débit de décodage.
+
+Exemple:
+  python3 llama_loadgen.py --url http://localhost:8000 --users 16 --duration 60
+  python3 llama_loadgen.py --endpoint completion --users 32 --rate 10 --json resultats.json
+  python3 llama_loadgen.py --stream --users 16 --duration 60
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+
+import aiohttp
+
+from llama_client import (
+    SSE_DONE,
+    StreamMetrics,
+    build_endpoints,
+    chat_payload,
+    completion_payload,
+    format_ms,
+    get_model_url,
+    latency_histogram,
+    parse_sse_line,
+    print_stream_summary,
+    stream_options,
+    summarize_latencies,
+)
+
+
+@dataclass
+class RequestRecord:
+    """Mesure d'une requête individuelle"""
+    start: float
+    latency: float
+    status: int
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    error: str = None
+    ttft: float = None
+    inter_token_latencies: list = None
+    decode_tokens_per_s: float = None
+
+
+@dataclass
+class LoadResult:
+    """Résultat agrégé d'une exécution de charge"""
+    endpoint: str
+    mode: str
+    users: int
+    rate: float
+    duration: float
+    stream: bool = False
+    records: list = field(default_factory=list)
+    connections: dict = None
+
+    @property
+    def ok_records(self):
+        return [r for r in self.records if r.error is None]
+
+    def summary(self):
+        """Débit (req/s, tokens générés/s) et percentiles de latence"""
+        ok = self.ok_records
+        completion_tokens = sum(r.completion_tokens for r in ok)
+        per_token = [r.latency / r.completion_tokens for r in ok if r.completion_tokens]
+        summary = {
+            "endpoint": self.endpoint,
+            "mode": self.mode,
+            "stream": self.stream,
+            "users": self.users,
+            "rate": self.rate,
+            "duration_s": self.duration,
+            "requests": len(self.records),
+            "errors": len(self.records) - len(ok),
+            "throughput_rps": len(ok) / self.duration if self.duration else 0.0,
+            "output_tokens_per_s": completion_tokens / self.duration if self.duration else 0.0,
+            "prompt_tokens": sum(r.prompt_tokens for r in ok),
+            "completion_tokens": completion_tokens,
+            "latency_s": summarize_latencies([r.latency for r in ok]),
+            "latency_per_output_token_s": summarize_latencies(per_token),
+            "connections": self.connections,
+        }
+        if self.stream:
+            itl = [gap for r in ok for gap in (r.inter_token_latencies or [])]
+            summary["ttft_s"] = summarize_latencies([r.ttft for r in ok if r.ttft is not None])
+            summary["inter_token_latency_s"] = summarize_latencies(itl)
+            summary["inter_token_latency_histogram"] = latency_histogram(itl)
+            summary["decode_tokens_per_s"] = summarize_latencies(
+                [r.decode_tokens_per_s for r in ok if r.decode_tokens_per_s is not None]
+            )
+        return summary
+
+
+def build_payload(endpoint, max_tokens, stream=False):
+    """Payload de test réutilisé depuis test-llama-model.py"""
+    if endpoint == "chat":
+        payload = chat_payload(max_tokens=max_tokens)
+    else:
+        payload = completion_payload(max_tokens=max_tokens)
+    return stream_options(payload) if stream else payload
+
+
+def choose_payload(payload):
+    """Payload unique, ou tirage dans une liste (mélange de tailles de prompt)"""
+    return random.choice(payload) if isinstance(payload, list) else payload
+
+
+async def send_request(session, url, payload, timeout):
+    """Envoie une requête non-streaming et relève la latence et le champ usage"""
+    start = time.perf_counter()
+    wall_start = time.time()
+    try:
+        async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            body = await response.read()
+            latency = time.perf_counter() - start
+            if response.status != 200:
+                return RequestRecord(wall_start, latency, response.status, error=body[:200].decode(errors="replace"))
+            usage = json.loads(body).get("usage") or {}
+            return RequestRecord(
+                wall_start,
+                latency,
+                response.status,
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+            )
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        return RequestRecord(wall_start, time.perf_counter() - start, 0, error=repr(e))
+
+
+async def send_stream_request(session, url, payload, timeout):
+    """Envoie une requête en streaming et lit les chunks SSE au fil de l'eau"""
+    start = time.perf_counter()
+    wall_start = time.time()
+    metrics = StreamMetrics(start)
+    try:
+        async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status != 200:
+                body = await response.read()
+                return RequestRecord(wall_start, time.perf_counter() - start, response.status,
+                                     error=body[:200].decode(errors="replace"))
+            async for line in response.content:
+                chunk = parse_sse_line(line)
+                if chunk is SSE_DONE:
+                    break
+                if chunk is not None:
+                    metrics.feed(chunk)
+            metrics.finish()
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        return RequestRecord(wall_start, time.perf_counter() - start, 0, error=repr(e))
+
+    return RequestRecord(
+        wall_start,
+        metrics.end - start,
+        200,
+        prompt_tokens=metrics.usage.get("prompt_tokens", 0),
+        completion_tokens=metrics.completion_tokens,
+        ttft=metrics.ttft,
+        inter_token_latencies=metrics.inter_token_latencies,
+        decode_tokens_per_s=metrics.decode_tokens_per_s,
+    )
+
+
+async def _closed_loop(send, session, url, payload, users, deadline, max_requests, timeout, records):
+    """N utilisateurs virtuels qui renvoient une requête dès la réponse reçue"""
+    issued = 0
+
+    async def user():
+        nonlocal issued
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            issued += 1
+            records.append(await send(session, url, choose_payload(payload), timeout))
+
+    await asyncio.gather(*(user() for _ in range(users)))
+
+
+async def _fixed_rate(send, session, url, payload, users, rate, deadline, max_requests, timeout, records, poisson):
+    """Arrivées à débit fixe, limitées à N requêtes simultanées"""
+    slots = asyncio.Semaphore(users)
+    tasks = []
+
+    async def one():
+        try:
+            records.append(await send(session, url, choose_payload(payload), timeout))
+        finally:
+            slots.release()
+
+    next_arrival = time.perf_counter()
+    while time.perf_counter() < deadline and (max_requests is None or len(tasks) < max_requests):
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await slots.acquire()
+        tasks.append(asyncio.ensure_future(one()))
+        next_arrival += random.expovariate(rate) if poisson else 1.0 / rate
+
+    await asyncio.gather(*tasks)
+
+
+def connection_tracer(stats):
+    """TraceConfig aiohttp qui compte les connexions ouvertes/réutilisées et leur temps d'établissement"""
+    async def on_create_start(session, context, params):
+        context.create_start = time.perf_counter()
+
+    async def on_create_end(session, context, params):
+        stats["new"] += 1
+        stats["setup_times"].append(time.perf_counter() - context.create_start)
+
+    async def on_reuse(session, context, params):
+        stats["reused"] += 1
+
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_create_start.append(on_create_start)
+    trace.on_connection_create_end.append(on_create_end)
+    trace.on_connection_reuseconn.append(on_reuse)
+    return trace
+
+
+async def run_load(model_url, endpoint="chat", users=8, duration=30.0, rate=None, max_requests=None,
+                   max_tokens=100, timeout=120.0, poisson=False, stream=False, pool_size=None, payload=None):
+    """Exécute une campagne de charge et retourne un LoadResult
+
+    `payload` remplace la requête de test: un dict, ou une liste dans laquelle
+    chaque requête est tirée au hasard.
+    """
+    url = build_endpoints(model_url)[endpoint]
+    if payload is None:
+        payload = build_payload(endpoint, max_tokens, stream)
+    send = send_stream_request if stream else send_request
+    records = []
+    conn_stats = {"new": 0, "reused": 0, "setup_times": []}
+
+    connector = aiohttp.TCPConnector(limit=pool_size or users, keepalive_timeout=60)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers={"Content-Type": "application/json"},
+        trace_configs=[connection_tracer(conn_stats)],
+    ) as session:
+        start = time.perf_counter()
+        deadline = start + duration
+        if rate:
+            await _fixed_rate(send, session, url, payload, users, rate, deadline, max_requests, timeout, records, poisson)
+        else:
+            await _closed_loop(send, session, url, payload, users, deadline, max_requests, timeout, records)
+        elapsed = time.perf_counter() - start
+
+    return LoadResult(
+        endpoint=endpoint,
+        mode="fixed-rate" if rate else "closed-loop",
+        users=users,
+        rate=rate,
+        duration=elapsed,
+        stream=stream,
+        records=records,
+        connections={
+            "pool_size": pool_size or users,
+            "new_connections": conn_stats["new"],
+            "reused_connections": conn_stats["reused"],
+            "setup_time_s": summarize_latencies(conn_stats["setup_times"]),
+        },
+    )
+
+
+def print_summary(summary):
+    """Affichage du rapport de charge"""
+    latency = summary["latency_s"]
+    print("\n" + "=" * 60)
+    print(f"📊 RÉSULTATS DE CHARGE ({summary['endpoint']}, {summary['mode']})")
+    print("=" * 60)
+    print(f"👥 Utilisateurs virtuels: {summary['users']}")
+    if summary["rate"]:
+        print(f"⏱️  Débit cible: {summary['rate']} req/s")
+    print(f"📤 Requêtes: {summary['requests']} ({summary['errors']} erreurs) en {summary['duration_s']:.1f} s")
+    print(f"🚀 Débit: {summary['throughput_rps']:.2f} req/s, {summary['output_tokens_per_s']:.1f} tokens générés/s")
+    print(f"⏳ Latence p50: {format_ms(latency['p50'])} | p95: {format_ms(latency['p95'])} | p99: {format_ms(latency['p99'])}")
+    per_token = summary["latency_per_output_token_s"]
+    print(f"🔤 Latence par token généré p50: {format_ms(per_token['p50'])} | p95: {format_ms(per_token['p95'])}")
+    connections = summary.get("connections")
+    if connections:
+        print(f"🔌 Connexions: {connections['new_connections']} ouvertes "
+              f"(établissement p50: {format_ms(connections['setup_time_s']['p50'])}), "
+              f"{connections['reused_connections']} réutilisées")
+    if summary.get("stream"):
+        print_stream_summary(summary["ttft_s"], summary["inter_token_latency_s"], summary["decode_tokens_per_s"])
+        print("📶 Histogramme inter-token:")
+        for bucket, count in summary["inter_token_latency_histogram"].items():
+            if count:
+                print(f"   {bucket:>8}: {count}")
+
+
+def add_load_arguments(parser):
+    """Options de charge partagées avec test-llama-model.py"""
+    parser.add_argument("--endpoint", choices=["chat", "completion"], default="chat", help="Endpoint ciblé")
+    parser.add_argument("--users", type=int, default=8, help="Nombre d'utilisateurs virtuels / requêtes simultanées")
+    parser.add_argument("--duration", type=float, default=30.0, help="Durée de la campagne (s)")
+    parser.add_argument("--rate", type=float, default=None, help="Débit fixe en req/s (défaut: boucle fermée)")
+    parser.add_argument("--poisson", action="store_true", help="Arrivées poissonniennes en mode débit fixe")
+    parser.add_argument("--requests", type=int, default=None, help="Nombre maximum de requêtes")
+    parser.add_argument("--max-tokens", type=int, default=100, help="max_tokens par requête")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout par requête (s)")
+    parser.add_argument("--stream", action="store_true", help="Réponses en streaming SSE (TTFT, latence inter-token)")
+    parser.add_argument("--pool-size", type=int, default=None, help="Taille du pool de connexions keep-alive (défaut: --users, 10 en mode test)")
+    parser.add_argument("--json", default=None, help="Fichier JSON de sortie (résumé + mesures)")
+
+
+def run_from_args(args, model_url):
+    """Lance la charge depuis des arguments argparse et affiche le rapport"""
+    print(f"🔥 Charge sur {model_url} ({args.endpoint}, {args.users} utilisateurs, {args.duration:.0f} s)")
+    result = asyncio.run(run_load(
+        model_url,
+        endpoint=args.endpoint,
+        users=args.users,
+        duration=args.duration,
+        rate=args.rate,
+        max_requests=args.requests,
+        max_tokens=args.max_tokens,
+        timeout=args.timeout,
+        poisson=args.poisson,
+        stream=args.stream,
+        pool_size=args.pool_size,
+    ))
+    summary = result.summary()
+    print_summary(summary)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "records": [asdict(r) for r in result.records]}, f, indent=2)
+        print(f"💾 Résultats écrits dans {args.json}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Générateur de charge pour le modèle Llama-3.2-1B-Instruct")
+    parser.add_argument("--url", default=None, help="URL de base du modèle (défaut: LLAMA_MODEL_URL ou route OpenShift)")
+    add_load_arguments(parser)
+    args = parser.parse_args()
+
+    model_url = get_model_url(args.url)
+    if not model_url:
+        print("❌ Aucune URL de modèle: utilisez --url, LLAMA_MODEL_URL ou OPENSHIFT_CLUSTER_DOMAIN")
+        sys.exit(1)
+
+    summary = run_from_args(args, model_url)
+    sys.exit(0 if summary["errors"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
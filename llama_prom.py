@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Relevé des métriques Prometheus de vLLM pendant un test de charge
+
+Le ServingRuntime expose /metrics (prometheus.io/port 8080). Pendant la charge
+de llama_loadgen.py, un thread relève à intervalle fixe la file d'attente,
+les requêtes en cours, l'occupation du KV cache et les compteurs de tokens.
+Les relevés sont horodatés avec la même horloge que les requêtes du client:
+le rapport découpe la campagne en fenêtres et met en regard latences
+(p50/p99) et état du serveur. Il compare aussi les requêtes servies pendant
+une saturation du KV cache aux autres.
+
+Exemples:
+  python3 llama_prom.py --stub --users 32 --duration 20 --stream
+  python3 llama_prom.py --url http://localhost:8000 --users 16 --duration 60 --record-metrics metrics.jsonl
+  python3 llama_prom.py --from-load resultats.json --from-metrics metrics.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict
+
+import requests
+
+from llama_client import format_ms, get_model_url, summarize_latencies
+from llama_loadgen import add_load_arguments, print_summary, run_load
+
+# Clé du rapport → noms possibles selon la version de vLLM
+VLLM_METRICS = {
+    "running": ("vllm:num_requests_running",),
+    "waiting": ("vllm:num_requests_waiting",),
+    "kv_cache_usage": ("vllm:gpu_cache_usage_perc", "vllm:kv_cache_usage_perc"),
+    "preemptions_total": ("vllm:num_preemptions_total",),
+    "prompt_tokens_total": ("vllm:prompt_tokens_total",),
+    "generation_tokens_total": ("vllm:generation_tokens_total",),
+    "prefix_cache_queries_total": ("vllm:gpu_prefix_cache_queries_total", "vllm:prefix_cache_queries_total"),
+    "prefix_cache_hits_total": ("vllm:gpu_prefix_cache_hits_total", "vllm:prefix_cache_hits_total"),
+}
+
+# Compteurs convertis en débit entre deux relevés
+COUNTER_RATES = {
+    "generation_tokens_total": "generation_tokens_per_s",
+    "prompt_tokens_total": "prompt_tokens_per_s",
+    "preemptions_total": "preemptions_per_s",
+}
+
+GAUGES = ("running", "waiting", "kv_cache_usage")
+
+
+def parse_prometheus(text):
+    """Format texte Prometheus → {nom: somme des valeurs sur toutes les séries}"""
+    values = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "{" in line:
+            name, rest = line[:line.index("{")], line[line.rindex("}") + 1:]
+        else:
+            name, _, rest = line.partition(" ")
+        fields = rest.split()
+        if not fields:
+            continue
+        try:
+            value = float(fields[0])
+        except ValueError:
+            continue
+        values[name] = values.get(name, 0.0) + value
+    return values
+
+
+def extract_vllm(values):
+    """Valeurs brutes → clés du rapport (métriques absentes ignorées)"""
+    sample = {}
+    for key, names in VLLM_METRICS.items():
+        for name in names:
+            if name in values:
+                sample[key] = values[name]
+                break
+    return sample
+
+
+def with_rates(samples):
+    """Ajoute aux relevés le débit des compteurs depuis le relevé précédent"""
+    previous = None
+    for sample in samples:
+        if previous is not None:
+            dt = sample["t"] - previous["t"]
+            for counter, rate in COUNTER_RATES.items():
+                if dt > 0 and counter in sample and counter in previous:
+                    # Un compteur qui redescend signale un redémarrage du serveur
+                    sample[rate] = max(0.0, sample[counter] - previous[counter]) / dt
+        previous = sample
+    return samples
+
+
+class MetricsScraper:
+    """Relève /metrics dans un thread de fond pendant une campagne"""
+
+    def __init__(self, metrics_url, interval=1.0, timeout=5.0, session=None):
+        self.metrics_url = metrics_url
+        self.interval = interval
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.samples = []
+        self.errors = 0
+        self.last_error = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def scrape(self):
+        """Un relevé horodaté (time.time(), comme RequestRecord.start) ou None"""
+        try:
+            response = self.session.get(self.metrics_url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self.errors += 1
+            self.last_error = str(e)
+            return None
+        sample = {"t": time.time(), **extract_vllm(parse_prometheus(response.text))}
+        self.samples.append(sample)
+        return sample
+
+    def _loop(self):
+        self.scrape()
+        while not self.stop_event.wait(self.interval):
+            self.scrape()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Arrête le thread, fait un dernier relevé et retourne les relevés avec débits"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.scrape()
+        return with_rates(self.samples)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def save_samples(path, samples):
+    with open(path, "w") as f:
+        for sample in samples:
+            f.write(json.dumps(sample) + "\n")
+
+
+def load_samples(path):
+    """Relevés enregistrés (--record-metrics), débits recalculés"""
+    with open(path) as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    return with_rates(sorted(samples, key=lambda s: s["t"]))
+
+
+def pearson(xs, ys):
+    """Coefficient de corrélation, None si indéfini (moins de 3 points ou série constante)"""
+    pairs = [(x, y) for x, y in zip(xs, ys) if x is not None and y is not None]
+    if len(pairs) < 3:
+        return None
+    n = len(pairs)
+    mean_x = sum(x for x, _ in pairs) / n
+    mean_y = sum(y for _, y in pairs) / n
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in pairs)
+    var_x = sum((x - mean_x) ** 2 for x, _ in pairs)
+    var_y = sum((y - mean_y) ** 2 for _, y in pairs)
+    if not var_x or not var_y:
+        return None
+    return cov / (var_x * var_y) ** 0.5
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def peak_during(samples, start, end, key):
+    """Valeur maximale de `key` pendant [start, end], sinon le dernier relevé avant la fin"""
+    inside = [s[key] for s in samples if start <= s["t"] <= end and key in s]
+    if inside:
+        return max(inside)
+    before = [s[key] for s in samples if s["t"] <= end and key in s]
+    return before[-1] if before else None
+
+
+def correlate(records, samples, window_s=1.0, kv_threshold=0.9):
+    """Aligne requêtes (dicts de RequestRecord) et relevés sur une chronologie commune
+
+    Les requêtes sont rangées dans la fenêtre où elles se terminent; chaque
+    fenêtre reçoit la moyenne des relevés qu'elle contient (ou le dernier relevé
+    connu). Une requête est « saturée » si le KV cache a dépassé kv_threshold
+    pendant son exécution.
+    """
+    if not records:
+        return {"window_s": window_s, "windows": [], "saturation": None, "correlations": {}}
+    t0 = min([r["start"] for r in records] + [s["t"] for s in samples[:1]])
+    t_end = max(r["start"] + r["latency"] for r in records)
+    count = int((t_end - t0) / window_s) + 1
+
+    windows = []
+    last = {}
+    for i in range(count):
+        lo, hi = t0 + i * window_s, t0 + (i + 1) * window_s
+        done = [r for r in records if lo <= r["start"] + r["latency"] < hi]
+        ok = [r for r in done if r.get("error") is None]
+        inside = [s for s in samples if lo <= s["t"] < hi]
+        metrics = {}
+        for key in GAUGES + tuple(COUNTER_RATES.values()):
+            value = _mean([s.get(key) for s in inside])
+            metrics[key] = value if value is not None else last.get(key)
+            if value is not None:
+                last[key] = value
+        latency = summarize_latencies([r["latency"] for r in ok])
+        windows.append({
+            "t": i * window_s,
+            "requests": len(done),
+            "errors": len(done) - len(ok),
+            "latency_p50_s": latency["p50"],
+            "latency_p99_s": latency["p99"],
+            **metrics,
+        })
+
+    saturation = None
+    if any("kv_cache_usage" in s for s in samples):
+        saturated, unsaturated = [], []
+        for r in records:
+            if r.get("error") is not None:
+                continue
+            peak = peak_during(samples, r["start"], r["start"] + r["latency"], "kv_cache_usage")
+            (saturated if peak is not None and peak >= kv_threshold else unsaturated).append(r["latency"])
+        saturation = {
+            "threshold": kv_threshold,
+            "saturated": {"requests": len(saturated), "latency_s": summarize_latencies(saturated)},
+            "unsaturated": {"requests": len(unsaturated), "latency_s": summarize_latencies(unsaturated)},
+        }
+
+    active = [w for w in windows if w["requests"]]
+    p99 = [w["latency_p99_s"] for w in active]
+    return {
+        "window_s": window_s,
+        "windows": windows,
+        "saturation": saturation,
+        "correlations": {key: pearson(p99, [w[key] for w in active]) for key in GAUGES},
+        "peaks": {key: max((s[key] for s in samples if key in s), default=None) for key in GAUGES},
+        "generation_tokens_per_s_mean": _mean([s.get("generation_tokens_per_s") for s in samples]),
+    }
+
+
+def _fmt(value, pattern):
+    return pattern.format(value) if value is not None else "N/A"
+
+
+def print_report(report, gpu_memory_utilization=None):
+    """Chronologie par fenêtre, saturation du KV cache et corrélations"""
+    print("\n" + "=" * 60)
+    print("📈 LATENCES CLIENT ET MÉTRIQUES vLLM")
+    print("=" * 60)
+    if gpu_memory_utilization:
+        print(f"🎛️  GPU_MEMORY_UTILIZATION: {gpu_memory_utilization}")
+    print(f"\n{'t (s)':>6} | {'req':>4} | {'p50':>9} | {'p99':>9} | {'en cours':>8} | {'attente':>7} | {'KV':>5} | {'tokens/s':>8}")
+    for w in report["windows"]:
+        print(f"{w['t']:>6.0f} | {w['requests']:>4} | {format_ms(w['latency_p50_s']):>9} | {format_ms(w['latency_p99_s']):>9} | "
+              f"{_fmt(w['running'], '{:.0f}'):>8} | {_fmt(w['waiting'], '{:.0f}'):>7} | "
+              f"{_fmt(w['kv_cache_usage'], '{:.0%}'):>5} | {_fmt(w['generation_tokens_per_s'], '{:.0f}'):>8}")
+
+    peaks = report.get("peaks") or {}
+    print(f"\n🔝 Pics: KV cache {_fmt(peaks.get('kv_cache_usage'), '{:.0%}')}, "
+          f"{_fmt(peaks.get('running'), '{:.0f}')} en cours, {_fmt(peaks.get('waiting'), '{:.0f}')} en attente")
+    if report.get("generation_tokens_per_s_mean") is not None:
+        print(f"🚀 Débit de génération moyen (serveur): {report['generation_tokens_per_s_mean']:.1f} tokens/s")
+
+    saturation = report.get("saturation")
+    if saturation:
+        sat, unsat = saturation["saturated"], saturation["unsaturated"]
+        print(f"\n🧠 KV cache ≥ {saturation['threshold']:.0%} pendant la requête: {sat['requests']} requêtes, "
+              f"p50 {format_ms(sat['latency_s']['p50'])}, p99 {format_ms(sat['latency_s']['p99'])}")
+        print(f"   Sinon: {unsat['requests']} requêtes, "
+              f"p50 {format_ms(unsat['latency_s']['p50'])}, p99 {format_ms(unsat['latency_s']['p99'])}")
+        if sat["latency_s"]["p99"] and unsat["latency_s"]["p99"]:
+            ratio = sat["latency_s"]["p99"] / unsat["latency_s"]["p99"]
+            icon = "⚠️ " if ratio >= 1.5 else "✅"
+            print(f"{icon} p99 x{ratio:.1f} quand le KV cache est saturé")
+
+    labels = {"kv_cache_usage": "KV cache", "waiting": "file d'attente", "running": "requêtes en cours"}
+    correlations = [f"{labels[k]} {r:+.2f}" for k, r in report["correlations"].items() if r is not None]
+    if correlations:
+        print(f"🔗 Corrélation p99 par fenêtre: {', '.join(correlations)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Métriques Prometheus de vLLM alignées sur un test de charge")
+    parser.add_argument("--url", default=None, help="URL de base du modèle (défaut: LLAMA_MODEL_URL ou route OpenShift)")
+    parser.add_argument("--metrics-url", default=None, help="URL des métriques (défaut: <url>/metrics)")
+    parser.add_argument("--interval", type=float, default=1.0, help="Intervalle entre deux relevés (s)")
+    parser.add_argument("--window", type=float, default=1.0, help="Largeur des fenêtres du rapport (s)")
+    parser.add_argument("--kv-threshold", type=float, default=0.9, help="Occupation du KV cache considérée comme saturée")
+    parser.add_argument("--gpu-memory-utilization", default=os.getenv("GPU_MEMORY_UTILIZATION"), help="Valeur déployée (affichée dans le rapport)")
+    parser.add_argument("--stub", action="store_true", help="Serveur simulé local avec KV cache borné")
+    parser.add_argument("--stub-kv-tokens", type=int, default=1536, help="Capacité du KV cache du serveur simulé (tokens)")
+    parser.add_argument("--record-metrics", default=None, help="Enregistre les relevés en JSONL")
+    parser.add_argument("--from-load", default=None, help="Rapport hors ligne: JSON de llama_loadgen.py --json")
+    parser.add_argument("--from-metrics", default=None, help="Rapport hors ligne: relevés enregistrés (--record-metrics)")
+    parser.add_argument("--report-json", default=None, help="Fichier JSON du rapport combiné")
+    add_load_arguments(parser)
+    args = parser.parse_args()
+
+    if args.from_load or args.from_metrics:
+        if not (args.from_load and args.from_metrics):
+            print("❌ --from-load et --from-metrics vont ensemble")
+            sys.exit(1)
+        with open(args.from_load) as f:
+            records = json.load(f)["records"]
+        samples = load_samples(args.from_metrics)
+    else:
+        server = None
+        if args.stub:
+            from llama_stub_server import LatencyModel, StubServer
+            server = StubServer(LatencyModel(kv_cache_tokens=args.stub_kv_tokens, jitter=0.1))
+            model_url = server.start()
+        else:
+            model_url = get_model_url(args.url)
+            if not model_url:
+                print("❌ Aucune URL de modèle: utilisez --url, --stub, LLAMA_MODEL_URL ou OPENSHIFT_CLUSTER_DOMAIN")
+                sys.exit(1)
+        metrics_url = args.metrics_url or f"{model_url.rstrip('/')}/metrics"
+
+        print(f"🔥 Charge sur {model_url} ({args.endpoint}, {args.users} utilisateurs, {args.duration:.0f} s)")
+        print(f"📡 Relevé de {metrics_url} toutes les {args.interval:g} s")
+        scraper = MetricsScraper(metrics_url, interval=args.interval).start()
+        try:
+            result = asyncio.run(run_load(
+                model_url,
+                endpoint=args.endpoint,
+                users=args.users,
+                duration=args.duration,
+                rate=args.rate,
+                max_requests=args.requests,
+                max_tokens=args.max_tokens,
+                timeout=args.timeout,
+                poisson=args.poisson,
+                stream=args.stream,
+                pool_size=args.pool_size,
+            ))
+        finally:
+            samples = scraper.stop()
+            if server:
+                server.stop()
+        print_summary(result.summary())
+        records = [asdict(r) for r in result.records]
+
+        print(f"📡 {len(samples)} relevés, {scraper.errors} échecs")
+        if not samples:
+            print(f"❌ Aucun relevé de métriques: {scraper.last_error}")
+            sys.exit(1)
+        if args.record_metrics:
+            save_samples(args.record_metrics, samples)
+            print(f"💾 Relevés écrits dans {args.record_metrics}")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"summary": result.summary(), "records": records}, f, indent=2)
+            print(f"💾 Résultats écrits dans {args.json}")
+
+    report = correlate(records, samples, window_s=args.window, kv_threshold=args.kv_threshold)
+    print_report(report, args.gpu_memory_utilization)
+    if args.report_json:
+        with open(args.report_json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Rapport écrit dans {args.report_json}")
+
+
+if __name__ == "__main__":
+    main()
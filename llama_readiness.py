@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Sonde de disponibilité du modèle Llama-3.2-1B-Instruct servi par vLLM
+
+Interroge /v1/models puis envoie une génération de warmup d'un token, avec un
+backoff exponentiel et une échéance. Mesure le temps de démarrage à froid
+(réponse de /v1/models → premier token), c'est-à-dire le coût d'un scale-up
+du ServingRuntime.
+
+Exemple:
+  python3 llama_readiness.py --url http://localhost:8000 --deadline 600 --json readiness.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+from llama_client import PooledHTTPClient, build_endpoints, completion_payload, get_model_url
+
+
+@dataclass
+class ReadinessResult:
+    """Résultat de la sonde de disponibilité"""
+    ready: bool
+    attempts: int
+    models_ready_s: float = None
+    cold_start_s: float = None
+    total_s: float = None
+    error: str = None
+
+
+def backoff_delays(initial=0.5, factor=2.0, maximum=15.0, jitter=0.1):
+    """Délais successifs de backoff exponentiel (avec un léger bruit)"""
+    delay = initial
+    while True:
+        yield delay * (1.0 + random.uniform(-jitter, jitter))
+        delay = min(delay * factor, maximum)
+
+
+def wait_until_ready(client, model_url, deadline=600.0, initial_delay=0.5, max_delay=15.0, probe_timeout=10.0):
+    """Attend que /v1/models réponde puis qu'une génération de warmup produise un token"""
+    endpoints = build_endpoints(model_url)
+    warmup = completion_payload(prompt="Bonjour", max_tokens=1, temperature=0.0)
+    start = time.perf_counter()
+    limit = start + deadline
+    models_ready = None
+    attempts = 0
+    error = None
+
+    for delay in backoff_delays(initial_delay, maximum=max_delay):
+        attempts += 1
+        try:
+            if models_ready is None:
+                response = client.get(endpoints["models"], timeout=probe_timeout)
+                if response.status_code == 200:
+                    models_ready = time.perf_counter()
+                    continue
+            else:
+                response = client.post(endpoints["completion"], json=warmup, timeout=max(probe_timeout, 60))
+                if response.status_code == 200:
+                    now = time.perf_counter()
+                    return ReadinessResult(
+                        ready=True,
+                        attempts=attempts,
+                        models_ready_s=models_ready - start,
+                        cold_start_s=now - models_ready,
+                        total_s=now - start,
+                    )
+            error = f"HTTP {response.status_code}"
+        except Exception as e:
+            error = repr(e)
+
+        remaining = limit - time.perf_counter()
+        if remaining <= 0:
+            break
+        time.sleep(min(delay, remaining))
+
+    return ReadinessResult(
+        ready=False,
+        attempts=attempts,
+        models_ready_s=models_ready - start if models_ready else None,
+        total_s=time.perf_counter() - start,
+        error=error,
+    )
+
+
+def print_readiness(result):
+    """Affichage du résultat de la sonde"""
+    if result.ready:
+        print(f"✅ Modèle prêt après {result.total_s:.1f} s ({result.attempts} sondes)")
+        print(f"   - /v1/models disponible après: {result.models_ready_s:.1f} s")
+        print(f"   - Démarrage à froid (/v1/models → premier token): {result.cold_start_s * 1000:.0f} ms")
+    else:
+        print(f"❌ Modèle non prêt après {result.total_s:.1f} s ({result.attempts} sondes): {result.error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sonde de disponibilité du modèle Llama-3.2-1B-Instruct")
+    parser.add_argument("--url", default=None, help="URL de base du modèle (défaut: LLAMA_MODEL_URL ou route OpenShift)")
+    parser.add_argument("--deadline", type=float, default=600.0, help="Échéance globale (s)")
+    parser.add_argument("--initial-delay", type=float, default=0.5, help="Premier délai de backoff (s)")
+    parser.add_argument("--max-delay", type=float, default=15.0, help="Délai de backoff maximum (s)")
+    parser.add_argument("--json", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    model_url = get_model_url(args.url)
+    if not model_url:
+        print("❌ Aucune URL de modèle: utilisez --url, LLAMA_MODEL_URL ou OPENSHIFT_CLUSTER_DOMAIN")
+        sys.exit(1)
+
+    print(f"⏳ Attente de la disponibilité de {model_url} (échéance {args.deadline:.0f} s)...")
+    with PooledHTTPClient(pool_size=1) as client:
+        result = wait_until_ready(client, model_url, args.deadline, args.initial_delay, args.max_delay)
+    print_readiness(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(asdict(result), f, indent=2)
+    sys.exit(0 if result.ready else 1)
+
+
+if __name__ == "__main__":
+    main()
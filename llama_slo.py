@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+Suite de non-régression pilotée par les SLO (modèle et RAG)
+
+Quatre scénarios, mesurés contre le vLLM ou contre le serveur simulé:
+  - completion:    /v1/completions non-streaming (latence de bout en bout)
+  - streaming:     /v1/chat/completions en SSE (TTFT, latence inter-token, décodage)
+  - rag-retrieval: recherche vectorielle (latence, recall@k et MRR du jeu étiqueté)
+  - rag-e2e:       recherche, assemblage du prompt (prompt_assembly.py) et réponse
+                   en streaming (recherche, TTFT et durée totale du tour)
+
+Les échantillons bruts et les métriques sont enregistrés dans une baseline
+JSON (--save-baseline), avec l'image vLLM du ServingRuntime et les paramètres
+de la campagne. Les exécutions suivantes sont comparées métrique par métrique:
+  - objectif SLO absolu (ex. TTFT p95 <= 500 ms): tout dépassement est un échec
+  - régression: dégradation au-delà de la tolérance relative de la métrique ET
+    significative (bootstrap des échantillons, p < --alpha), pour ne pas
+    échouer sur le bruit d'une exécution
+Le code de sortie vaut 1 en cas d'échec: la suite sert de garde-fou après un
+changement de l'image vLLM épinglée. Une exécution en échec n'écrase pas la
+baseline, sauf avec --force.
+
+Avec --stub, tout tourne en local: serveur simulé (llama_stub_server.py) et
+base vectorielle en mémoire (llamastack/rag/vector_store.py).
+
+Exemples:
+  python3 llama_slo.py --stub --save-baseline
+  python3 llama_slo.py --stub --decode-ms-per-token 12
+  python3 llama_slo.py --url http://localhost:8000 --scenarios completion,streaming
+  python3 llama_slo.py --url http://localhost:8000 --retrieval llamastack --vector-db assurance_milvus_db --slo slo.yaml
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+from dataclasses import asdict
+
+from llama_client import (
+    SSE_DONE,
+    PooledHTTPClient,
+    StreamMetrics,
+    build_endpoints,
+    chat_payload,
+    format_ms,
+    get_model_url,
+    parse_sse_line,
+    percentile,
+    stream_options,
+)
+from llama_loadgen import build_payload, run_load
+from llama_stub_server import StubServer, add_latency_arguments, latency_from_args
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+RAG_DIR = os.path.join(ROOT_DIR, "llamastack", "rag")
+sys.path.insert(0, RAG_DIR)
+
+SCENARIOS = ("completion", "streaming", "rag-retrieval", "rag-e2e")
+BASELINE_VERSION = 1
+
+# Métriques par scénario: échantillons et statistique (sinon valeur directe),
+# sens ("lower"/"higher" est meilleur), tolérance relative, écart absolu minimal
+# (min_delta, sous lequel une dégradation reste du bruit) et objectif SLO absolu.
+# Les objectifs visent le Llama-3.2-1B sur une A10G; --slo les remplace.
+DEFAULT_SLOS = {
+    "completion": {
+        "latency_p50_s": {"samples": "latency_s", "stat": "p50", "tolerance": 0.10, "min_delta": 0.02, "objective": 2.0},
+        "latency_p95_s": {"samples": "latency_s", "stat": "p95", "tolerance": 0.20, "min_delta": 0.02, "objective": 4.0},
+        "error_rate": {"objective": 0.01},
+    },
+    "streaming": {
+        "ttft_p50_s": {"samples": "ttft_s", "stat": "p50", "tolerance": 0.10, "min_delta": 0.01, "objective": 0.25},
+        "ttft_p95_s": {"samples": "ttft_s", "stat": "p95", "tolerance": 0.20, "min_delta": 0.02, "objective": 0.5},
+        "itl_p95_s": {"samples": "inter_token_latency_s", "stat": "p95", "tolerance": 0.20, "min_delta": 0.001,
+                      "objective": 0.05},
+        "decode_tokens_per_s_p50": {"samples": "decode_tokens_per_s", "stat": "p50", "better": "higher", "tolerance": 0.10},
+        "error_rate": {"objective": 0.01},
+    },
+    "rag-retrieval": {
+        "latency_p50_s": {"samples": "latency_s", "stat": "p50", "tolerance": 0.25, "min_delta": 0.001},
+        "latency_p95_s": {"samples": "latency_s", "stat": "p95", "tolerance": 0.25, "min_delta": 0.002, "objective": 0.2},
+        "recall": {"better": "higher", "tolerance": 0.02, "objective": 0.5},
+        "mrr": {"better": "higher", "tolerance": 0.02},
+    },
+    "rag-e2e": {
+        "retrieval_p95_s": {"samples": "retrieval_s", "stat": "p95", "tolerance": 0.25, "min_delta": 0.002},
+        "ttft_p95_s": {"samples": "ttft_s", "stat": "p95", "tolerance": 0.20, "min_delta": 0.02, "objective": 1.0},
+        "total_p50_s": {"samples": "total_s", "stat": "p50", "tolerance": 0.10, "min_delta": 0.02},
+        "total_p95_s": {"samples": "total_s", "stat": "p95", "tolerance": 0.20, "min_delta": 0.02, "objective": 5.0},
+        "error_rate": {"objective": 0.01},
+    },
+}
+
+STATUS_LABELS = {
+    "ok": "✅ ok",
+    "noise": "〰️  bruit",
+    "regression": "❌ régression",
+    "slo": "❌ SLO",
+    "new": "🆕 sans baseline",
+}
+
+
+def load_slos(path=None):
+    """SLO par défaut, surchargés par un fichier JSON/YAML {scénario: {métrique: {objective, tolerance, min_delta}}}"""
+    slos = {scenario: {name: dict(spec) for name, spec in metrics.items()} for scenario, metrics in DEFAULT_SLOS.items()}
+    if not path:
+        return slos
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            overrides = yaml.safe_load(f) or {}
+        else:
+            overrides = json.load(f)
+    for scenario, metrics in overrides.items():
+        if scenario not in slos:
+            raise ValueError(f"Scénario inconnu dans {path}: {scenario}")
+        for name, spec in metrics.items():
+            slos[scenario].setdefault(name, {}).update(spec)
+    return slos
+
+
+def servingruntime_image(path=os.path.join(ROOT_DIR, "servingruntime-llama32-1b.yaml")):
+    """Image vLLM épinglée dans le ServingRuntime (None si introuvable)"""
+    try:
+        with open(path) as f:
+            match = re.search(r"^\s*image:\s*(\S+)", f.read(), re.MULTILINE)
+    except OSError:
+        return None
+    return match.group(1) if match else None
+
+
+def statistic(values, stat):
+    if not values:
+        return None
+    if stat == "mean":
+        return sum(values) / len(values)
+    return percentile(values, float(stat.lstrip("p")))
+
+
+def _fixed_length(payload):
+    # Longueur de génération fixe sur vLLM: les latences restent comparables d'une image à l'autre
+    return dict(payload, ignore_eos=True)
+
+
+# --- Scénarios ---
+
+def run_completion(model_url, args):
+    payload = _fixed_length(build_payload("completion", args.max_tokens))
+    if args.warmup:
+        asyncio.run(run_load(model_url, "completion", users=1, duration=args.max_duration,
+                             max_requests=args.warmup, payload=payload))
+    result = asyncio.run(run_load(model_url, "completion", users=args.users, duration=args.max_duration,
+                                  max_requests=args.requests, payload=payload))
+    ok = result.ok_records
+    return {
+        "samples": {"latency_s": [r.latency for r in ok]},
+        "values": {"error_rate": 1 - len(ok) / len(result.records) if result.records else 1.0},
+        "info": {"requests": len(result.records), "throughput_rps": len(ok) / result.duration if result.duration else 0.0},
+    }
+
+
+def run_streaming(model_url, args):
+    payload = _fixed_length(build_payload("chat", args.max_tokens, stream=True))
+    if args.warmup:
+        asyncio.run(run_load(model_url, "chat", users=1, duration=args.max_duration,
+                             max_requests=args.warmup, stream=True, payload=payload))
+    result = asyncio.run(run_load(model_url, "chat", users=args.users, duration=args.max_duration,
+                                  max_requests=args.requests, stream=True, payload=payload))
+    ok = result.ok_records
+    return {
+        "samples": {
+            "ttft_s": [r.ttft for r in ok if r.ttft is not None],
+            "inter_token_latency_s": [gap for r in ok for gap in (r.inter_token_latencies or [])],
+            "decode_tokens_per_s": [r.decode_tokens_per_s for r in ok if r.decode_tokens_per_s is not None],
+        },
+        "values": {"error_rate": 1 - len(ok) / len(result.records) if result.records else 1.0},
+        "info": {"requests": len(result.records)},
+    }
+
+
+def make_retriever(args):
+    """Base locale indexée depuis le corpus, ou base LlamaStack existante"""
+    if args.retrieval == "llamastack":
+        from discovery_cache import make_client
+        from retrieval_bench import LlamaStackRetriever
+        return LlamaStackRetriever(make_client(args.llama_stack_url), args.vector_db)
+    from vector_store import LocalVectorStore, load_corpus
+    store = LocalVectorStore()
+    store.add_documents(load_corpus(args.corpus), chunk_size=args.chunk_size)
+    return store
+
+
+def run_rag_retrieval(retriever, queries, args):
+    from retrieval_bench import relevance
+
+    latencies, recalls, reciprocal_ranks = [], [], []
+    for round_index in range(args.rounds):
+        for item in queries:
+            start = time.perf_counter()
+            chunks = retriever.query(item["query"], args.k)
+            latencies.append(time.perf_counter() - start)
+            if round_index == 0:
+                recall, rank = relevance(chunks, item)
+                if recall is not None:
+                    recalls.append(recall)
+                reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        "samples": {"latency_s": latencies},
+        "values": {
+            "recall": sum(recalls) / len(recalls) if recalls else None,
+            "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks) if reciprocal_ranks else None,
+        },
+        "info": {"queries": len(queries), "k": args.k},
+    }
+
+
+def rag_turn(http, url, retriever, assembler, question, k, max_tokens):
+    """Tour RAG complet: recherche, prompt assemblé, réponse en streaming (durées depuis le début du tour)"""
+    start = time.perf_counter()
+    chunks = retriever.query(question, k)
+    retrieved = time.perf_counter()
+    metrics = StreamMetrics(start)
+    payload = _fixed_length(stream_options(chat_payload(assembler.messages(question, chunks), max_tokens=max_tokens,
+                                                        temperature=0.0)))
+    with http.stream_post(url, json=payload) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        for line in response.iter_lines():
+            chunk = parse_sse_line(line)
+            if chunk is SSE_DONE:
+                break
+            if chunk is not None:
+                metrics.feed(chunk)
+    metrics.finish()
+    return {"retrieval_s": retrieved - start, "ttft_s": metrics.ttft, "total_s": metrics.end - start}
+
+
+def run_rag_e2e(model_url, retriever, queries, args):
+    from prefix_bench import ASSURANCE_INSTRUCTIONS
+    from prompt_assembly import PromptAssembler
+
+    url = build_endpoints(model_url)["chat"]
+    assembler = PromptAssembler(ASSURANCE_INSTRUCTIONS)
+    samples = {"retrieval_s": [], "ttft_s": [], "total_s": []}
+    turns = errors = 0
+    with PooledHTTPClient(pool_size=1, timeout=args.timeout) as http:
+        for item in queries[:args.warmup]:
+            try:
+                rag_turn(http, url, retriever, assembler, item["query"], args.k, args.max_tokens)
+            except Exception:
+                pass
+        for _ in range(args.rounds):
+            for item in queries:
+                turns += 1
+                try:
+                    timings = rag_turn(http, url, retriever, assembler, item["query"], args.k, args.max_tokens)
+                except Exception:
+                    errors += 1
+                    continue
+                for name, value in timings.items():
+                    if value is not None:
+                        samples[name].append(value)
+    return {
+        "samples": samples,
+        "values": {"error_rate": errors / turns if turns else 1.0},
+        "info": {"turns": turns, "k": args.k},
+    }
+
+
+def run_scenarios(scenarios, model_url, args):
+    """Résultats bruts {scénario: {samples, values, info}}"""
+    retriever = queries = None
+    if any(s.startswith("rag-") for s in scenarios):
+        from retrieval_bench import load_queries
+        queries = load_queries(args.queries)
+        retriever = make_retriever(args)
+
+    results = {}
+    for scenario in scenarios:
+        print(f"⏳ Scénario {scenario}...")
+        start = time.perf_counter()
+        if scenario == "completion":
+            results[scenario] = run_completion(model_url, args)
+        elif scenario == "streaming":
+            results[scenario] = run_streaming(model_url, args)
+        elif scenario == "rag-retrieval":
+            results[scenario] = run_rag_retrieval(retriever, queries, args)
+        else:
+            results[scenario] = run_rag_e2e(model_url, retriever, queries, args)
+        results[scenario]["info"]["duration_s"] = time.perf_counter() - start
+    return results
+
+
+# --- Comparaison ---
+
+def metric_value(result, name, spec):
+    if spec.get("samples"):
+        return statistic(result["samples"].get(spec["samples"]) or [], spec.get("stat", "p50"))
+    return result["values"].get(name)
+
+
+def bootstrap_p_value(baseline, current, stat, better="lower", resamples=1000, seed=0):
+    """p unilatéral: part des rééchantillonnages où la statistique courante n'est pas pire"""
+    rng = random.Random(seed)
+    not_worse = 0
+    for _ in range(resamples):
+        b = statistic(rng.choices(baseline, k=len(baseline)), stat)
+        c = statistic(rng.choices(current, k=len(current)), stat)
+        if (c <= b) if better == "lower" else (c >= b):
+            not_worse += 1
+    return not_worse / resamples
+
+
+def compare(current, baseline, slos, alpha=0.05, resamples=1000):
+    """Une ligne par métrique: valeurs, dégradation relative, p, objectif et statut"""
+    rows = []
+    for scenario, result in current.items():
+        base = (baseline or {}).get(scenario)
+        for name, spec in slos[scenario].items():
+            better = spec.get("better", "lower")
+            value = metric_value(result, name, spec)
+            row = {"scenario": scenario, "metric": name, "current": value, "baseline": None,
+                   "change": None, "p_value": None, "objective": spec.get("objective"), "status": "ok"}
+            if base is not None:
+                row["baseline"] = metric_value(base, name, spec)
+            if row["baseline"] and value is not None:
+                change = (value - row["baseline"]) / row["baseline"]
+                row["change"] = change if better == "lower" else -change
+                if spec.get("tolerance") is not None and row["change"] > spec["tolerance"]:
+                    samples = spec.get("samples")
+                    if abs(value - row["baseline"]) < spec.get("min_delta", 0.0):
+                        row["status"] = "noise"
+                    elif samples and result["samples"].get(samples) and base["samples"].get(samples):
+                        row["p_value"] = bootstrap_p_value(base["samples"][samples], result["samples"][samples],
+                                                           spec.get("stat", "p50"), better, resamples)
+                        row["status"] = "regression" if row["p_value"] < alpha else "noise"
+                    else:
+                        row["status"] = "regression"
+            elif base is None and spec.get("tolerance") is not None:
+                row["status"] = "new"
+            objective = row["objective"]
+            if objective is not None and (value is None or (value > objective if better == "lower" else value < objective)):
+                row["status"] = "slo"
+            rows.append(row)
+    return rows
+
+
+def failures(rows):
+    return [r for r in rows if r["status"] in ("regression", "slo")]
+
+
+def format_value(name, value):
+    if value is None:
+        return "N/A"
+    if name.endswith("_s"):
+        return format_ms(value)
+    if name == "error_rate":
+        return f"{value:.1%}"
+    if name.startswith("decode_tokens_per_s"):
+        return f"{value:.1f} tok/s"
+    return f"{value:.3f}"
+
+
+def print_comparison(rows):
+    """Tableau métrique par métrique, groupé par scénario"""
+    scenario = None
+    for r in rows:
+        if r["scenario"] != scenario:
+            scenario = r["scenario"]
+            print(f"\n📏 {scenario}")
+            print(f"   {'Métrique':<24} | {'Baseline':>11} | {'Courant':>11} | {'Dégrad.':>7} | {'p':>5} | "
+                  f"{'Objectif':>11} | Statut")
+        change = f"{r['change']:+.0%}" if r["change"] is not None else "-"
+        p_value = f"{r['p_value']:.2f}" if r["p_value"] is not None else "-"
+        objective = format_value(r["metric"], r["objective"]) if r["objective"] is not None else "-"
+        print(f"   {r['metric']:<24} | {format_value(r['metric'], r['baseline']):>11} | "
+              f"{format_value(r['metric'], r['current']):>11} | {change:>7} | {p_value:>5} | {objective:>11} | "
+              f"{STATUS_LABELS[r['status']]}")
+
+
+# --- Baselines ---
+
+def campaign_params(args):
+    """Paramètres qui doivent être identiques pour comparer deux exécutions"""
+    return {
+        "users": args.users,
+        "requests": args.requests,
+        "max_tokens": args.max_tokens,
+        "k": args.k,
+        "rounds": args.rounds,
+        "retrieval": args.retrieval,
+    }
+
+
+def load_baseline(path):
+    """Baseline enregistrée (None si absente ou d'une autre version)"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if data.get("version") == BASELINE_VERSION else None
+
+
+def save_baseline(path, results, metadata, previous=None):
+    """Écrit la baseline; les scénarios non rejoués gardent leur baseline précédente"""
+    scenarios = dict((previous or {}).get("scenarios", {}))
+    scenarios.update(results)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": BASELINE_VERSION, **metadata, "scenarios": scenarios}, f, indent=1)
+    os.replace(tmp, path)
+
+
+def warn_mismatch(baseline, metadata):
+    """Avertit si la baseline a été mesurée sur une autre cible ou avec d'autres paramètres"""
+    if baseline.get("target") != metadata["target"]:
+        print(f"⚠️  Baseline mesurée sur {baseline.get('target')}, exécution sur {metadata['target']}")
+    if baseline.get("params") != metadata["params"]:
+        print(f"⚠️  Paramètres différents de la baseline: {baseline.get('params')} → {metadata['params']}")
+    if baseline.get("latency") != metadata.get("latency"):
+        print("ℹ️  Modèle de latence du serveur simulé différent de celui de la baseline")
+    if baseline.get("vllm_image") != metadata["vllm_image"]:
+        print(f"🔁 Image vLLM: {baseline.get('vllm_image')} → {metadata['vllm_image']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de non-régression SLO (completion, streaming, RAG)")
+    parser.add_argument("--url", default=None, help="URL de base du vLLM (défaut: LLAMA_MODEL_URL ou route OpenShift)")
+    parser.add_argument("--stub", action="store_true", help="Serveur simulé local au lieu du vLLM")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Scénarios exécutés")
+    parser.add_argument("--baseline", default=None,
+                        help="Fichier de baseline (défaut: slo-baselines/stub.json ou vllm.json à la racine du dépôt)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Enregistre cette exécution comme baseline (si aucune métrique n'est en échec)")
+    parser.add_argument("--force", action="store_true", help="Avec --save-baseline, enregistre même en cas d'échec")
+    parser.add_argument("--slo", default=os.getenv("SLO_CONFIG"), help="Objectifs et tolérances JSON/YAML (remplacent les défauts)")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Seuil de significativité d'une régression")
+    parser.add_argument("--resamples", type=int, default=1000, help="Rééchantillonnages du bootstrap")
+    parser.add_argument("--users", type=int, default=4, help="Utilisateurs simultanés (completion, streaming)")
+    parser.add_argument("--requests", type=int, default=100, help="Requêtes mesurées par scénario modèle")
+    parser.add_argument("--warmup", type=int, default=2, help="Requêtes de chauffe non mesurées")
+    parser.add_argument("--max-tokens", type=int, default=32, help="Tokens générés par requête")
+    parser.add_argument("--max-duration", type=float, default=300.0, help="Durée maximale d'un scénario modèle (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout HTTP d'un tour RAG (s)")
+    parser.add_argument("--retrieval", choices=["local", "llamastack"], default="local", help="Base des scénarios RAG")
+    parser.add_argument("--queries", default=os.path.join(RAG_DIR, "datasets", "assurance-retrieval.jsonl"), help="Requêtes étiquetées JSONL")
+    parser.add_argument("--corpus", default=os.path.join(RAG_DIR, "datasets", "assurance-corpus.jsonl"), help="Corpus JSONL (base locale)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Taille des chunks en mots (base locale)")
+    parser.add_argument("--llama-stack-url", default=os.getenv("LLAMA_STACK_URL", "http://lsd-llama-32-1b-instruct-service:8321"), help="URL de LlamaStack")
+    parser.add_argument("--vector-db", default=os.getenv("VECTOR_DB_ID", "assurance_milvus_db"), help="Base vectorielle (--retrieval llamastack)")
+    parser.add_argument("--k", type=int, default=4, help="Chunks par requête RAG")
+    parser.add_argument("--rounds", type=int, default=3, help="Passages du jeu de requêtes RAG")
+    parser.add_argument("--json", help="Fichier JSON du rapport de comparaison")
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"scénarios inconnus: {', '.join(unknown)}")
+    try:
+        slos = load_slos(args.slo)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    baseline_path = args.baseline or os.path.join(ROOT_DIR, "slo-baselines", "stub.json" if args.stub else "vllm.json")
+
+    server = None
+    metadata = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "vllm_image": servingruntime_image(),
+        "params": campaign_params(args),
+    }
+    if args.stub:
+        latency = latency_from_args(args)
+        server = StubServer(latency)
+        model_url = server.start()
+        metadata.update(target="stub", latency=asdict(latency))
+    else:
+        model_url = get_model_url(args.url)
+        if not model_url and any(s != "rag-retrieval" for s in scenarios):
+            print("❌ Aucune URL de modèle: utilisez --url, --stub, LLAMA_MODEL_URL ou OPENSHIFT_CLUSTER_DOMAIN")
+            sys.exit(1)
+        metadata["target"] = model_url
+
+    print(f"🎯 Cible: {metadata['target']} | image vLLM: {metadata['vllm_image'] or 'N/A'}")
+    try:
+        results = run_scenarios(scenarios, model_url, args)
+    finally:
+        if server:
+            server.stop()
+
+    baseline = load_baseline(baseline_path)
+    if baseline is None:
+        print(f"ℹ️  Aucune baseline dans {baseline_path}: seuls les objectifs SLO sont vérifiés")
+    else:
+        warn_mismatch(baseline, metadata)
+    rows = compare(results, baseline["scenarios"] if baseline else None, slos, args.alpha, args.resamples)
+    print_comparison(rows)
+
+    failed = failures(rows)
+    if args.save_baseline:
+        if failed and not args.force:
+            print(f"\n⚠️  Baseline non enregistrée: exécution en échec (--force pour l'écraser quand même)")
+        else:
+            save_baseline(baseline_path, results, metadata, baseline)
+            print(f"\n💾 Baseline enregistrée: {baseline_path} ({', '.join(scenarios)})")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({**metadata, "baseline": baseline_path, "rows": rows}, f, indent=2)
+        print(f"💾 Rapport: {args.json}")
+
+    if failed:
+        print(f"\n❌ {len(failed)} métrique(s) en échec: "
+              + ", ".join(f"{r['scenario']}/{r['metric']}" for r in failed))
+        sys.exit(1)
+    print(f"\n✅ Aucune régression ({len(rows)} métriques)")
+
+
+if __name__ == "__main__":
+    main()
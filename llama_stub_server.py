@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Serveur local OpenAI-compatible qui imite le vLLM du modèle Llama-3.2-1B-Instruct
+
+Permet de mesurer le coût côté client et de lancer le générateur de charge et les
+benchmarks sans GPU ni cluster. Implémente /v1/models, /v1/chat/completions et
+/v1/completions (streaming ou non) avec:
+  - un modèle de latence prefill (par token de prompt) + décodage (par token généré)
+  - un nombre maximum de requêtes simultanées et une file d'attente bornée
+  - une injection d'erreurs (taux et code HTTP configurables)
+  - un cache de préfixes optionnel par blocs, comme l'automatic prefix caching de vLLM
+    (seuls les tokens hors du plus long préfixe déjà vu paient le prefill)
+  - une capacité de KV cache optionnelle (en tokens): une requête attend qu'il y ait
+    la place pour son prompt et sa génération, comme l'ordonnanceur de vLLM
+  - /metrics au format Prometheus avec les noms de métriques de vLLM
+
+Exemple:
+  python3 llama_stub_server.py --port 8000 --prefill-ms-per-token 0.2 --decode-ms-per-token 8
+  python3 llama_loadgen.py --url http://localhost:8000 --users 16 --duration 30
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llama_client import MODEL_NAME
+
+STUB_WORDS = (
+    "Le modèle Llama-3.2-1B-Instruct est un petit modèle de langage optimisé pour "
+    "suivre des instructions et répondre de manière claire et concise en plusieurs langues ."
+).split()
+
+
+@dataclass
+class LatencyModel:
+    """Paramètres du modèle de latence et de capacité du serveur simulé"""
+    base_ms: float = 5.0
+    prefill_ms_per_token: float = 0.2
+    decode_ms_per_token: float = 8.0
+    batch_slowdown: float = 0.02
+    max_concurrency: int = 16
+    max_queue: int = 256
+    error_rate: float = 0.0
+    error_status: int = 500
+    jitter: float = 0.0
+    seed: int = None
+    prefix_cache_blocks: int = 0
+    prefix_block_tokens: int = 16
+    kv_cache_tokens: int = 0
+
+
+CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text):
+    """Approximation du nombre de tokens (≈ 4 caractères par token)"""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def prompt_text(body):
+    """Texte du prompt quel que soit l'endpoint (chat ou completion)"""
+    if "messages" in body:
+        return "\n".join(str(m.get("content", "")) for m in body["messages"])
+    prompt = body.get("prompt", "")
+    return "\n".join(prompt) if isinstance(prompt, list) else str(prompt)
+
+
+class StubEngine:
+    """Moteur simulé: file d'attente, slots de batch et temps de prefill/décodage"""
+
+    def __init__(self, latency=None):
+        self.latency = latency or LatencyModel()
+        self.slots = threading.Semaphore(self.latency.max_concurrency)
+        self.lock = threading.Lock()
+        self.kv_freed = threading.Condition(self.lock)
+        self.random = random.Random(self.latency.seed)
+        self.running = 0
+        self.waiting = 0
+        self.requests_total = 0
+        self.errors_total = 0
+        self.rejected_total = 0
+        self.prompt_tokens_total = 0
+        self.generation_tokens_total = 0
+        self.prefix_blocks = OrderedDict()
+        self.prefix_queries_total = 0
+        self.prefix_hits_total = 0
+        self.kv_used = 0
+        self.success_total = 0
+
+    def admit(self):
+        """Entre dans la file; False si la file est pleine"""
+        with self.lock:
+            if self.waiting >= self.latency.max_queue:
+                self.rejected_total += 1
+                return False
+            self.waiting += 1
+        self.slots.acquire()
+        with self.lock:
+            self.waiting -= 1
+            self.running += 1
+            self.requests_total += 1
+        return True
+
+    def release(self):
+        with self.lock:
+            self.running -= 1
+        self.slots.release()
+
+    def reserve_kv(self, tokens):
+        """Attend que le KV cache ait la place pour `tokens` (la requête repasse en attente)
+
+        Retourne le nombre de tokens réservés, à rendre avec free_kv().
+        """
+        capacity = self.latency.kv_cache_tokens
+        if not capacity:
+            return 0
+        tokens = min(tokens, capacity)
+        with self.kv_freed:
+            if self.kv_used + tokens > capacity:
+                self.running -= 1
+                self.waiting += 1
+                while self.kv_used + tokens > capacity:
+                    self.kv_freed.wait()
+                self.waiting -= 1
+                self.running += 1
+            self.kv_used += tokens
+        return tokens
+
+    def free_kv(self, tokens):
+        if not tokens:
+            return
+        with self.kv_freed:
+            self.kv_used -= tokens
+            self.kv_freed.notify_all()
+
+    def should_fail(self):
+        with self.lock:
+            failed = self.random.random() < self.latency.error_rate
+            if failed:
+                self.errors_total += 1
+        return failed
+
+    def _scaled(self, ms):
+        """Durée (s) ralentie par la taille du batch courant et un bruit optionnel"""
+        with self.lock:
+            factor = 1.0 + self.latency.batch_slowdown * max(0, self.running - 1)
+            noise = self.random.uniform(-self.latency.jitter, self.latency.jitter) if self.latency.jitter else 0.0
+        return max(0.0, ms * factor * (1.0 + noise)) / 1000.0
+
+    def cached_prefix_tokens(self, text):
+        """Tokens du plus long préfixe déjà en cache; enregistre les blocs complets du prompt
+
+        Chaque bloc est identifié par le hachage de tout le préfixe qui le précède
+        (comme les blocs KV de vLLM): un seul caractère différent en tête invalide la suite.
+        """
+        if not self.latency.prefix_cache_blocks:
+            return 0
+        block_chars = self.latency.prefix_block_tokens * CHARS_PER_TOKEN
+        digest = hashlib.sha256()
+        hashes = []
+        for start in range(0, len(text) - block_chars + 1, block_chars):
+            digest.update(text[start:start + block_chars].encode())
+            hashes.append(digest.copy().hexdigest())
+
+        with self.lock:
+            cached = 0
+            for h in hashes:
+                if h not in self.prefix_blocks:
+                    break
+                cached += 1
+            for h in hashes:
+                self.prefix_blocks[h] = True
+                self.prefix_blocks.move_to_end(h)
+            while len(self.prefix_blocks) > self.latency.prefix_cache_blocks:
+                self.prefix_blocks.popitem(last=False)
+            self.prefix_queries_total += len(hashes) * self.latency.prefix_block_tokens
+            self.prefix_hits_total += cached * self.latency.prefix_block_tokens
+        return cached * self.latency.prefix_block_tokens
+
+    def prefill(self, prompt_tokens, cached_tokens=0):
+        with self.lock:
+            self.prompt_tokens_total += prompt_tokens
+        uncached = max(0, prompt_tokens - cached_tokens)
+        time.sleep(self._scaled(self.latency.base_ms + self.latency.prefill_ms_per_token * uncached))
+
+    def decode_token(self, index):
+        """Attend le temps de décodage d'un token et retourne son texte"""
+        time.sleep(self._scaled(self.latency.decode_ms_per_token))
+        with self.lock:
+            self.generation_tokens_total += 1
+        return STUB_WORDS[index % len(STUB_WORDS)] + " "
+
+    def stats(self):
+        with self.lock:
+            return {
+                "running": self.running,
+                "waiting": self.waiting,
+                "requests_total": self.requests_total,
+                "errors_total": self.errors_total,
+                "rejected_total": self.rejected_total,
+                "prompt_tokens_total": self.prompt_tokens_total,
+                "generation_tokens_total": self.generation_tokens_total,
+                "prefix_cache_queries_total": self.prefix_queries_total,
+                "prefix_cache_hits_total": self.prefix_hits_total,
+                "success_total": self.success_total,
+                "kv_cache_usage": self.kv_used / self.latency.kv_cache_tokens if self.latency.kv_cache_tokens else 0.0,
+            }
+
+    def prometheus(self, model_name):
+        """Exposition texte Prometheus avec les noms de métriques de vLLM"""
+        stats = self.stats()
+        metrics = [
+            ("vllm:num_requests_running", "gauge", stats["running"]),
+            ("vllm:num_requests_waiting", "gauge", stats["waiting"]),
+            ("vllm:gpu_cache_usage_perc", "gauge", stats["kv_cache_usage"]),
+            ("vllm:prompt_tokens_total", "counter", stats["prompt_tokens_total"]),
+            ("vllm:generation_tokens_total", "counter", stats["generation_tokens_total"]),
+            ("vllm:request_success_total", "counter", stats["success_total"]),
+            ("vllm:gpu_prefix_cache_queries_total", "counter", stats["prefix_cache_queries_total"]),
+            ("vllm:gpu_prefix_cache_hits_total", "counter", stats["prefix_cache_hits_total"]),
+        ]
+        lines = []
+        for name, kind, value in metrics:
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f'{name}{{model_name="{model_name}"}} {float(value)}')
+        return "\n".join(lines) + "\n"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Handler HTTP/1.1 (keep-alive, chunked pour le streaming)"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "llama-stub/1.0"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status, text, content_type="text/plain; version=0.0.4"):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {"object": "error", "message": message, "code": status})
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {
+                "object": "list",
+                "data": [{"id": self.server.model_name, "object": "model", "owned_by": "llama-stub"}],
+            })
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self._send_text(200, self.server.engine.prometheus(self.server.model_name))
+        else:
+            self._send_error(404, f"Route inconnue: {self.path}")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_error(400, "JSON invalide")
+
+        path = self.path.rstrip("/")
+        if path == "/v1/chat/completions":
+            kind = "chat"
+        elif path == "/v1/completions":
+            kind = "completion"
+        else:
+            return self._send_error(404, f"Route inconnue: {self.path}")
+
+        engine = self.server.engine
+        if not engine.admit():
+            return self._send_error(503, "File d'attente pleine")
+        try:
+            if engine.should_fail():
+                return self._send_error(engine.latency.error_status, "Erreur injectée par le serveur simulé")
+            self._generate(kind, body)
+            with engine.lock:
+                engine.success_total += 1
+        finally:
+            engine.release()
+
+    def _generate(self, kind, body):
+        engine = self.server.engine
+        prompt = prompt_text(body)
+        prompt_tokens = count_tokens(prompt)
+        cached_tokens = min(prompt_tokens, engine.cached_prefix_tokens(prompt))
+        max_tokens = int(body.get("max_tokens") or 16)
+        request_id = f"{'chatcmpl' if kind == 'chat' else 'cmpl'}-{uuid.uuid4().hex[:16]}"
+        created = int(time.time())
+        model = body.get("model", self.server.model_name)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": max_tokens,
+            "total_tokens": prompt_tokens + max_tokens,
+        }
+        if engine.latency.prefix_cache_blocks:
+            usage["prompt_tokens_details"] = {"cached_tokens": cached_tokens}
+
+        reserved = engine.reserve_kv(prompt_tokens + max_tokens)
+        try:
+            self._respond(kind, body, engine, request_id, created, model, usage, prompt_tokens, cached_tokens, max_tokens)
+        finally:
+            engine.free_kv(reserved)
+
+    def _respond(self, kind, body, engine, request_id, created, model, usage, prompt_tokens, cached_tokens, max_tokens):
+        engine.prefill(prompt_tokens, cached_tokens)
+
+        if not body.get("stream"):
+            text = "".join(engine.decode_token(i) for i in range(max_tokens))
+            if kind == "chat":
+                choice = {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "length"}
+            else:
+                choice = {"index": 0, "text": text, "finish_reason": "length"}
+            return self._send_json(200, {
+                "id": request_id,
+                "object": "chat.completion" if kind == "chat" else "text_completion",
+                "created": created,
+                "model": model,
+                "choices": [choice],
+                "usage": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        obj = "chat.completion.chunk" if kind == "chat" else "text_completion"
+        for i in range(max_tokens):
+            text = engine.decode_token(i)
+            last = i == max_tokens - 1
+            if kind == "chat":
+                delta = {"content": text} if i else {"role": "assistant", "content": text}
+                choice = {"index": 0, "delta": delta, "finish_reason": "length" if last else None}
+            else:
+                choice = {"index": 0, "text": text, "finish_reason": "length" if last else None}
+            chunk = {"id": request_id, "object": obj, "created": created, "model": model, "choices": [choice]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": request_id, "object": obj, "created": created, "model": model, "choices": [], "usage": usage}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    """Serveur HTTP multi-thread qui ignore les déconnexions des clients"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class StubServer:
+    """Serveur simulé démarrable dans un thread (benchmarks) ou en ligne de commande"""
+
+    def __init__(self, latency=None, host="127.0.0.1", port=0, model_name=MODEL_NAME, verbose=False):
+        self.engine = StubEngine(latency)
+        self.httpd = StubHTTPServer((host, port), StubHandler)
+        self.httpd.engine = self.engine
+        self.httpd.model_name = model_name
+        self.httpd.verbose = verbose
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Démarre le serveur dans un thread de fond et retourne son URL"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_latency_arguments(parser):
+    """Options du modèle de latence (réutilisables par les benchmarks)"""
+    defaults = LatencyModel()
+    parser.add_argument("--base-ms", type=float, default=defaults.base_ms, help="Latence fixe par requête (ms)")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=defaults.prefill_ms_per_token, help="Coût de prefill par token de prompt (ms)")
+    parser.add_argument("--decode-ms-per-token", type=float, default=defaults.decode_ms_per_token, help="Coût de décodage par token généré (ms)")
+    parser.add_argument("--batch-slowdown", type=float, default=defaults.batch_slowdown, help="Ralentissement relatif par requête simultanée supplémentaire")
+    parser.add_argument("--max-concurrency", type=int, default=defaults.max_concurrency, help="Requêtes traitées simultanément (taille de batch)")
+    parser.add_argument("--max-queue", type=int, default=defaults.max_queue, help="Requêtes en attente avant rejet (503)")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Probabilité d'erreur injectée (0-1)")
+    parser.add_argument("--error-status", type=int, default=defaults.error_status, help="Code HTTP des erreurs injectées")
+    parser.add_argument("--jitter", type=float, default=defaults.jitter, help="Bruit relatif sur les latences (0-1)")
+    parser.add_argument("--seed", type=int, default=None, help="Graine aléatoire (erreurs et bruit)")
+    parser.add_argument("--prefix-cache-blocks", type=int, default=defaults.prefix_cache_blocks,
+                        help="Blocs du cache de préfixes simulé (0: désactivé)")
+    parser.add_argument("--prefix-block-tokens", type=int, default=defaults.prefix_block_tokens, help="Tokens par bloc du cache de préfixes")
+    parser.add_argument("--kv-cache-tokens", type=int, default=defaults.kv_cache_tokens,
+                        help="Capacité du KV cache simulé en tokens (0: illimitée)")
+
+
+def latency_from_args(args):
+    return LatencyModel(
+        base_ms=args.base_ms,
+        prefill_ms_per_token=args.prefill_ms_per_token,
+        decode_ms_per_token=args.decode_ms_per_token,
+        batch_slowdown=args.batch_slowdown,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        jitter=args.jitter,
+        seed=args.seed,
+        prefix_cache_blocks=args.prefix_cache_blocks,
+        prefix_block_tokens=args.prefix_block_tokens,
+        kv_cache_tokens=args.kv_cache_tokens,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur OpenAI-compatible simulé pour les benchmarks hors cluster")
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=8000, help="Port d'écoute")
+    parser.add_argument("--model", default=MODEL_NAME, help="Nom du modèle servi")
+    parser.add_argument("--verbose", action="store_true", help="Journaliser chaque requête")
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    latency = latency_from_args(args)
+    server = StubServer(latency, host=args.host, port=args.port, model_name=args.model, verbose=args.verbose)
+    print(f"🧪 Serveur simulé {args.model} sur {server.url}")
+    print(f"⚙️  Modèle de latence: {json.dumps(asdict(latency))}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Arrêt du serveur simulé")
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
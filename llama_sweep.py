@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Balayage des réglages de service vLLM du modèle Llama-3.2-1B-Instruct
+
+Pour chaque combinaison de MODEL_MAX_LENGTH, GPU_MEMORY_UTILIZATION et
+MODEL_TENSOR_PARALLEL_SIZE, le modèle est (re)déployé, puis chaque couple
+(utilisateurs simultanés, mélange de tailles de prompt) est mesuré avec
+llama_loadgen.py. Le rapport donne le débit, les latences et le coût
+(GPU-heures par million de tokens générés) de chaque point, et marque la
+frontière de Pareto coût / latence p95 de chaque mélange.
+
+Deux déployeurs:
+  - stub: serveur simulé local (llama_stub_server.py), réglages traduits en
+    capacité de KV cache et en vitesse de prefill/décodage
+  - oc:   InferenceService rendu depuis inferenceservice-llama32-1b.yaml et
+    appliqué sur le cluster (variables du .env chargées dans l'environnement)
+
+Exemples:
+  python3 llama_sweep.py --deployer stub --gpu-memory-utilization 0.85,0.95 --users 4,16,64 --duration 10
+  set -a; source .env; set +a
+  python3 llama_sweep.py --deployer oc --max-model-len 2048,4096 --gpu-memory-utilization 0.85,0.95 \\
+    --users 8,32 --mixes court,rag --json sweep.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from llama_client import PooledHTTPClient, chat_payload, format_ms, get_model_url
+from llama_loadgen import run_load
+from llama_readiness import print_readiness, wait_until_ready
+from llama_stub_server import CHARS_PER_TOKEN, LatencyModel, StubServer
+
+# Formes de requête: (tokens de prompt approximatifs, max_tokens)
+PROMPT_PROFILES = {
+    "court": (64, 128),
+    "rag": (1536, 256),
+    "long": (3072, 128),
+}
+
+# Mélanges: profils tirés au hasard pour chaque requête (répétition = poids)
+PROMPT_MIXES = {
+    "court": ["court"],
+    "rag": ["rag"],
+    "long": ["long"],
+    "mixte": ["court", "court", "court", "rag"],
+}
+
+FILLER = (
+    "Le contrat d'assurance habitation couvre les dommages causés par l'incendie, le dégât des eaux "
+    "et le vol, dans la limite des plafonds et après application de la franchise prévue aux conditions "
+    "particulières. "
+)
+
+# Llama-3.2-1B: 16 couches, 8 têtes KV de dimension 64, K et V en bf16
+KV_BYTES_PER_TOKEN = 16 * 8 * 64 * 2 * 2
+WEIGHTS_GIB = 2.5
+GPU_OVERHEAD_GIB = 1.0
+TP_COMM_OVERHEAD = 0.3
+MAX_NUM_SEQS = 256
+
+
+def parse_list(text, cast=str):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+def profile_payload(profile, stream=False):
+    """Requête chat d'environ N tokens de prompt (≈ 4 caractères par token)"""
+    prompt_tokens, max_tokens = PROMPT_PROFILES[profile]
+    chars = prompt_tokens * CHARS_PER_TOKEN
+    context = (FILLER * (chars // len(FILLER) + 1))[:chars]
+    messages = [
+        {"role": "system", "content": "Tu es un assistant IA utile. Réponds en français de manière concise."},
+        {"role": "user", "content": f"{context}\n\nRésume ce texte."},
+    ]
+    payload = chat_payload(messages, max_tokens=max_tokens, temperature=0.0, stream=stream)
+    if stream:
+        payload["stream_options"] = {"include_usage": True}
+    return payload
+
+
+def mix_fits(mix, max_model_len):
+    """Toutes les requêtes du mélange tiennent dans le contexte (sinon vLLM répond 400)"""
+    return all(sum(PROMPT_PROFILES[p]) <= max_model_len for p in PROMPT_MIXES[mix])
+
+
+def server_grid(args):
+    """Réglages serveur du balayage (un redéploiement chacun)"""
+    for max_len, util, tp in itertools.product(args.max_model_len, args.gpu_memory_utilization, args.tensor_parallel_size):
+        yield {"max_model_len": max_len, "gpu_memory_utilization": util, "tensor_parallel_size": tp}
+
+
+class StubDeployer:
+    """Traduit les réglages vLLM en modèle de latence du serveur simulé
+
+    Le KV cache reçoit la mémoire GPU autorisée moins les poids et un surcoût par
+    GPU; le parallélisme de tenseurs divise prefill et décodage, moins un coût de
+    communication. Comme vLLM, le démarrage échoue si le KV cache ne peut pas
+    contenir une séquence de max_model_len tokens.
+    """
+
+    def __init__(self, gpu_gib=24.0, latency=None):
+        self.gpu_gib = gpu_gib
+        self.latency = latency or LatencyModel()
+        self.server = None
+
+    def latency_for(self, config):
+        tp = config["tensor_parallel_size"]
+        usable_gib = tp * (self.gpu_gib * config["gpu_memory_utilization"] - GPU_OVERHEAD_GIB) - WEIGHTS_GIB
+        kv_tokens = int(usable_gib * 2 ** 30 / KV_BYTES_PER_TOKEN)
+        if kv_tokens < config["max_model_len"]:
+            raise RuntimeError(f"KV cache trop petit ({max(kv_tokens, 0)} tokens) pour max_model_len {config['max_model_len']}")
+        speedup = tp / (1.0 + TP_COMM_OVERHEAD * (tp - 1))
+        return LatencyModel(
+            base_ms=self.latency.base_ms,
+            prefill_ms_per_token=self.latency.prefill_ms_per_token / speedup,
+            decode_ms_per_token=self.latency.decode_ms_per_token / speedup,
+            batch_slowdown=self.latency.batch_slowdown,
+            max_concurrency=MAX_NUM_SEQS,
+            max_queue=self.latency.max_queue,
+            kv_cache_tokens=kv_tokens,
+        )
+
+    def deploy(self, config):
+        self.close()
+        latency = self.latency_for(config)
+        self.server = StubServer(latency)
+        print(f"🧪 Serveur simulé: KV cache {latency.kv_cache_tokens} tokens, "
+              f"décodage {latency.decode_ms_per_token:.1f} ms/token")
+        return self.server.start()
+
+    def close(self):
+        if self.server:
+            self.server.stop()
+            self.server = None
+
+
+def render_template(template, variables):
+    """Remplace les ${VAR} du manifeste, comme le sed de deploy.sh"""
+    missing = sorted(set(re.findall(r"\$\{(\w+)\}", template)) - set(variables))
+    if missing:
+        raise RuntimeError(f"Variables manquantes: {', '.join(missing)} (chargez le .env)")
+    return re.sub(r"\$\{(\w+)\}", lambda m: str(variables[m.group(1)]), template)
+
+
+class OcDeployer:
+    """Redéploie l'InferenceService avec `oc apply` et attend que le modèle réponde"""
+
+    def __init__(self, model_url, template="inferenceservice-llama32-1b.yaml", namespace="llama-instruct-32-1b-demo",
+                 name="llama-32-1b-instruct", timeout=900.0):
+        self.model_url = model_url
+        self.template = template
+        self.namespace = namespace
+        self.name = name
+        self.timeout = timeout
+
+    def deploy(self, config):
+        variables = dict(os.environ)
+        variables.update({
+            "MODEL_MAX_LENGTH": config["max_model_len"],
+            "GPU_MEMORY_UTILIZATION": config["gpu_memory_utilization"],
+            "MODEL_TENSOR_PARALLEL_SIZE": config["tensor_parallel_size"],
+            "GPU_COUNT": config["tensor_parallel_size"],
+        })
+        with open(self.template) as f:
+            manifest = render_template(f.read(), variables)
+
+        print(f"🔄 Redéploiement de {self.name} ({json.dumps(config)})")
+        subprocess.run(["oc", "apply", "-n", self.namespace, "-f", "-"], input=manifest, text=True, check=True)
+        # En RawDeployment, KServe crée le Deployment <isvc>-predictor: attendre la fin du rollout
+        # pour ne pas mesurer l'ancien pod
+        time.sleep(5)
+        subprocess.run(["oc", "rollout", "status", f"deployment/{self.name}-predictor", "-n", self.namespace,
+                        f"--timeout={int(self.timeout)}s"], check=True)
+        with PooledHTTPClient(pool_size=1) as client:
+            readiness = wait_until_ready(client, self.model_url, deadline=self.timeout)
+        print_readiness(readiness)
+        if not readiness.ready:
+            raise RuntimeError(f"Modèle non prêt: {readiness.error}")
+        return self.model_url
+
+    def close(self):
+        pass
+
+
+def point_cost(summary, gpus, gpu_hour_price=None):
+    """GPU-heures (et prix optionnel) par million de tokens générés"""
+    tokens_per_s = summary["output_tokens_per_s"]
+    if not tokens_per_s:
+        return None, None
+    gpu_hours = gpus / (tokens_per_s * 3600) * 1e6
+    return gpu_hours, gpu_hours * gpu_hour_price if gpu_hour_price else None
+
+
+def measure_point(model_url, config, users, mix, args):
+    payload = [profile_payload(p, stream=args.stream) for p in PROMPT_MIXES[mix]]
+    result = asyncio.run(run_load(
+        model_url,
+        endpoint="chat",
+        users=users,
+        duration=args.duration,
+        rate=args.rate,
+        timeout=args.timeout,
+        stream=args.stream,
+        payload=payload,
+    ))
+    summary = result.summary()
+    gpu_hours, price = point_cost(summary, config["tensor_parallel_size"], args.gpu_hour_price)
+    point = {
+        **config,
+        "users": users,
+        "mix": mix,
+        "requests": summary["requests"],
+        "errors": summary["errors"],
+        "throughput_rps": summary["throughput_rps"],
+        "output_tokens_per_s": summary["output_tokens_per_s"],
+        "latency_p50_s": summary["latency_s"]["p50"],
+        "latency_p95_s": summary["latency_s"]["p95"],
+        "gpu_hours_per_mtok": gpu_hours,
+        "price_per_mtok": price,
+    }
+    if args.stream:
+        point["ttft_p95_s"] = summary["ttft_s"]["p95"]
+    return point
+
+
+def pareto_front(points):
+    """Points non dominés en (coût, latence p95), les deux à minimiser"""
+    valid = [p for p in points if p["gpu_hours_per_mtok"] is not None and p["latency_p95_s"] is not None]
+    front = []
+    for p in valid:
+        dominated = any(
+            q["gpu_hours_per_mtok"] <= p["gpu_hours_per_mtok"] and q["latency_p95_s"] <= p["latency_p95_s"]
+            and (q["gpu_hours_per_mtok"] < p["gpu_hours_per_mtok"] or q["latency_p95_s"] < p["latency_p95_s"])
+            for q in valid
+        )
+        if not dominated:
+            front.append(p)
+    return front
+
+
+def print_sweep(points, failures):
+    """Tableau par mélange, trié par coût, frontière de Pareto marquée ★"""
+    print("\n" + "=" * 60)
+    print("📊 BALAYAGE DES RÉGLAGES vLLM (coût vs latence p95)")
+    print("=" * 60)
+    for mix in sorted({p["mix"] for p in points}):
+        rows = [p for p in points if p["mix"] == mix]
+        front = [id(p) for p in pareto_front(rows)]
+        print(f"\n🧾 Mélange {mix} ({' + '.join(PROMPT_MIXES[mix])})")
+        print(f"   {'':1} {'max_len':>7} | {'gpu_mem':>7} | {'TP':>2} | {'users':>5} | {'req/s':>6} | {'tok/s':>7} | "
+              f"{'p50':>9} | {'p95':>9} | {'GPU-h/Mtok':>10} | {'erreurs':>7}")
+        for p in sorted(rows, key=lambda r: (r["gpu_hours_per_mtok"] is None, r["gpu_hours_per_mtok"] or 0)):
+            mark = "★" if id(p) in front else " "
+            cost = f"{p['gpu_hours_per_mtok']:.2f}" if p["gpu_hours_per_mtok"] is not None else "N/A"
+            if p["price_per_mtok"] is not None:
+                cost = f"{cost} ({p['price_per_mtok']:.2f})"
+            print(f"   {mark} {p['max_model_len']:>7} | {p['gpu_memory_utilization']:>7} | {p['tensor_parallel_size']:>2} | "
+                  f"{p['users']:>5} | {p['throughput_rps']:>6.2f} | {p['output_tokens_per_s']:>7.1f} | "
+                  f"{format_ms(p['latency_p50_s']):>9} | {format_ms(p['latency_p95_s']):>9} | {cost:>10} | {p['errors']:>7}")
+    for failure in failures:
+        print(f"⚠️  {json.dumps(failure['config'])}: {failure['error']}")
+    print("\n★ = frontière de Pareto: aucun autre point n'est à la fois moins cher et plus rapide (p95)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Balayage des réglages de service vLLM (coût vs latence)")
+    parser.add_argument("--deployer", choices=["stub", "oc"], default="stub", help="Serveur simulé local ou redéploiement OpenShift")
+    parser.add_argument("--max-model-len", default=os.getenv("MODEL_MAX_LENGTH", "4096"), help="Valeurs de MODEL_MAX_LENGTH (liste)")
+    parser.add_argument("--gpu-memory-utilization", default=os.getenv("GPU_MEMORY_UTILIZATION", "0.95"), help="Valeurs de GPU_MEMORY_UTILIZATION (liste)")
+    parser.add_argument("--tensor-parallel-size", default=os.getenv("MODEL_TENSOR_PARALLEL_SIZE", "1"), help="Valeurs de MODEL_TENSOR_PARALLEL_SIZE (liste)")
+    parser.add_argument("--users", default="4,16,64", help="Utilisateurs simultanés (liste)")
+    parser.add_argument("--mixes", default="court,mixte", help=f"Mélanges de prompts (liste parmi {', '.join(PROMPT_MIXES)})")
+    parser.add_argument("--duration", type=float, default=20.0, help="Durée de chaque point (s)")
+    parser.add_argument("--rate", type=float, default=None, help="Débit fixe en req/s (défaut: boucle fermée)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout par requête (s)")
+    parser.add_argument("--stream", action="store_true", help="Réponses en streaming (TTFT p95 dans les résultats)")
+    parser.add_argument("--gpu-hour-price", type=float, default=None, help="Prix d'une GPU-heure (ajoute le prix par million de tokens)")
+    parser.add_argument("--url", default=None, help="URL du modèle (déployeur oc; défaut: LLAMA_MODEL_URL ou route OpenShift)")
+    parser.add_argument("--namespace", default=os.getenv("OPENSHIFT_PROJECT", "llama-instruct-32-1b-demo"), help="Namespace (déployeur oc)")
+    parser.add_argument("--template", default="inferenceservice-llama32-1b.yaml", help="Manifeste de l'InferenceService (déployeur oc)")
+    parser.add_argument("--ready-timeout", type=float, default=900.0, help="Attente maximale d'un redéploiement (s)")
+    parser.add_argument("--stub-gpu-gib", type=float, default=24.0, help="Mémoire d'un GPU simulé (Gio, A10G: 24)")
+    parser.add_argument("--json", default=None, help="Fichier JSON des résultats (réécrit après chaque point)")
+    args = parser.parse_args()
+
+    args.max_model_len = parse_list(args.max_model_len, int)
+    args.gpu_memory_utilization = parse_list(args.gpu_memory_utilization, float)
+    args.tensor_parallel_size = parse_list(args.tensor_parallel_size, int)
+    users = parse_list(args.users, int)
+    mixes = parse_list(args.mixes)
+    unknown = [m for m in mixes if m not in PROMPT_MIXES]
+    if unknown:
+        print(f"❌ Mélanges inconnus: {', '.join(unknown)}")
+        sys.exit(1)
+
+    if args.deployer == "oc":
+        model_url = get_model_url(args.url)
+        if not model_url:
+            print("❌ Aucune URL de modèle: utilisez --url, LLAMA_MODEL_URL ou OPENSHIFT_CLUSTER_DOMAIN")
+            sys.exit(1)
+        deployer = OcDeployer(model_url, args.template, args.namespace, timeout=args.ready_timeout)
+    else:
+        deployer = StubDeployer(gpu_gib=args.stub_gpu_gib)
+
+    configs = list(server_grid(args))
+    print(f"🧭 {len(configs)} réglages serveur x {len(users)} niveaux de concurrence x {len(mixes)} mélanges, "
+          f"{args.duration:.0f} s par point")
+
+    points, failures = [], []
+    try:
+        for config in configs:
+            try:
+                model_url = deployer.deploy(config)
+            except (RuntimeError, subprocess.CalledProcessError) as e:
+                print(f"❌ Déploiement impossible: {e}")
+                failures.append({"config": config, "error": str(e)})
+                continue
+            for mix, n in itertools.product(mixes, users):
+                if not mix_fits(mix, config["max_model_len"]):
+                    print(f"⏭️  {mix}: prompt + génération au-delà de max_model_len {config['max_model_len']}")
+                    continue
+                print(f"🔥 {json.dumps(config)} | {n} utilisateurs | mélange {mix}")
+                point = measure_point(model_url, config, n, mix, args)
+                print(f"   {point['throughput_rps']:.2f} req/s, {point['output_tokens_per_s']:.1f} tokens/s, "
+                      f"p95 {format_ms(point['latency_p95_s'])}, {point['errors']} erreurs")
+                points.append(point)
+                if args.json:
+                    with open(args.json, "w") as f:
+                        json.dump({"points": points, "failures": failures}, f, indent=2)
+    finally:
+        deployer.close()
+
+    print_sweep(points, failures)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"points": points, "failures": failures,
+                       "pareto": {mix: pareto_front([p for p in points if p["mix"] == mix]) for mix in mixes}}, f, indent=2)
+        print(f"💾 Résultats écrits dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
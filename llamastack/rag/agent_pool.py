@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Pool d'agents et de sessions LlamaStack réutilisables
+
+Les agents sont mis en cache par (modèle, instructions, vector_db_ids) et les
+sessions sont recyclées jusqu'à un budget de tours et de contexte, pour que les
+allers-retours de mise en place (Client, Agent, create_session) ne dominent plus
+les tours courts. Le pool mesure séparément la latence de mise en place et celle
+des tours.
+
+Par défaut une session ne sert qu'un tour: chaque question reste isolée et
+seul l'agent est réutilisé. Une session recyclée conserve l'historique de ses
+tours précédents; le recyclage n'a lieu que si l'appelant demande plusieurs
+tours (max_turns_per_session ou RAG_SESSION_MAX_TURNS > 1).
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from rag_metrics import format_ms, summarize_latencies
+
+DEFAULT_MAX_TURNS = int(os.getenv("RAG_SESSION_MAX_TURNS", "1"))
+DEFAULT_MAX_CONTEXT_CHARS = int(os.getenv("RAG_SESSION_MAX_CONTEXT_CHARS", "8000"))
+# Budget de contexte de knowledge_search en tokens (0: valeur par défaut de LlamaStack)
+DEFAULT_CONTEXT_BUDGET = int(os.getenv("RAG_CONTEXT_BUDGET", "0"))
+
+
+def rag_tools(vector_db_ids, max_tokens_in_context=DEFAULT_CONTEXT_BUDGET):
+    """Outil builtin::rag/knowledge_search sur les bases vectorielles données"""
+    args = {"vector_db_ids": list(vector_db_ids)}
+    if max_tokens_in_context:
+        args["query_config"] = {"max_tokens_in_context": max_tokens_in_context}
+    return [{"name": "builtin::rag/knowledge_search", "args": args}]
+
+
+class PooledSession:
+    """Session empruntée au pool (exclusive pendant l'emprunt)"""
+
+    def __init__(self, key, agent, session_id):
+        self.key = key
+        self.agent = agent
+        self.session_id = session_id
+        self.turns = 0
+        self.context_chars = 0
+        self.setup_s = 0.0
+
+    @property
+    def has_history(self):
+        """Vrai si la session a déjà servi un tour (son historique entre dans le prompt)"""
+        return self.turns > 0
+
+    def create_turn(self, messages, stream=True):
+        """Envoie un tour dans la session et comptabilise le contexte des messages"""
+        self.turns += 1
+        self.context_chars += sum(len(str(m.get("content", ""))) for m in messages)
+        return self.agent.create_turn(messages=messages, session_id=self.session_id, stream=stream)
+
+    def add_context(self, text):
+        """Ajoute la réponse reçue au budget de contexte de la session"""
+        self.context_chars += len(text or "")
+
+
+class AgentPool:
+    """Cache d'agents par configuration et sessions recyclées sous budget"""
+
+    def __init__(self, client, max_turns_per_session=DEFAULT_MAX_TURNS,
+                 max_context_chars=DEFAULT_MAX_CONTEXT_CHARS, agent_cls=None, sampling_params=None):
+        self.client = client
+        self.sampling_params = sampling_params
+        self.max_turns_per_session = max_turns_per_session
+        self.max_context_chars = max_context_chars
+        self.agent_cls = agent_cls
+        self.lock = threading.Lock()
+        self.agents = {}
+        self.idle = {}
+        self.agents_created = 0
+        self.sessions_created = 0
+        self.sessions_reused = 0
+        self.sessions_retired = 0
+        self.setup_times = []
+        self.turn_times = []
+
+    @staticmethod
+    def key(model, instructions, vector_db_ids):
+        return (model, instructions, tuple(sorted(vector_db_ids)))
+
+    def agent_config(self, model, instructions, vector_db_ids):
+        """Outils et échantillonnage réellement passés à l'agent (None: défauts de LlamaStack)"""
+        key = self.key(model, instructions, vector_db_ids)
+        return {"tools": rag_tools(key[2]), "sampling_params": self.sampling_params}
+
+    def _agent_class(self):
+        if self.agent_cls is None:
+            from llama_stack_client import Agent
+            self.agent_cls = Agent
+        return self.agent_cls
+
+    def agent(self, model, instructions, vector_db_ids):
+        """Agent en cache pour la configuration (créé au premier appel)"""
+        key = self.key(model, instructions, vector_db_ids)
+        with self.lock:
+            agent = self.agents.get(key)
+        if agent is not None:
+            return agent
+
+        config = self.agent_config(model, instructions, vector_db_ids)
+        kwargs = {"sampling_params": config["sampling_params"]} if config["sampling_params"] else {}
+        agent = self._agent_class()(self.client, model=model, instructions=instructions, tools=config["tools"], **kwargs)
+        with self.lock:
+            if key not in self.agents:
+                self.agents[key] = agent
+                self.agents_created += 1
+            return self.agents[key]
+
+    def _exhausted(self, session):
+        return (session.turns >= self.max_turns_per_session
+                or session.context_chars >= self.max_context_chars)
+
+    def checkout(self, model, instructions, vector_db_ids):
+        """Emprunte une session inactive avec du budget, ou en crée une"""
+        start = time.perf_counter()
+        key = self.key(model, instructions, vector_db_ids)
+        with self.lock:
+            idle = self.idle.get(key)
+            session = idle.pop() if idle else None
+            if session is not None:
+                self.sessions_reused += 1
+
+        if session is None:
+            agent = self.agent(model, instructions, vector_db_ids)
+            session_id = agent.create_session(session_name=f"pool_{uuid.uuid4().hex[:8]}")
+            session = PooledSession(key, agent, session_id)
+            with self.lock:
+                self.sessions_created += 1
+
+        session.setup_s = time.perf_counter() - start
+        with self.lock:
+            self.setup_times.append(session.setup_s)
+        return session
+
+    def checkin(self, session, turn_s=None):
+        """Rend une session au pool (retirée si son budget est épuisé)"""
+        with self.lock:
+            if turn_s is not None:
+                self.turn_times.append(turn_s)
+            if self._exhausted(session):
+                self.sessions_retired += 1
+            else:
+                self.idle.setdefault(session.key, []).append(session)
+
+    @contextmanager
+    def session(self, model, instructions, vector_db_ids):
+        """Emprunt de session; la durée du bloc est comptée comme latence de tour"""
+        session = self.checkout(model, instructions, vector_db_ids)
+        start = time.perf_counter()
+        try:
+            yield session
+        finally:
+            self.checkin(session, time.perf_counter() - start)
+
+    def stats(self):
+        """Compteurs du pool et latences de mise en place vs tours"""
+        with self.lock:
+            return {
+                "agents_created": self.agents_created,
+                "sessions_created": self.sessions_created,
+                "sessions_reused": self.sessions_reused,
+                "sessions_retired": self.sessions_retired,
+                "setup_s": summarize_latencies(self.setup_times),
+                "turn_s": summarize_latencies(self.turn_times),
+            }
+
+
+_POOLS = {}
+_CLIENTS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_agent_pool(base_url, profiler=None, **kwargs):
+    """Pool partagé par (URL, configuration), réutilisé entre les tests d'un même processus
+
+    Un appelant qui demande un autre max_turns_per_session ou d'autres
+    sampling_params obtient son propre pool; les pools d'une même URL partagent
+    le Client LlamaStack.
+    """
+    key = (base_url, json.dumps(kwargs, sort_keys=True, default=repr))
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            client = _CLIENTS.get(base_url)
+            if client is None:
+                from discovery_cache import make_client
+                client = _CLIENTS[base_url] = make_client(base_url, profiler)
+            pool = AgentPool(client, **kwargs)
+            _POOLS[key] = pool
+        return pool
+
+
+def print_pool_stats(stats):
+    """Affichage des compteurs du pool et des latences mise en place / tours"""
+    print(f"♻️  Pool d'agents: {stats['agents_created']} agents, {stats['sessions_created']} sessions créées, "
+          f"{stats['sessions_reused']} réutilisées, {stats['sessions_retired']} retirées")
+    print(f"   - Mise en place p50: {format_ms(stats['setup_s']['p50'])} | p95: {format_ms(stats['setup_s']['p95'])}")
+    print(f"   - Tour p50: {format_ms(stats['turn_s']['p50'])} | p95: {format_ms(stats['turn_s']['p95'])}")
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Stratégies de découpage des documents en chunks pour l'ingestion RAG
+
+Trois stratégies, toutes bornées en tokens (estimés en mots, ~0,75 mot par
+token) avec un chevauchement configurable:
+  - fixed:    fenêtres de mots de taille fixe (comportement historique d'ingest.py)
+  - sentence: phrases regroupées sans couper un paragraphe quand il tient dans
+              le chunk; le chevauchement reprend les dernières phrases entières
+  - section:  sections du markdown produit par docling (titres #); chaque chunk
+              est préfixé par le chemin de titres de sa section, puis découpé
+              comme sentence
+Les chunks sont produits par des générateurs: ingest.py les insère par lots au
+fil du découpage sans matérialiser tous les chunks d'un document.
+
+En ligne de commande, compare les stratégies sur un corpus (débit, taille des
+chunks, recall@k et MRR sur la base locale de retrieval_bench.py):
+  python3 chunking.py --strategies fixed,sentence,section --max-tokens 96,192 --overlap-tokens 0,24
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from rag_metrics import peak_rss_mib
+
+# Approximation sans tokenizer: ~0,75 mot par token
+WORDS_PER_TOKEN = 0.75
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+(?=[\"«(\[]?[A-ZÀ-ÖØ-Þ0-9])")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+# Titres, lignes de liste ou de tableau markdown: une unité par ligne
+_LINE_ITEM_RE = re.compile(r"^\s*(#{1,6}|[-*+•|]|\d+[.)])\s")
+
+
+def estimate_tokens(text):
+    return len(text.split()) / WORDS_PER_TOKEN
+
+
+def _words_for(tokens):
+    return max(1, int(tokens * WORDS_PER_TOKEN))
+
+
+def fixed_chunks(text, max_tokens=512, overlap_tokens=0):
+    """Fenêtres de ~max_tokens tokens, chevauchement de overlap_tokens"""
+    words = text.split()
+    size = _words_for(max_tokens)
+    overlap = min(int(overlap_tokens * WORDS_PER_TOKEN), size - 1)
+    step = size - overlap
+    for start in range(0, len(words), step):
+        yield {"content": " ".join(words[start:start + size])}
+        if start + size >= len(words):
+            break
+
+
+def paragraphs(text):
+    """Paragraphes découpés en unités (texte, ligne): phrases, ou lignes pour les titres, listes et tableaux"""
+    for block in _PARAGRAPH_RE.split(text):
+        units, prose = [], []
+        for line in block.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if _LINE_ITEM_RE.match(line):
+                if prose:
+                    units += [(s, False) for s in _SENTENCE_RE.split(" ".join(prose))]
+                    prose = []
+                units.append((line, True))
+            else:
+                prose.append(line)
+        if prose:
+            units += [(s, False) for s in _SENTENCE_RE.split(" ".join(prose))]
+        if units:
+            yield units
+
+
+def sentence_chunks(text, max_tokens=512, overlap_tokens=0):
+    """Phrases regroupées sous max_tokens, en évitant de couper les paragraphes qui tiennent"""
+    current, tokens, fresh = [], 0.0, 0
+
+    def join(units):
+        # Espace entre phrases d'un même paragraphe, saut de ligne entre paragraphes et autour des lignes
+        parts = []
+        for i, (unit, block) in enumerate(units):
+            if i:
+                parts.append(" " if block is not None and block == units[i - 1][1] else "\n")
+            parts.append(unit)
+        return "".join(parts)
+
+    def flush():
+        nonlocal current, tokens, fresh
+        chunk = {"content": join(current)}
+        # Chevauchement: dernières phrases entières dans la limite de overlap_tokens
+        carried, carried_tokens = [], 0.0
+        for unit in reversed(current):
+            unit_tokens = estimate_tokens(unit[0])
+            if carried_tokens + unit_tokens > overlap_tokens or len(carried) + 1 >= len(current):
+                break
+            carried.insert(0, unit)
+            carried_tokens += unit_tokens
+        current, tokens, fresh = carried, carried_tokens, 0
+        return chunk
+
+    for paragraph, units in enumerate(paragraphs(text)):
+        paragraph_tokens = sum(estimate_tokens(u) for u, _ in units)
+        # Paragraphe qui ne tient plus: on le commence dans un nouveau chunk si le courant est assez rempli
+        if fresh and tokens + paragraph_tokens > max_tokens and tokens >= max_tokens / 2:
+            yield flush()
+        for unit, is_line in units:
+            unit_tokens = estimate_tokens(unit)
+            if unit_tokens > max_tokens:
+                if fresh:
+                    yield flush()
+                current, tokens = [], 0.0
+                yield from fixed_chunks(unit, max_tokens, overlap_tokens)
+                continue
+            if fresh and tokens + unit_tokens > max_tokens:
+                yield flush()
+            current.append((unit, None if is_line else paragraph))
+            tokens += unit_tokens
+            fresh += 1
+    if fresh:
+        yield {"content": join(current)}
+
+
+def sections(text):
+    """(chemin de titres, corps) pour chaque section du markdown"""
+    path, body = [], []
+    for line in text.splitlines():
+        match = _HEADING_RE.match(line)
+        if match:
+            if any(l.strip() for l in body):
+                yield " > ".join(title for _, title in path), "\n".join(body)
+            level = len(match.group(1))
+            path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, match.group(2))]
+            body = []
+        else:
+            body.append(line)
+    if any(l.strip() for l in body):
+        yield " > ".join(title for _, title in path), "\n".join(body)
+
+
+def section_chunks(text, max_tokens=512, overlap_tokens=0):
+    """Chunks par section docling, préfixés par le chemin de titres (compté dans le budget)"""
+    for heading, body in sections(text):
+        budget = max_tokens - estimate_tokens(heading) if heading else max_tokens
+        for chunk in sentence_chunks(body, max(budget, max_tokens / 2), overlap_tokens):
+            if heading:
+                chunk = {"content": f"{heading}\n{chunk['content']}", "section": heading}
+            yield chunk
+
+
+STRATEGIES = {
+    "fixed": fixed_chunks,
+    "sentence": sentence_chunks,
+    "section": section_chunks,
+}
+
+
+def chunk_document(text, document_id, strategy="fixed", max_tokens=512, overlap_tokens=0, chunk_id_prefix=None):
+    """Chunks {"content", "metadata": {"document_id", "chunk_index", ["section"], ["chunk_id"]}} d'un document
+
+    Avec chunk_id_prefix, chaque chunk reçoit l'identifiant "<préfixe>:<index>"
+    (metadata.chunk_id, repris par LlamaStack), qui permet de le supprimer.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Stratégie de découpage inconnue: {strategy} (parmi {', '.join(STRATEGIES)})")
+    for i, chunk in enumerate(STRATEGIES[strategy](text, max_tokens, overlap_tokens)):
+        metadata = {"document_id": document_id, "chunk_index": i}
+        if chunk.get("section"):
+            metadata["section"] = chunk["section"]
+        if chunk_id_prefix:
+            metadata["chunk_id"] = f"{chunk_id_prefix}:{i}"
+        yield {"content": chunk["content"], "metadata": metadata}
+
+
+def batched(iterable, size):
+    """Lots de `size` éléments au fil d'un générateur"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def compare_strategies(documents, queries, strategies, max_tokens_values, overlap_values, ks):
+    """Débit de découpage, taille des chunks et qualité de recherche par configuration"""
+    from retrieval_bench import evaluate
+    from vector_store import LocalVectorStore
+
+    rows = []
+    for strategy in strategies:
+        for max_tokens in max_tokens_values:
+            for overlap in overlap_values:
+                if overlap >= max_tokens:
+                    continue
+                start = time.perf_counter()
+                chunks = [chunk for doc in documents
+                          for chunk in chunk_document(doc["text"], doc["document_id"], strategy, max_tokens, overlap)]
+                chunk_s = time.perf_counter() - start
+                store = LocalVectorStore()
+                store.insert(chunks)
+                sizes = [estimate_tokens(c["content"]) for c in chunks]
+                rows.append({
+                    "strategy": strategy,
+                    "max_tokens": max_tokens,
+                    "overlap_tokens": overlap,
+                    "chunks": len(chunks),
+                    "tokens_mean": sum(sizes) / len(sizes) if sizes else 0.0,
+                    "tokens_max": max(sizes, default=0.0),
+                    "chunks_per_s": len(chunks) / chunk_s if chunk_s else 0.0,
+                    "quality": evaluate(store, queries, ks),
+                })
+    return rows
+
+
+def print_comparison(rows, k):
+    print(f"\n{'Stratégie':<9} | {'max':>4} | {'chev.':>5} | {'chunks':>6} | {'tokens moy.':>11} | "
+          f"{'chunks/s':>9} | {f'recall@{k}':>9} | {'MRR':>5}")
+    for row in rows:
+        quality = next(q for q in row["quality"] if q["k"] == k)
+        print(f"{row['strategy']:<9} | {row['max_tokens']:>4} | {row['overlap_tokens']:>5} | {row['chunks']:>6} | "
+              f"{row['tokens_mean']:>11.0f} | {row['chunks_per_s']:>9.0f} | {quality['recall']:>9.0%} | {quality['mrr']:>5.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparaison des stratégies de découpage (débit et qualité de recherche)")
+    parser.add_argument("--corpus", default="datasets/assurance-corpus.jsonl", help="Corpus JSONL {document_id, text}")
+    parser.add_argument("--input", default=None, help="Répertoire de fichiers .md/.txt (sorties docling) à la place du corpus")
+    parser.add_argument("--queries", default="datasets/assurance-retrieval.jsonl", help="Requêtes étiquetées JSONL")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES), help="Stratégies comparées")
+    parser.add_argument("--max-tokens", default="96,192", help="Tailles maximales de chunk (tokens)")
+    parser.add_argument("--overlap-tokens", default="0,24", help="Chevauchements (tokens)")
+    parser.add_argument("--k", type=int, default=3, help="k du recall@k affiché")
+    parser.add_argument("--json", help="Fichier JSON du rapport")
+    args = parser.parse_args()
+
+    from retrieval_bench import load_queries, parse_ints
+    from vector_store import load_corpus
+
+    if args.input:
+        documents = []
+        for name in sorted(os.listdir(args.input)):
+            if name.endswith((".md", ".txt")):
+                with open(os.path.join(args.input, name)) as f:
+                    documents.append({"document_id": name, "text": f.read()})
+    else:
+        documents = load_corpus(args.corpus)
+    queries = load_queries(args.queries)
+    strategies = [s for s in args.strategies.split(",") if s.strip()]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        parser.error(f"stratégies inconnues: {', '.join(unknown)}")
+
+    print(f"✂️  {len(documents)} documents, {len(queries)} requêtes, stratégies: {', '.join(strategies)}")
+    rows = compare_strategies(documents, queries, strategies, parse_ints(args.max_tokens),
+                              parse_ints(args.overlap_tokens), [args.k])
+    print_comparison(rows, args.k)
+    print(f"🧠 Pic de mémoire (RSS): {peak_rss_mib():.0f} Mio")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"💾 Rapport: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Sélection du contexte RAG sous budget de tokens
+
+Avec des chunks de max_tokens 512, knowledge_search peut envoyer au modèle 1B
+bien plus de contexte qu'il n'en exploite, et le prefill coûte à chaque token.
+Le packer compte les tokens avec le tokenizer Llama 3.2 (LLAMA_TOKENIZER:
+fichier tokenizer.json, répertoire du modèle ou identifiant Hugging Face; à
+défaut, estimation à 4 caractères par token comme llama_stub_server.py), puis:
+  1. écarte les chunks quasi identiques à un chunk déjà retenu (shingles de mots)
+  2. retire le chevauchement entre chunks voisins d'un même document (coupe à
+     une position du texte d'origine, dont la mise en forme est conservée:
+     tableaux, listes et titres du markdown docling)
+  3. retient les chunks les mieux classés tant qu'ils tiennent dans le budget
+et rapporte les tokens économisés par requête.
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+
+ESTIMATED_CHARS_PER_TOKEN = 4
+SHINGLE_WORDS = 8
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // ESTIMATED_CHARS_PER_TOKEN) if text else 0
+
+
+def load_token_counter(path=None):
+    """(fonction texte → tokens, description); tokenizers puis transformers, sinon estimation"""
+    path = path or os.getenv("LLAMA_TOKENIZER")
+    if not path:
+        return estimate_tokens, "estimation (4 caractères/token)"
+
+    tokenizer_file = path if path.endswith(".json") else os.path.join(path, "tokenizer.json")
+    if os.path.isfile(tokenizer_file):
+        try:
+            from tokenizers import Tokenizer
+            tokenizer = Tokenizer.from_file(tokenizer_file)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids), f"tokenizers ({tokenizer_file})"
+        except ImportError:
+            pass
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False)), f"transformers ({path})"
+    except Exception as e:
+        print(f"⚠️  Tokenizer {path} indisponible ({e}), estimation à {ESTIMATED_CHARS_PER_TOKEN} caractères/token")
+        return estimate_tokens, "estimation (4 caractères/token)"
+
+
+def _shingles(words, n=SHINGLE_WORDS):
+    if len(words) < n:
+        return {tuple(words)}
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _overlap(first, second):
+    """Nombre de mots de la fin de `first` qui forment le début de `second`"""
+    for size in range(min(len(first), len(second)), 0, -1):
+        if first[-size:] == second[:size]:
+            return size
+    return 0
+
+
+def _neighbors(a, b):
+    meta_a, meta_b = a.get("metadata") or {}, b.get("metadata") or {}
+    if meta_a.get("document_id") is None or meta_a.get("document_id") != meta_b.get("document_id"):
+        return None
+    index_a, index_b = meta_a.get("chunk_index"), meta_b.get("chunk_index")
+    if index_a is None or index_b is None:
+        return None
+    return index_b - index_a
+
+
+@dataclass
+class PackedContext:
+    """Chunks retenus et comptes de tokens d'une requête"""
+    chunks: list = field(default_factory=list)
+    tokens: int = 0
+    input_tokens: int = 0
+    input_chunks: int = 0
+    duplicates: int = 0
+    trimmed_tokens: int = 0
+    over_budget: int = 0
+
+    @property
+    def tokens_saved(self):
+        return self.input_tokens - self.tokens
+
+
+class ContextPacker:
+    """Déduplique et sélectionne les chunks sous `budget_tokens` (0: pas de limite)"""
+
+    def __init__(self, budget_tokens=1024, count_tokens=None, dedup_threshold=0.8):
+        self.budget_tokens = budget_tokens
+        self.count_tokens = count_tokens or estimate_tokens
+        self.dedup_threshold = dedup_threshold
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.input_tokens_total = 0
+        self.packed_tokens_total = 0
+
+    def pack(self, chunks):
+        """Chunks {"content", "metadata", "score"} → PackedContext (ordre de score décroissant)"""
+        ranked = sorted(enumerate(chunks), key=lambda item: (-(item[1].get("score") or 0.0), item[0]))
+        packed = PackedContext(input_chunks=len(chunks))
+        seen = set()
+        selected = []
+
+        for _, chunk in ranked:
+            content = chunk["content"]
+            content_tokens = self.count_tokens(content)
+            packed.input_tokens += content_tokens
+            spans = list(_WORD_RE.finditer(content))
+            if not spans:
+                continue
+            words = [m.group() for m in spans]
+            shingles = _shingles(words)
+            if len(shingles & seen) / len(shingles) >= self.dedup_threshold:
+                packed.duplicates += 1
+                continue
+
+            # Chunks voisins découpés avec chevauchement: ne garder qu'une fois les mots communs
+            start, end = 0, len(words)
+            for other, other_words in selected:
+                position = _neighbors(other, chunk)
+                if position == 1:
+                    start += _overlap(other_words, words[start:end])
+                elif position == -1:
+                    end -= _overlap(words[start:end], other_words)
+            if start >= end:
+                packed.duplicates += 1
+                continue
+            words = words[start:end]
+            if start or end < len(spans):
+                text = content[spans[start].start():spans[end - 1].end()]
+                tokens = self.count_tokens(text)
+            else:
+                text, tokens = content, content_tokens
+            if self.budget_tokens and packed.tokens + tokens > self.budget_tokens:
+                packed.over_budget += 1
+                continue
+            packed.trimmed_tokens += content_tokens - tokens
+            selected.append((chunk, words))
+            seen |= shingles
+            packed.chunks.append(dict(chunk, content=text, tokens=tokens))
+            packed.tokens += tokens
+
+        with self.lock:
+            self.queries += 1
+            self.input_tokens_total += packed.input_tokens
+            self.packed_tokens_total += packed.tokens
+        return packed
+
+    def stats(self):
+        with self.lock:
+            saved = self.input_tokens_total - self.packed_tokens_total
+            return {
+                "budget_tokens": self.budget_tokens,
+                "queries": self.queries,
+                "input_tokens": self.input_tokens_total,
+                "packed_tokens": self.packed_tokens_total,
+                "tokens_saved": saved,
+                "saved_ratio": saved / self.input_tokens_total if self.input_tokens_total else 0.0,
+            }
+
+
+def print_pack(packed):
+    print(f"📦 Contexte: {len(packed.chunks)}/{packed.input_chunks} chunks, {packed.tokens} tokens "
+          f"({packed.tokens_saved} économisés: {packed.duplicates} doublons, {packed.trimmed_tokens} tokens de "
+          f"chevauchement, {packed.over_budget} hors budget)")
@@ -83,6 +83,12 @@ check_llamastack() {
 deploy_docling_pipeline() {
     print_assurance "Déploiement du pipeline Docling pour l'assurance..."
     
+    # Script d'ingestion monté par la tâche docling-process
+    oc create configmap docling-ingest-script -n llama-instruct-32-1b-demo \
+        --from-file=ingest.py --from-file=vector_store.py --from-file=rag_metrics.py \
+        --from-file=embedding_cache.py --from-file=keyword_index.py --from-file=chunking.py \
+        --dry-run=client -o yaml | oc apply -f -
+    
     # Appliquer le pipeline
     oc apply -f docling-pipeline.yaml
     
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Cache disque des appels de découverte LlamaStack (models.list, vector_dbs.list)
+
+Les scripts lancés par cron refont à chaque exécution les mêmes listes de
+modèles et de bases vectorielles avant leur première vraie requête. Les
+résultats sont gardés dans un fichier JSON (DISCOVERY_CACHE_PATH) par URL de
+LlamaStack, avec un TTL (DISCOVERY_CACHE_TTL, 300 s par défaut): les
+exécutions suivantes sautent ces allers-retours. Seuls les champs utilisés par
+les scripts sont conservés; les éléments sont rendus avec les mêmes attributs
+(identifier, model_type, embedding_model, ...).
+
+Le client LlamaStack est importé à la construction (make_client), pas au
+chargement du module, pour que les chemins qui n'en ont pas besoin ne paient
+pas son import.
+"""
+
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+from startup_profile import profile_phase
+
+DEFAULT_TTL = float(os.getenv("DISCOVERY_CACHE_TTL", "300"))
+CACHE_VERSION = 1
+
+MODEL_FIELDS = ("identifier", "model_type", "provider_id")
+VECTOR_DB_FIELDS = ("identifier", "provider_id", "embedding_model", "embedding_dimension")
+
+
+def make_client(base_url, profiler=None):
+    """Client LlamaStack importé et construit à la demande (phases mesurées si profiler)"""
+    with profile_phase(profiler, "import llama_stack_client"):
+        from llama_stack_client import Client
+    with profile_phase(profiler, "construction du client"):
+        return Client(base_url=base_url)
+
+
+class DiscoveryCache:
+    """Résultats de découverte par (URL, type de ressource), expirés après `ttl` secondes"""
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.entries = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data.get("entries", {}) if data.get("version") == CACHE_VERSION else {}
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": CACHE_VERSION, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def get(self, key):
+        """Éléments en cache non expirés, sinon None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires_at"] > time.time():
+                self.hits += 1
+                return entry["items"]
+            self.misses += 1
+            return None
+
+    def put(self, key, items):
+        with self.lock:
+            self.entries[key] = {"expires_at": time.time() + self.ttl, "items": items}
+            self._write()
+
+    def invalidate(self, key=None):
+        """Supprime une entrée (ou toutes), par exemple après l'enregistrement d'une base"""
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+            self._write()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def open_discovery_cache(path=None, ttl=DEFAULT_TTL):
+    """Cache ouvert depuis DISCOVERY_CACHE_PATH (None si non configuré ou TTL nul)"""
+    path = path or os.getenv("DISCOVERY_CACHE_PATH")
+    return DiscoveryCache(path, ttl) if path and ttl > 0 else None
+
+
+def cache_key(client, resource):
+    return f"{getattr(client, 'base_url', '')}|{resource}"
+
+
+def _cached_list(client, resource, fetch, fields, cache=None, profiler=None):
+    key = cache_key(client, resource)
+    items = None
+    if cache is not None:
+        with profile_phase(profiler, f"{resource}.list() (cache disque)"):
+            items = cache.get(key)
+    if items is None:
+        with profile_phase(profiler, f"{resource}.list()"):
+            items = [{name: getattr(obj, name, None) for name in fields} for obj in fetch()]
+        if cache is not None:
+            cache.put(key, items)
+    return [SimpleNamespace(**item) for item in items]
+
+
+def list_models(client, cache=None, profiler=None):
+    """client.models.list() via le cache disque"""
+    return _cached_list(client, "models", client.models.list, MODEL_FIELDS, cache, profiler)
+
+
+def list_vector_dbs(client, cache=None, profiler=None):
+    """client.vector_dbs.list() via le cache disque"""
+    return _cached_list(client, "vector_dbs", client.vector_dbs.list, VECTOR_DB_FIELDS, cache, profiler)
+
+
+def find_vector_db(client, vector_db_id, cache=None, profiler=None):
+    """(base ou None, liste des bases); une base absente du cache relance la découverte"""
+    vector_dbs = list_vector_dbs(client, cache, profiler)
+    target = next((db for db in vector_dbs if db.identifier == vector_db_id), None)
+    if target is None and cache is not None:
+        cache.invalidate(cache_key(client, "vector_dbs"))
+        vector_dbs = list_vector_dbs(client, cache, profiler)
+        target = next((db for db in vector_dbs if db.identifier == vector_db_id), None)
+    return target, vector_dbs
+
+
+def print_discovery_cache_stats(stats):
+    print(f"🗂️  Cache de découverte: {stats['hits']} hits, {stats['misses']} miss, "
+          f"taux {stats['hit_rate']:.0%}, {stats['entries']} entrées")
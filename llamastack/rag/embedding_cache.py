@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Cache persistant d'embeddings adressé par contenu
+
+Les vecteurs sont stockés dans un tableau de float32 mappé en mémoire
+(<path>.f32, un emplacement fixe de `dim` floats par entrée) et l'index
+(clé → emplacement, dans l'ordre LRU) dans <path>.index.json. La clé combine
+l'identifiant du modèle et le sha256 du texte exact: un même chunk ou une même
+question n'est embeddé qu'une fois, y compris d'une exécution à l'autre.
+
+Au-delà de `capacity` entrées, les entrées les moins récemment utilisées sont
+évincées par lots et l'index est réécrit avant que leurs emplacements ne
+soient réutilisés: après un crash, aucune clé de l'index ne pointe vers un
+vecteur écrasé. Le cache est partagé entre threads d'un même processus; entre
+processus (deux PipelineRuns sur le même PVC), un verrou exclusif flock sur
+<path>.lock sérialise les écrivains, et l'index n'est lu qu'une fois le verrou
+obtenu.
+"""
+
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+DEFAULT_DIM = 768
+DEFAULT_CAPACITY = int(os.getenv("EMBEDDING_CACHE_CAPACITY", "50000"))
+FLOAT_SIZE = 4
+
+
+def embedding_key(model, text):
+    """Clé (modèle, sha256 du texte)"""
+    return f"{model}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+
+class EmbeddingCache:
+    """Cache LRU d'embeddings sur fichier mappé en mémoire + index JSON"""
+
+    def __init__(self, path, dim=DEFAULT_DIM, capacity=DEFAULT_CAPACITY, flush_every=256):
+        self.path = path
+        self.data_path = path + ".f32"
+        self.index_path = path + ".index.json"
+        self.lock_path = path + ".lock"
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.slots = OrderedDict()
+        self.free = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = 0
+
+        os.makedirs(os.path.dirname(self.data_path) or ".", exist_ok=True)
+        self.lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print(f"⏳ Cache d'embeddings {path} utilisé par un autre processus, attente du verrou...")
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            dim, capacity = index["dim"], index["capacity"]
+            self.slots = OrderedDict((key, slot) for key, slot in index["entries"])
+        self.dim = dim
+        self.capacity = capacity
+        used = set(self.slots.values())
+        self.free = [slot for slot in range(capacity - 1, -1, -1) if slot not in used]
+
+        size = capacity * dim * FLOAT_SIZE
+        with open(self.data_path, "a+b") as f:
+            if os.path.getsize(self.data_path) < size:
+                f.truncate(size)
+        self.file = open(self.data_path, "r+b")
+        self.mmap = mmap.mmap(self.file.fileno(), size)
+        self.floats = memoryview(self.mmap).cast("f")
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read(self, slot):
+        return self.floats[slot * self.dim:(slot + 1) * self.dim].tolist()
+
+    def get(self, model, text):
+        """Embedding en cache ou None"""
+        key = embedding_key(model, text)
+        with self.lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.slots.move_to_end(key)
+            self.hits += 1
+            return self._read(slot)
+
+    def put(self, model, text, vector):
+        """Enregistre un embedding (éviction LRU si le cache est plein)"""
+        if len(vector) != self.dim:
+            raise ValueError(f"dimension {len(vector)} incompatible avec le cache ({self.dim})")
+        key = embedding_key(model, text)
+        with self.lock:
+            slot = self.slots.pop(key, None)
+            if slot is None:
+                if not self.free:
+                    self._evict()
+                slot = self.free.pop()
+            self.floats[slot * self.dim:(slot + 1) * self.dim] = array("f", vector)
+            self.slots[key] = slot
+            self.dirty += 1
+            if self.dirty >= self.flush_every:
+                self._flush()
+
+    def embed_many(self, model, texts, embed_fn):
+        """Embeddings de `texts` dans l'ordre; seuls les textes absents passent par embed_fn(list)"""
+        vectors = [self.get(model, text) for text in texts]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            computed = dict(zip(missing, embed_fn(missing)))
+            for text, vector in computed.items():
+                self.put(model, text, vector)
+            vectors = [v if v is not None else list(computed[t]) for t, v in zip(texts, vectors)]
+        return vectors
+
+    def _evict(self):
+        # Lot d'entrées LRU retirées de l'index écrit sur disque avant la réutilisation de leurs emplacements
+        for _ in range(min(self.flush_every, len(self.slots))):
+            _, slot = self.slots.popitem(last=False)
+            self.free.append(slot)
+            self.evictions += 1
+        self._flush()
+
+    def _flush(self):
+        self.mmap.flush()
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"dim": self.dim, "capacity": self.capacity, "entries": list(self.slots.items())}, f)
+        os.replace(tmp, self.index_path)
+        self.dirty = 0
+
+    def flush(self):
+        """Écrit les vecteurs et l'index sur disque"""
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            if self.mmap.closed:
+                return
+            self._flush()
+            self.floats.release()
+            self.mmap.close()
+            self.file.close()
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+
+    def stats(self):
+        """Métriques hit/miss et occupation"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.slots),
+                "capacity": self.capacity,
+                "dim": self.dim,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes": len(self.slots) * self.dim * FLOAT_SIZE,
+            }
+
+
+def cached_embedder(cache, model, embed_fn):
+    """Enveloppe une fonction d'embedding texte → vecteur avec le cache"""
+    def embed(text):
+        return cache.embed_many(model, [text], lambda texts: [embed_fn(t) for t in texts])[0]
+    return embed
+
+
+def open_embedding_cache(path=None, dim=DEFAULT_DIM):
+    """Cache ouvert depuis EMBEDDING_CACHE_PATH (None si non configuré)"""
+    path = path or os.getenv("EMBEDDING_CACHE_PATH")
+    return EmbeddingCache(path, dim=dim) if path else None
+
+
+def print_embedding_cache_stats(stats):
+    print(f"🧮 Cache d'embeddings: {stats['hits']} hits, {stats['misses']} miss, taux {stats['hit_rate']:.0%}, "
+          f"{stats['entries']}/{stats['capacity']} entrées, {stats['evictions']} évictions")
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Ingestion parallèle et incrémentale de documents dans une base vectorielle LlamaStack
+
+Chaque document est converti par docling-serve, découpé en chunks de max_tokens
+selon la stratégie --chunker (chunking.py: fixed, sentence ou section) puis
+inséré par lots via client.vector_io.insert au fil du découpage (les embeddings
+sont calculés par LlamaStack avec le modèle de la base, ou côté client à
+travers le cache d'embeddings avec --embedding-cache). Jusqu'à num_workers
+documents sont traités en parallèle: la mémoire reste bornée par ces documents
+en cours et un lot de chunks chacun. Le rapport donne pages/s (nombre de pages
+du document converti par docling), chunks/s et le pic de mémoire résidente.
+
+Un manifeste JSON garde l'empreinte sha256 de chaque fichier ingéré avec les
+paramètres d'ingestion: une nouvelle exécution ne traite que les fichiers
+nouveaux ou modifiés. Le manifeste est réécrit après chaque document, une
+exécution interrompue reprend donc là où elle s'était arrêtée.
+
+Chaque chunk porte un identifiant dérivé du document et de son empreinte
+(metadata.chunk_id). Avant de réinsérer un document déjà présent dans la base
+(fichier modifié, paramètres changés ou --force), les chunks de sa version
+précédente sont supprimés par ces identifiants. Si le client LlamaStack
+n'expose pas la suppression (vector_io.delete), ou si la version précédente a
+été ingérée sans identifiants, le document est laissé tel quel (ni réinsertion,
+ni mise à jour du manifeste) et signalé dans le rapport; les autres documents
+sont ingérés normalement. Pour le remplacer, réingérer dans une base neuve
+(--vector-db <base>_v2 --force).
+
+Avec --keyword-index, les mêmes chunks alimentent un index BM25 persistant
+(keyword_index.py) pour la recherche hybride mots-clés + vecteurs; les chunks
+d'un document modifié y sont remplacés de la même façon.
+
+Exemple:
+  python3 ingest.py --input /workspace/pdfs --vector-db assurance_milvus_db \\
+      --num-workers 3 --max-tokens 512 --chunker section --overlap-tokens 64 --manifest /state/manifest.json
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from chunking import STRATEGIES, batched, chunk_document
+from embedding_cache import EmbeddingCache, print_embedding_cache_stats
+from keyword_index import BM25Index
+from rag_metrics import format_ms, peak_rss_mib, summarize_latencies
+
+
+def file_sha256(path):
+    """Empreinte sha256 du contenu d'un fichier"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_documents(input_dir, extensions=(".pdf",)):
+    """Fichiers à ingérer, triés pour un ordre stable"""
+    return sorted(
+        os.path.join(input_dir, name)
+        for name in os.listdir(input_dir)
+        if name.lower().endswith(extensions)
+    )
+
+
+class Manifest:
+    """Empreintes des documents déjà ingérés (fichier JSON)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f).get("documents", {})
+
+    def is_current(self, name, sha256, settings):
+        entry = self.entries.get(name)
+        return entry is not None and entry["sha256"] == sha256 and entry["settings"] == settings
+
+    def record(self, name, sha256, settings, chunks, chunk_id_prefix=None):
+        with self.lock:
+            self.entries[name] = {
+                "sha256": sha256,
+                "settings": settings,
+                "chunks": chunks,
+                "chunk_id_prefix": chunk_id_prefix,
+                "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"documents": self.entries}, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+class DoclingConverter:
+    """Conversion d'un fichier en markdown via l'API docling-serve"""
+
+    def __init__(self, url="http://localhost:5001", timeout=600):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def wait_until_ready(self, timeout=300, interval=2.0):
+        """Attend que /health réponde (au lieu d'un sleep fixe)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with urllib.request.urlopen(f"{self.url}/health", timeout=5) as response:
+                    if response.status == 200:
+                        return True
+            except (urllib.error.URLError, OSError):
+                pass
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+
+    def convert(self, path):
+        """(markdown, nombre de pages ou None); les pages viennent du document docling (json)"""
+        with open(path, "rb") as f:
+            encoded = base64.b64encode(f.read()).decode()
+        body = {
+            "options": {"to_formats": ["md", "json"]},
+            "file_sources": [{"base64_string": encoded, "filename": os.path.basename(path)}],
+        }
+        request = urllib.request.Request(
+            f"{self.url}/v1/convert/source",
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            result = json.load(response)
+        document = result.get("document") or {}
+        text = document.get("md_content") or document.get("text_content")
+        if not text:
+            raise RuntimeError(f"conversion vide ({result.get('status', 'statut inconnu')})")
+        pages = (document.get("json_content") or {}).get("pages")
+        return text, len(pages) if pages else None
+
+
+def chunk_id_prefix(name, sha256):
+    """Préfixe des identifiants de chunks d'une version de document"""
+    return f"{name}:{sha256[:12]}"
+
+
+def previous_chunk_ids(entry):
+    """Identifiants des chunks d'une entrée du manifeste (None si ingérée sans identifiants)"""
+    prefix = entry.get("chunk_id_prefix")
+    return [f"{prefix}:{i}" for i in range(entry["chunks"])] if prefix else None
+
+
+def vector_chunk_deleter(client, vector_db_id):
+    """delete(chunk_ids) sur la base, ou None si le client LlamaStack n'expose pas la suppression"""
+    delete = getattr(client.vector_io, "delete", None)
+    if delete is None:
+        return None
+
+    def delete_chunks(chunk_ids):
+        delete(vector_db_id=vector_db_id, chunk_ids=chunk_ids)
+    return delete_chunks
+
+
+def ensure_vector_db(client, vector_db_id, embed_model_id, embedding_dimension=768, provider_id="milvus"):
+    """Enregistre la base vectorielle si elle n'existe pas encore"""
+    if any(db.identifier == vector_db_id for db in client.vector_dbs.list()):
+        return False
+    client.vector_dbs.register(
+        vector_db_id=vector_db_id,
+        embedding_model=embed_model_id,
+        embedding_dimension=embedding_dimension,
+        provider_id=provider_id,
+    )
+    return True
+
+
+def cached_chunk_embedder(client, cache, embed_model_id):
+    """Ajoute à chaque chunk son embedding, calculé seulement pour les textes absents du cache"""
+    def embed(texts):
+        return client.inference.embeddings(model_id=embed_model_id, contents=texts).embeddings
+
+    def attach(chunks):
+        vectors = cache.embed_many(embed_model_id, [c["content"] for c in chunks], embed)
+        return [dict(chunk, embedding=list(vector)) for chunk, vector in zip(chunks, vectors)]
+    return attach
+
+
+def ingest_document(path, converter, insert_fn, settings, batch_size=64, keyword_index=None,
+                    id_prefix=None, stale_chunk_ids=None, delete_fn=None):
+    """Convertit, découpe et insère un document lot par lot; retourne (chunks, durées et pages)
+
+    Les chunks de la version précédente (stale_chunk_ids) sont supprimés de la
+    base et de l'index BM25 après la conversion, juste avant l'insertion de la
+    nouvelle version: les deux index restent d'accord même si elle échoue.
+    """
+    name = os.path.basename(path)
+    start = time.perf_counter()
+    text, pages = converter.convert(path)
+    converted = time.perf_counter()
+
+    if stale_chunk_ids:
+        for batch in batched(stale_chunk_ids, batch_size):
+            delete_fn(batch)
+    if keyword_index is not None:
+        keyword_index.remove_document(name)
+    chunks = chunk_document(text, name, settings.get("chunker", "fixed"),
+                            settings["max_tokens"], settings["overlap_tokens"], id_prefix)
+    count = 0
+    # L'index BM25 garde de toute façon le contenu des chunks: seule la liste pour lui est conservée
+    indexed = [] if keyword_index is not None else None
+    for batch in batched(chunks, batch_size):
+        insert_fn(batch)
+        count += len(batch)
+        if indexed is not None:
+            indexed += batch
+    if keyword_index is not None:
+        keyword_index.add(indexed)
+    end = time.perf_counter()
+    return count, {"convert_s": converted - start, "insert_s": end - converted, "total_s": end - start,
+                   "pages": pages}
+
+
+def run_ingestion(paths, converter, insert_fn, manifest, settings, num_workers=2, batch_size=64, force=False,
+                  keyword_index=None, delete_fn=None):
+    """Ingestion parallèle des documents nouveaux ou modifiés
+
+    Un document déjà présent dans la base cible est remplacé: ses anciens chunks
+    sont supprimés avec delete_fn. Si ce n'est pas possible (pas de delete_fn, ou
+    version précédente sans identifiants de chunks), il est ignoré sans toucher
+    à son entrée du manifeste et listé dans report["blocked"].
+    """
+    report = {"documents": len(paths), "skipped": 0, "ingested": 0, "failed": 0, "chunks": 0, "pages": 0,
+              "pages_unknown": 0, "replaced": 0, "blocked": {}, "convert_s": [], "insert_s": [], "errors": {}}
+    pending = []
+    for path in paths:
+        name = os.path.basename(path)
+        sha256 = file_sha256(path)
+        if not force and manifest.is_current(name, sha256, settings):
+            report["skipped"] += 1
+            print(f"⏭️  {name}: inchangé")
+            continue
+        previous = manifest.entries.get(name)
+        stale = None
+        # Une version précédente dans une autre base (base neuve ou versionnée) ne gêne pas
+        if previous is not None and previous["settings"].get("vector_db_id") == settings["vector_db_id"]:
+            stale = previous_chunk_ids(previous)
+            if stale is None or delete_fn is None:
+                reason = ("le client LlamaStack n'expose pas vector_io.delete" if delete_fn is None
+                          else "version précédente ingérée sans identifiants de chunks")
+                report["blocked"][name] = reason
+                print(f"⛔ {name}: déjà présent dans '{settings['vector_db_id']}', non remplacé ({reason})")
+                continue
+            print(f"🔁 {name}: déjà ingéré, {len(stale)} chunks de la version précédente seront remplacés")
+        pending.append((path, name, sha256, stale))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+        futures = {
+            executor.submit(ingest_document, path, converter, insert_fn, settings, batch_size, keyword_index,
+                            chunk_id_prefix(name, sha256), stale, delete_fn): (name, sha256, stale)
+            for path, name, sha256, stale in pending
+        }
+        for future in as_completed(futures):
+            name, sha256, stale = futures[future]
+            try:
+                count, timings = future.result()
+            except Exception as e:
+                report["failed"] += 1
+                report["errors"][name] = repr(e)
+                print(f"❌ {name}: {e}")
+                continue
+            manifest.record(name, sha256, settings, count, chunk_id_prefix(name, sha256))
+            report["ingested"] += 1
+            report["replaced"] += 1 if stale is not None else 0
+            report["chunks"] += count
+            if timings["pages"] is None:
+                report["pages_unknown"] += 1
+            else:
+                report["pages"] += timings["pages"]
+            report["convert_s"].append(timings["convert_s"])
+            report["insert_s"].append(timings["insert_s"])
+            print(f"✅ {name}: {count} chunks, {timings['pages'] or '?'} pages (conversion {format_ms(timings['convert_s'])}, "
+                  f"insertion {format_ms(timings['insert_s'])})")
+
+    report["wall_time_s"] = wall_time = time.perf_counter() - start
+    # Pages/s seulement si docling a donné le nombre de pages de chaque document
+    report["pages_per_s"] = report["pages"] / wall_time if wall_time and not report["pages_unknown"] else None
+    report["chunks_per_s"] = report["chunks"] / wall_time if wall_time else 0.0
+    report["peak_rss_mib"] = peak_rss_mib()
+    report["convert_s"] = summarize_latencies(report["convert_s"])
+    report["insert_s"] = summarize_latencies(report["insert_s"])
+    return report
+
+
+def print_report(report):
+    print(f"\n📊 {report['documents']} documents: {report['ingested']} ingérés ({report['replaced']} remplacés), "
+          f"{report['skipped']} inchangés, {report['failed']} en échec, {report['chunks']} chunks en "
+          f"{report['wall_time_s']:.1f} s")
+    print(f"   - Conversion p50: {format_ms(report['convert_s']['p50'])} | max: {format_ms(report['convert_s']['max'])}")
+    print(f"   - Insertion p50: {format_ms(report['insert_s']['p50'])} | max: {format_ms(report['insert_s']['max'])}")
+    pages_per_s = f"{report['pages_per_s']:.2f}" if report["pages_per_s"] is not None else "N/A"
+    unknown = f", {report['pages_unknown']} documents sans nombre de pages" if report["pages_unknown"] else ""
+    print(f"   - Débit: {pages_per_s} pages/s, {report['chunks_per_s']:.1f} chunks/s "
+          f"({report['pages']} pages{unknown}) | Pic de mémoire (RSS): {report['peak_rss_mib']:.0f} Mio")
+    if report["blocked"]:
+        print(f"⛔ {len(report['blocked'])} documents modifiés non remplacés: {', '.join(sorted(report['blocked']))}")
+        print("   Réingérer dans une base neuve pour les mettre à jour (--vector-db <base>_v2 --force)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion parallèle et incrémentale de documents (docling-serve + LlamaStack)")
+    parser.add_argument("--input", required=True, help="Répertoire des documents (PDF)")
+    parser.add_argument("--vector-db", default=os.getenv("VECTOR_DB_ID", "my_milvus_db"), help="Base vectorielle cible")
+    parser.add_argument("--embed-model", default=os.getenv("EMBED_MODEL_ID", "granite-embedding-125m"), help="Modèle d'embedding")
+    parser.add_argument("--embedding-dimension", type=int, default=768, help="Dimension des embeddings (création de la base)")
+    parser.add_argument("--max-tokens", type=int, default=int(os.getenv("MAX_TOKENS", "512")), help="Tokens maximum par chunk")
+    parser.add_argument("--overlap-tokens", type=int, default=int(os.getenv("OVERLAP_TOKENS", "0")), help="Chevauchement entre chunks (tokens)")
+    parser.add_argument("--chunker", choices=list(STRATEGIES), default=os.getenv("CHUNK_STRATEGY", "fixed"),
+                        help="Stratégie de découpage (chunking.py)")
+    parser.add_argument("--num-workers", type=int, default=int(os.getenv("NUM_WORKERS", "2")), help="Documents traités en parallèle")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks par appel vector_io.insert")
+    parser.add_argument("--docling-url", default=os.getenv("DOCLING_URL", "http://localhost:5001"), help="URL de docling-serve")
+    parser.add_argument("--docling-timeout", type=int, default=300, help="Attente maximale de docling-serve (s)")
+    parser.add_argument("--url", default=os.getenv("LLAMA_STACK_URL", "http://lsd-llama-32-1b-instruct-service:8321"), help="URL de LlamaStack")
+    parser.add_argument("--embedding-cache", default=os.getenv("EMBEDDING_CACHE_PATH"),
+                        help="Cache d'embeddings persistant (chemin sans extension)")
+    parser.add_argument("--keyword-index", default=os.getenv("KEYWORD_INDEX_PATH"),
+                        help="Index BM25 persistant des chunks (recherche hybride)")
+    parser.add_argument("--manifest", help="Manifeste des empreintes (défaut: <input>/.ingest-manifest.json)")
+    parser.add_argument("--force", action="store_true", help="Réingérer tous les documents")
+    parser.add_argument("--json", help="Fichier JSON du rapport")
+    args = parser.parse_args()
+
+    from llama_stack_client import Client
+
+    settings = {
+        "vector_db_id": args.vector_db,
+        "embed_model_id": args.embed_model,
+        "max_tokens": args.max_tokens,
+        "overlap_tokens": args.overlap_tokens,
+    }
+    # Absente des manifestes existants: fixed n'y figure pas pour ne pas réingérer ces documents
+    if args.chunker != "fixed":
+        settings["chunker"] = args.chunker
+    manifest = Manifest(args.manifest or os.path.join(args.input, ".ingest-manifest.json"))
+    paths = list_documents(args.input)
+    print(f"📄 {len(paths)} documents dans {args.input} → '{args.vector_db}' ({args.num_workers} workers, "
+          f"découpage {args.chunker} de {args.max_tokens} tokens)")
+
+    converter = DoclingConverter(args.docling_url)
+    print(f"⏳ Attente de docling-serve ({args.docling_url})...")
+    if not converter.wait_until_ready(timeout=args.docling_timeout):
+        print(f"❌ docling-serve indisponible après {args.docling_timeout} s")
+        return 1
+
+    client = Client(base_url=args.url)
+    if ensure_vector_db(client, args.vector_db, args.embed_model, args.embedding_dimension):
+        print(f"🗄️  Base vectorielle '{args.vector_db}' créée")
+
+    cache = EmbeddingCache(args.embedding_cache, dim=args.embedding_dimension) if args.embedding_cache else None
+    attach_embeddings = cached_chunk_embedder(client, cache, args.embed_model) if cache else None
+
+    keyword_index = BM25Index.open(args.keyword_index) if args.keyword_index else None
+    if keyword_index is not None:
+        missing = set(manifest.entries) - keyword_index.document_ids()
+        if missing and not args.force:
+            print(f"⚠️  {len(missing)} documents déjà ingérés absents de l'index BM25 (relancer avec --force pour le compléter)")
+
+    def insert(chunks):
+        if attach_embeddings:
+            chunks = attach_embeddings(chunks)
+        client.vector_io.insert(vector_db_id=args.vector_db, chunks=chunks)
+
+    try:
+        report = run_ingestion(paths, converter, insert, manifest, settings, num_workers=args.num_workers,
+                               batch_size=args.batch_size, force=args.force, keyword_index=keyword_index,
+                               delete_fn=vector_chunk_deleter(client, args.vector_db))
+    finally:
+        if cache:
+            cache.close()
+        if keyword_index is not None:
+            keyword_index.save(args.keyword_index)
+    print_report(report)
+    if keyword_index is not None:
+        report["keyword_index_chunks"] = len(keyword_index)
+        print(f"🔤 Index BM25: {len(keyword_index)} chunks ({args.keyword_index})")
+    if cache:
+        report["embedding_cache"] = cache.stats()
+        print_embedding_cache_stats(report["embedding_cache"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["failed"] or report["blocked"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Index BM25 local et recherche hybride mots-clés + vecteurs
+
+La recherche dense (vector_io.query) rate souvent les requêtes qui tiennent à un
+terme exact du métier ("franchise", "prescription", "résiliation"). L'index
+inversé BM25, construit pendant l'ingestion à partir des mêmes chunks, retrouve
+ces termes; ses résultats sont fusionnés avec ceux de la base vectorielle par
+reciprocal rank fusion (RRF), qui ne combine que les rangs et n'a donc pas
+besoin de scores comparables.
+
+Les mots sont normalisés comme dans vector_store.tokenize (minuscules, sans
+accents, pluriels simples et mots outils retirés).
+
+Remplacer un document ne touche que ses propres postings: ses chunks sont
+marqués supprimés et retirés des listes de leurs termes, sans réindexer le
+reste du corpus. L'index est compacté à la sauvegarde.
+"""
+
+import heapq
+import json
+import math
+import os
+import threading
+from collections import Counter
+
+from vector_store import chunk_key, tokenize
+
+INDEX_VERSION = 1
+
+
+class BM25Index:
+    """Index inversé BM25 (Okapi) sur des chunks {"content", "metadata"}"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        # Positions des chunks supprimés: None dans chunks, 0 dans lengths
+        self.chunks = []
+        self.lengths = []
+        self.postings = {}
+        self.documents = {}
+        self.live = 0
+        self.total_length = 0
+
+    def __len__(self):
+        return self.live
+
+    def _index(self, chunks):
+        for chunk in chunks:
+            i = len(self.chunks)
+            terms = Counter(tokenize(chunk["content"]))
+            metadata = chunk.get("metadata") or {}
+            self.chunks.append({"content": chunk["content"], "metadata": metadata})
+            self.lengths.append(sum(terms.values()))
+            self.live += 1
+            self.total_length += self.lengths[i]
+            self.documents.setdefault(metadata.get("document_id"), []).append(i)
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[i] = tf
+
+    def _remove_document(self, document_id):
+        for i in self.documents.pop(document_id, []):
+            for term in set(tokenize(self.chunks[i]["content"])):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(i, None)
+                    if not postings:
+                        del self.postings[term]
+            self.live -= 1
+            self.total_length -= self.lengths[i]
+            self.chunks[i], self.lengths[i] = None, 0
+
+    def add(self, chunks):
+        with self.lock:
+            self._index(chunks)
+
+    def document_ids(self):
+        with self.lock:
+            return set(self.documents)
+
+    def remove_document(self, document_id):
+        """Retire les chunks d'un document (coût proportionnel à ce document)"""
+        with self.lock:
+            self._remove_document(document_id)
+
+    def replace_document(self, document_id, chunks):
+        """Remplace les chunks d'un document (réingestion d'un fichier modifié)"""
+        with self.lock:
+            self._remove_document(document_id)
+            self._index(chunks)
+
+    def query(self, query, k=5):
+        """Top-k chunks par score BM25 (même forme que LocalVectorStore.query)"""
+        terms = set(tokenize(query))
+        with self.lock:
+            n = self.live
+            if not n or not terms:
+                return []
+            avg_length = self.total_length / n or 1.0
+            scores = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1.0 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for i, tf in postings.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * self.lengths[i] / avg_length)
+                    scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [dict(self.chunks[i], score=score) for i, score in top]
+
+    def save(self, path):
+        """Écriture atomique et compactée: chunks, longueurs et postings aplaties [chunk, tf, chunk, tf, ...]"""
+        with self.lock:
+            positions = {}
+            for i, chunk in enumerate(self.chunks):
+                if chunk is not None:
+                    positions[i] = len(positions)
+            data = {
+                "version": INDEX_VERSION,
+                "k1": self.k1,
+                "b": self.b,
+                "chunks": [c for c in self.chunks if c is not None],
+                "lengths": [self.lengths[i] for i in positions],
+                "postings": {t: [x for i, tf in p.items() for x in (positions[i], tf)] for t, p in self.postings.items()},
+            }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"Version d'index inconnue: {data.get('version')}")
+        index = cls(k1=data["k1"], b=data["b"])
+        index.chunks = data["chunks"]
+        index.lengths = data["lengths"]
+        index.postings = {t: dict(zip(p[::2], p[1::2])) for t, p in data["postings"].items()}
+        for i, chunk in enumerate(index.chunks):
+            index.documents.setdefault(chunk["metadata"].get("document_id"), []).append(i)
+        index.live = len(index.chunks)
+        index.total_length = sum(index.lengths)
+        return index
+
+    @classmethod
+    def open(cls, path):
+        """Index existant, sinon index vide (créé à la première sauvegarde)"""
+        return cls.load(path) if os.path.exists(path) else cls()
+
+
+def reciprocal_rank_fusion(result_lists, rrf_k=60, weights=None, key_fn=chunk_key):
+    """Fusionne des listes classées: score = somme des poids / (rrf_k + rang)
+
+    Les chunks sont identifiés par key_fn (vector_store.chunk_key par défaut);
+    chaque résultat garde son rang dans chaque liste (None s'il en est absent).
+    """
+    weights = weights or [1.0] * len(result_lists)
+    fused = {}
+    for source, (results, weight) in enumerate(zip(result_lists, weights)):
+        for rank, chunk in enumerate(results, 1):
+            key = key_fn(chunk)
+            entry = fused.setdefault(key, {"chunk": chunk, "score": 0.0, "ranks": [None] * len(result_lists)})
+            entry["score"] += weight / (rrf_k + rank)
+            entry["ranks"][source] = rank
+    ordered = sorted(fused.values(), key=lambda e: e["score"], reverse=True)
+    return [dict(e["chunk"], score=e["score"], ranks=e["ranks"]) for e in ordered]
+
+
+class HybridRetriever:
+    """Recherche vectorielle + BM25 fusionnées par RRF
+
+    Chaque recherche renvoie `candidates` résultats; seuls les k premiers après
+    fusion sont gardés, ce qui permet un k plus petit (moins de contexte à
+    prefiller) à rappel égal.
+    """
+
+    def __init__(self, vector_retriever, keyword_index, candidates=20, rrf_k=60, weights=None):
+        self.vector_retriever = vector_retriever
+        self.keyword_index = keyword_index
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.weights = weights
+
+    def query(self, query, k=5):
+        n = max(k, self.candidates)
+        vector_hits = self.vector_retriever.query(query, n)
+        keyword_hits = self.keyword_index.query(query, n)
+        return reciprocal_rank_fusion([vector_hits, keyword_hits], self.rrf_k, self.weights)[:k]
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark TTFT: disposition naïve vs disposition stable en préfixe (prompt_assembly.py)
+
+Pour chaque requête du jeu étiqueté, les chunks retrouvés sont placés dans un
+prompt chat soit comme dans un tour d'agent (naïf: question puis chunks par
+score), soit avec PromptAssembler (système et outils, chunks fréquents, ordre
+canonique, question en dernier).
+Chaque prompt est envoyé en streaming au vLLM (/v1/chat/completions) et le
+benchmark compare le TTFT, qui sur un modèle 1B est dominé par le prefill du
+contexte, ainsi que la part du prompt commune avec la requête précédente.
+
+Avec --stub, chaque disposition est mesurée contre son propre serveur simulé
+avec cache de préfixes (llama_stub_server.py), sans GPU ni cluster.
+
+Exemples:
+  python3 prefix_bench.py --stub --rounds 3
+  python3 prefix_bench.py --url http://localhost:8000 --retrieval llamastack --vector-db assurance_milvus_db
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from llama_client import (  # noqa: E402
+    SSE_DONE,
+    PooledHTTPClient,
+    StreamMetrics,
+    build_endpoints,
+    chat_payload,
+    get_model_url,
+    parse_sse_line,
+    stream_options,
+)
+
+from agent_pool import rag_tools  # noqa: E402
+from prompt_assembly import PromptAssembler, messages_text, naive_messages, shared_prefix_chars  # noqa: E402
+from rag_metrics import format_ms, summarize_latencies  # noqa: E402
+from retrieval_bench import LlamaStackRetriever, load_queries  # noqa: E402
+from vector_store import LocalVectorStore, load_corpus  # noqa: E402
+
+# Prompt système des agents de test-assurance-rag.py
+ASSURANCE_INSTRUCTIONS = (
+    "Tu es un expert en assurance spécialisé dans l'analyse de documents d'assurance. "
+    "Tu peux répondre aux questions sur les polices d'assurance, les garanties, les exclusions, "
+    "les procédures de sinistre et les aspects réglementaires. Utilise les informations de la "
+    "base de connaissances pour fournir des réponses précises et utiles."
+)
+
+LAYOUTS = ("naive", "prefix")
+
+QUESTION_VARIANTS = ("", "Peux-tu m'expliquer:", "J'aimerais savoir:", "Dans mon contrat,")
+
+
+def measure_ttft(http, url, messages, max_tokens, timeout=120):
+    """TTFT (s) et tokens de prompt servis depuis le cache (si vLLM les rapporte)"""
+    metrics = StreamMetrics()
+    payload = stream_options(chat_payload(messages, max_tokens=max_tokens, temperature=0.0))
+    with http.stream_post(url, json=payload, timeout=timeout) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        for line in response.iter_lines():
+            chunk = parse_sse_line(line)
+            if chunk is SSE_DONE:
+                break
+            if chunk is not None:
+                metrics.feed(chunk)
+    metrics.finish()
+    details = metrics.usage.get("prompt_tokens_details") or {}
+    return metrics.ttft, metrics.usage.get("prompt_tokens"), details.get("cached_tokens")
+
+
+def run_layout(layout, http, url, workload, instructions, tools, max_tokens):
+    """Envoie la charge avec une disposition et retourne ses mesures"""
+    assembler = PromptAssembler(instructions, tools=tools)
+    system = assembler.system_prompt()
+    ttfts, prompt_tokens, cached_tokens, shared = [], [], [], []
+    previous = ""
+
+    for question, chunks in workload:
+        if layout == "prefix":
+            messages = assembler.messages(question, chunks)
+        else:
+            messages = naive_messages(system, question, chunks)
+        text = messages_text(messages)
+        if previous:
+            shared.append(shared_prefix_chars(previous, text) / len(text))
+        previous = text
+
+        ttft, tokens, cached = measure_ttft(http, url, messages, max_tokens)
+        ttfts.append(ttft)
+        if tokens:
+            prompt_tokens.append(tokens)
+        if cached is not None:
+            cached_tokens.append(cached)
+
+    return {
+        "layout": layout,
+        "requests": len(workload),
+        "ttft_s": summarize_latencies(ttfts),
+        "prompt_tokens_mean": sum(prompt_tokens) / len(prompt_tokens) if prompt_tokens else None,
+        "cached_token_ratio": sum(cached_tokens) / sum(prompt_tokens) if cached_tokens and prompt_tokens else None,
+        "shared_prefix_ratio": sum(shared) / len(shared) if shared else None,
+    }
+
+
+def print_results(results):
+    print(f"\n{'Disposition':<12} | {'TTFT p50':>9} | {'TTFT p95':>9} | {'tokens':>6} | {'en cache':>8} | {'préfixe commun':>14}")
+    for r in results:
+        ttft = r["ttft_s"]
+        tokens = f"{r['prompt_tokens_mean']:.0f}" if r["prompt_tokens_mean"] else "N/A"
+        cached = f"{r['cached_token_ratio']:.0%}" if r["cached_token_ratio"] is not None else "N/A"
+        shared = f"{r['shared_prefix_ratio']:.0%}" if r["shared_prefix_ratio"] is not None else "N/A"
+        print(f"{r['layout']:<12} | {format_ms(ttft['p50']):>9} | {format_ms(ttft['p95']):>9} | {tokens:>6} | "
+              f"{cached:>8} | {shared:>14}")
+    by_layout = {r["layout"]: r for r in results}
+    if all(k in by_layout for k in LAYOUTS):
+        naive, prefix = by_layout["naive"]["ttft_s"]["p50"], by_layout["prefix"]["ttft_s"]["p50"]
+        if naive and prefix:
+            print(f"\n⚡ TTFT p50: {format_ms(naive)} → {format_ms(prefix)} ({(prefix - naive) / naive:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TTFT de l'assemblage de prompts stable en préfixe")
+    parser.add_argument("--url", default=None, help="URL de base du vLLM (défaut: LLAMA_MODEL_URL ou route OpenShift)")
+    parser.add_argument("--stub", action="store_true", help="Serveur simulé avec cache de préfixes (un par disposition)")
+    parser.add_argument("--retrieval", choices=["local", "llamastack"], default="local", help="Source des chunks")
+    parser.add_argument("--queries", default="datasets/assurance-retrieval.jsonl", help="Requêtes JSONL")
+    parser.add_argument("--corpus", default="datasets/assurance-corpus.jsonl", help="Corpus JSONL (recherche locale)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Taille des chunks en mots (recherche locale)")
+    parser.add_argument("--llama-stack-url", default=os.getenv("LLAMA_STACK_URL", "http://lsd-llama-32-1b-instruct-service:8321"), help="URL de LlamaStack")
+    parser.add_argument("--vector-db", default=os.getenv("VECTOR_DB_ID", "assurance_milvus_db"), help="Base vectorielle")
+    parser.add_argument("--k", type=int, default=4, help="Chunks par requête")
+    parser.add_argument("--rounds", type=int, default=3, help="Passages du jeu de requêtes (ordre mélangé)")
+    parser.add_argument("--max-tokens", type=int, default=8, help="Tokens générés par requête (seul le TTFT compte)")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du mélange des requêtes")
+    parser.add_argument("--json", help="Fichier JSON des résultats")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    if args.retrieval == "llamastack":
+        from llama_stack_client import Client
+        retriever = LlamaStackRetriever(Client(base_url=args.llama_stack_url), args.vector_db)
+    else:
+        retriever = LocalVectorStore()
+        retriever.add_documents(load_corpus(args.corpus), chunk_size=args.chunk_size)
+
+    # Même charge (mêmes questions, mêmes chunks, même ordre) pour les deux dispositions;
+    # d'un passage à l'autre la formulation change, comme des questions FAQ reformulées
+    rng = random.Random(args.seed)
+    workload = []
+    for round_index in range(args.rounds):
+        order = list(queries)
+        rng.shuffle(order)
+        for q in order:
+            question = q["query"] if round_index == 0 else f"{QUESTION_VARIANTS[round_index % len(QUESTION_VARIANTS)]} {q['query']}"
+            workload.append((question, retriever.query(q["query"], args.k)))
+    tools = rag_tools([args.vector_db])
+    print(f"🧩 {len(workload)} requêtes, {args.k} chunks chacune, dispositions: {', '.join(LAYOUTS)}")
+
+    results = []
+    for layout in LAYOUTS:
+        server = None
+        if args.stub:
+            from llama_stub_server import LatencyModel, StubServer
+            server = StubServer(LatencyModel(prefill_ms_per_token=0.3, decode_ms_per_token=2.0, prefix_cache_blocks=4096))
+            model_url = server.start()
+        else:
+            # Sur un vrai vLLM, le cache est partagé: la disposition naïve passe en premier
+            model_url = get_model_url(args.url)
+            if not model_url:
+                print("❌ Aucune URL de modèle: utilisez --url, --stub, LLAMA_MODEL_URL ou OPENSHIFT_CLUSTER_DOMAIN")
+                sys.exit(1)
+        try:
+            with PooledHTTPClient(pool_size=1) as http:
+                results.append(run_layout(layout, http, build_endpoints(model_url)["chat"], workload,
+                                          ASSURANCE_INSTRUCTIONS, tools, args.max_tokens))
+        finally:
+            if server:
+                server.stop()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Résultats: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
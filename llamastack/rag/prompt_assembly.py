@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Assemblage de prompts RAG stable en préfixe (cache de préfixes de vLLM)
+
+vLLM ne réutilise le KV cache que pour le plus long préfixe identique à une
+requête précédente. Le prompt est donc ordonné du plus stable au plus variable:
+  1. prompt système (instructions) et spécification des outils, toujours identiques
+  2. chunks fréquemment retrouvés, dans l'ordre où ils sont devenus fréquents
+  3. autres chunks, dans un ordre canonique (document, position) et non par score
+  4. historique puis question de l'utilisateur
+Sur un modèle 1B, le prefill d'un long contexte RAG domine le TTFT: chaque
+bloc de préfixe réutilisé est du prefill évité.
+"""
+
+import json
+import threading
+from collections import Counter
+
+from vector_store import chunk_key
+
+CONTEXT_HEADER = "Contexte extrait de la base de connaissances:"
+QUESTION_HEADER = "Question:"
+
+
+def format_context(chunks):
+    return "\n\n".join(f"[{i}] {chunk['content']}" for i, chunk in enumerate(chunks, 1))
+
+
+def _canonical_order(key, chunk):
+    """Ordre canonique stable: document, position (si connue), puis clé du chunk"""
+    metadata = chunk.get("metadata") or {}
+    index = metadata.get("chunk_index")
+    return (str(metadata.get("document_id") or ""), index is None, index or 0, key)
+
+
+def naive_messages(instructions, question, chunks):
+    """Disposition de référence, celle d'un tour d'agent avec knowledge_search: question
+    puis chunks dans l'ordre renvoyé par la recherche (par score)"""
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": f"{QUESTION_HEADER} {question}"},
+        {"role": "user", "content": f"{CONTEXT_HEADER}\n{format_context(chunks)}"},
+    ]
+
+
+class PromptAssembler:
+    """Construit des messages chat dont le début reste identique d'une requête à l'autre"""
+
+    def __init__(self, instructions, tools=None, pin_after=2, max_pinned=8, include_all_pinned=False):
+        self.instructions = instructions
+        self.tools = tools
+        self.pin_after = pin_after
+        self.max_pinned = max_pinned
+        self.include_all_pinned = include_all_pinned
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.pinned = []
+        self.pinned_chunks = {}
+
+    def system_prompt(self):
+        """Instructions puis outils, sérialisés de façon déterministe"""
+        if not self.tools:
+            return self.instructions
+        tools = json.dumps(self.tools, sort_keys=True, ensure_ascii=False)
+        return f"{self.instructions}\n\nOutils disponibles: {tools}"
+
+    def order_chunks(self, chunks):
+        """Chunks épinglés d'abord (ordre d'épinglage), puis les autres en ordre canonique
+
+        Un chunk est épinglé quand il a été retrouvé pin_after fois; l'ordre des
+        épinglés ne change plus ensuite, pour ne pas casser les préfixes déjà en cache.
+        Avec include_all_pinned, tous les épinglés sont inclus même s'ils n'ont pas
+        été retrouvés pour cette question (plus de tokens, préfixe plus long).
+        """
+        by_key = {}
+        for chunk in chunks:
+            by_key.setdefault(chunk_key(chunk), chunk)
+
+        with self.lock:
+            for key, chunk in by_key.items():
+                self.counts[key] += 1
+                if key not in self.pinned_chunks and self.counts[key] >= self.pin_after \
+                        and len(self.pinned) < self.max_pinned:
+                    self.pinned.append(key)
+                    self.pinned_chunks[key] = chunk
+            pinned = [k for k in self.pinned if self.include_all_pinned or k in by_key]
+            ordered = [by_key.get(k) or self.pinned_chunks[k] for k in pinned]
+
+        rest = sorted((k for k in by_key if k not in pinned), key=lambda k: _canonical_order(k, by_key[k]))
+        ordered.extend(by_key[k] for k in rest)
+        return ordered
+
+    def messages(self, question, chunks, history=None):
+        """Messages chat: système stable, contexte ordonné, historique, question en dernier"""
+        context = format_context(self.order_chunks(chunks))
+        messages = [
+            {"role": "system", "content": self.system_prompt()},
+            {"role": "user", "content": f"{CONTEXT_HEADER}\n{context}"},
+        ]
+        messages.extend(history or [])
+        messages.append({"role": "user", "content": f"{QUESTION_HEADER} {question}"})
+        return messages
+
+
+def messages_text(messages):
+    return "\n".join(str(m.get("content", "")) for m in messages)
+
+
+def shared_prefix_chars(a, b):
+    """Longueur du préfixe commun de deux textes"""
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Évaluation RAG par lots: exécute les questions d'un dataset JSONL/YAML sur un pool
+de workers bornés et collecte les réponses et les durées par phase
+
+Chaque question produit une ligne JSONL (réponse, durées de recherche et de
+génération, TTFT, erreur éventuelle) écrite au fil de l'eau; un résumé JSON
+agrège les percentiles de latence et le débit.
+
+Avec --context-budgets, les questions ne passent plus par l'agent: la recherche
+est faite directement (vector_io, ou hybride avec --keyword-index), le contexte
+est sélectionné par context_packer.py sous chaque budget de tokens, puis la
+réponse est générée par inference.chat_completion. Le rapport compare latence,
+tokens de contexte et rappel des mots-clés d'un budget à l'autre.
+
+Exemples:
+  python3 rag_eval.py --dataset datasets/assurance-questions.jsonl --workers 8 \\
+      --vector-db assurance_milvus_db --output results/assurance-eval.jsonl
+  python3 rag_eval.py --dataset datasets/assurance-questions.jsonl --context-budgets 256,512,1024,0
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+
+from agent_pool import AgentPool
+from context_packer import ContextPacker, load_token_counter
+from prompt_assembly import PromptAssembler
+from rag_metrics import format_ms, summarize_latencies
+from rag_stream import agent_turn_events, completion_events, last_event
+
+DEFAULT_INSTRUCTIONS = (
+    "Tu es un expert en assurance spécialisé dans l'analyse de documents d'assurance. "
+    "Utilise les informations de la base de connaissances pour fournir des réponses précises et utiles."
+)
+
+
+@dataclass
+class EvalItem:
+    """Question du dataset d'évaluation"""
+    id: str
+    question: str
+    expected_keywords: list = field(default_factory=list)
+    metadata: dict = field(default_factory=dict)
+
+
+@dataclass
+class EvalResult:
+    """Réponse et durées par phase pour une question"""
+    id: str
+    question: str
+    answer: str = ""
+    error: str = None
+    cached: bool = False
+    setup_s: float = None
+    total_s: float = None
+    ttft_s: float = None
+    retrieval_s: float = None
+    generation_s: float = None
+    keyword_recall: float = None
+    context_tokens: int = None
+    tokens_saved: int = None
+
+
+def load_dataset(path):
+    """Charge un dataset JSONL (une question par ligne) ou YAML (liste ou clé "questions")"""
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            data = yaml.safe_load(f)
+            rows = data.get("questions", []) if isinstance(data, dict) else data
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    items = []
+    for i, row in enumerate(rows, 1):
+        if isinstance(row, str):
+            row = {"question": row}
+        items.append(EvalItem(
+            id=str(row.get("id", i)),
+            question=row["question"],
+            expected_keywords=row.get("expected_keywords", []),
+            metadata={k: v for k, v in row.items() if k not in ("id", "question", "expected_keywords")},
+        ))
+    return items
+
+
+def collect_turn(response, start):
+    """Consomme les événements d'un tour d'agent (rag_stream) et renvoie réponse et durées par phase"""
+    done = last_event(agent_turn_events(response, start))
+    return dict(done.data, answer=done.text)
+
+
+def keyword_recall(answer, keywords):
+    """Part des mots-clés attendus présents dans la réponse"""
+    if not keywords:
+        return None
+    lowered = answer.lower()
+    return sum(1 for k in keywords if k.lower() in lowered) / len(keywords)
+
+
+def answer_item(pool, model_id, instructions, vector_db_ids, item, cache=None):
+    """Répond à une question (via le cache si fourni) avec une session du pool et mesure les phases
+
+    La clé du cache porte la configuration réelle de l'agent (outils, budget de
+    contexte, échantillonnage). Le cache n'est consulté que si chaque tour part
+    d'une session neuve, et une réponse produite dans une session qui avait déjà
+    un historique n'est pas enregistrée.
+    """
+    result = EvalResult(id=item.id, question=item.question)
+    messages = [{"role": "user", "content": item.question}]
+    cache_args = {"system_prompt": instructions, "sampling": pool.agent_config(model_id, instructions, vector_db_ids)}
+    fresh_sessions = pool.max_turns_per_session <= 1
+    start = time.perf_counter()
+    try:
+        cached = cache.get(model_id, messages, **cache_args) if cache and fresh_sessions else None
+        if cached is not None:
+            result.answer = cached
+            result.cached = True
+            result.total_s = time.perf_counter() - start
+        else:
+            with pool.session(model_id, instructions, vector_db_ids) as session:
+                result.setup_s = session.setup_s
+                had_history = session.has_history
+                turn_start = time.perf_counter()
+                timings = collect_turn(session.create_turn(messages), turn_start)
+                result.answer = timings.pop("answer")
+                session.add_context(result.answer)
+            for name, value in timings.items():
+                setattr(result, name, value)
+            if cache and not had_history and result.answer.strip():
+                cache.put(model_id, messages, result.answer, **cache_args)
+    except Exception as e:
+        result.error = repr(e)
+        result.total_s = time.perf_counter() - start
+    result.keyword_recall = keyword_recall(result.answer, item.expected_keywords)
+    return result
+
+
+def answer_packed_item(client, model_id, assembler, retriever, packer, item, k=8):
+    """Recherche directe, contexte sélectionné sous budget puis génération; mesure les phases"""
+    result = EvalResult(id=item.id, question=item.question)
+    start = time.perf_counter()
+    try:
+        packed = packer.pack(retriever.query(item.question, k))
+        retrieved = time.perf_counter()
+        result.context_tokens = packed.tokens
+        result.tokens_saved = packed.tokens_saved
+        messages = assembler.messages(item.question, packed.chunks)
+        response = client.inference.chat_completion(model_id=model_id, messages=messages, stream=True)
+        done = last_event(completion_events(response, start, retrieved))
+        result.answer = done.text
+        for name, value in done.data.items():
+            setattr(result, name, value)
+    except Exception as e:
+        result.error = repr(e)
+        result.total_s = time.perf_counter() - start
+    result.keyword_recall = keyword_recall(result.answer, item.expected_keywords)
+    return result
+
+
+def run_items(work, items, workers=4, on_result=None):
+    """Applique work(item) sur un pool de workers bornés, résultats dans l'ordre du dataset"""
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(work, item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if on_result:
+                on_result(result)
+    return results
+
+
+def run_batch(pool, model_id, instructions, vector_db_ids, items, workers=4, cache=None, on_result=None):
+    """Exécute les questions sur un pool de workers bornés
+
+    Les agents et sessions viennent du AgentPool partagé. Les résultats sont
+    retournés dans l'ordre du dataset; on_result est appelé à chaque réponse.
+    """
+    def work(item):
+        return answer_item(pool, model_id, instructions, vector_db_ids, item, cache)
+
+    return run_items(work, items, workers, on_result)
+
+
+def run_packed_batch(client, model_id, instructions, retriever, packer, items, k=8, workers=4, on_result=None):
+    """Comme run_batch, avec recherche directe et contexte sous le budget du packer"""
+    assembler = PromptAssembler(instructions)
+
+    def work(item):
+        return answer_packed_item(client, model_id, assembler, retriever, packer, item, k)
+
+    return run_items(work, items, workers, on_result)
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def summarize_results(results, wall_time, workers):
+    """Agrégats: erreurs, débit, percentiles par phase, rappel des mots-clés"""
+    ok = [r for r in results if r.error is None]
+    recalls = [r.keyword_recall for r in ok if r.keyword_recall is not None]
+    return {
+        "questions": len(results),
+        "errors": len(results) - len(ok),
+        "cached": sum(1 for r in ok if r.cached),
+        "workers": workers,
+        "wall_time_s": wall_time,
+        "throughput_qps": len(ok) / wall_time if wall_time else 0.0,
+        "setup_s": summarize_latencies([r.setup_s for r in ok]),
+        "total_s": summarize_latencies([r.total_s for r in ok]),
+        "ttft_s": summarize_latencies([r.ttft_s for r in ok]),
+        "retrieval_s": summarize_latencies([r.retrieval_s for r in ok]),
+        "generation_s": summarize_latencies([r.generation_s for r in ok]),
+        "keyword_recall": sum(recalls) / len(recalls) if recalls else None,
+        "context_tokens_mean": _mean([r.context_tokens for r in ok]),
+        "tokens_saved_mean": _mean([r.tokens_saved for r in ok]),
+    }
+
+
+def print_summary(summary):
+    """Affichage du résumé d'évaluation"""
+    print(f"📊 {summary['questions']} questions ({summary['errors']} erreurs, {summary['cached']} en cache) "
+          f"en {summary['wall_time_s']:.1f} s avec {summary['workers']} workers "
+          f"({summary['throughput_qps']:.2f} questions/s)")
+    for phase, label in (("setup_s", "Mise en place (session)"), ("total_s", "Tour complet"), ("ttft_s", "Premier token"),
+                         ("retrieval_s", "Recherche"), ("generation_s", "Génération")):
+        stats = summary[phase]
+        print(f"   - {label}: p50 {format_ms(stats['p50'])} | p95 {format_ms(stats['p95'])}")
+    if summary["keyword_recall"] is not None:
+        print(f"   - Rappel des mots-clés attendus: {summary['keyword_recall']:.0%}")
+    if summary.get("context_tokens_mean") is not None:
+        print(f"   - Contexte: {summary['context_tokens_mean']:.0f} tokens en moyenne "
+              f"({summary['tokens_saved_mean']:.0f} économisés par question)")
+
+
+def print_budget_tradeoff(rows):
+    """Tableau budget de contexte → tokens, latences et rappel"""
+    print(f"\n{'Budget':>7} | {'contexte':>8} | {'économisés':>10} | {'TTFT p50':>9} | {'total p50':>9} | {'rappel':>6}")
+    for budget, summary in rows:
+        recall = f"{summary['keyword_recall']:.0%}" if summary["keyword_recall"] is not None else "N/A"
+        context = f"{summary['context_tokens_mean']:.0f}" if summary["context_tokens_mean"] is not None else "N/A"
+        saved = f"{summary['tokens_saved_mean']:.0f}" if summary["tokens_saved_mean"] is not None else "N/A"
+        print(f"{budget or '∞':>7} | {context:>8} | {saved:>10} | {format_ms(summary['ttft_s']['p50']):>9} | "
+              f"{format_ms(summary['total_s']['p50']):>9} | {recall:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Évaluation RAG par lots avec LlamaStack")
+    parser.add_argument("--dataset", required=True, help="Dataset JSONL ou YAML de questions")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("RAG_WORKERS", "4")), help="Nombre de workers parallèles")
+    parser.add_argument("--url", default=os.getenv("LLAMA_STACK_URL", "http://lsd-llama-32-1b-instruct-service:8321"), help="URL de LlamaStack")
+    parser.add_argument("--model", default=os.getenv("MODEL_ID", "llama-32-1b-instruct"), help="Modèle LLM")
+    parser.add_argument("--vector-db", default=os.getenv("VECTOR_DB_ID", "assurance_milvus_db"), help="Base vectorielle")
+    parser.add_argument("--instructions", default=DEFAULT_INSTRUCTIONS, help="Prompt système de l'agent")
+    parser.add_argument("--session-max-turns", type=int, default=1,
+                        help="Tours par session recyclée (1: questions isolées, agent réutilisé)")
+    parser.add_argument("--context-budgets", default=None,
+                        help="Budgets de contexte en tokens à comparer (ex: 256,512,1024,0; 0 = sans limite)")
+    parser.add_argument("--retrieval-k", type=int, default=8, help="Chunks recherchés avant sélection (--context-budgets)")
+    parser.add_argument("--keyword-index", default=os.getenv("KEYWORD_INDEX_PATH"), help="Index BM25: recherche hybride (--context-budgets)")
+    parser.add_argument("--output", default="results/rag-eval.jsonl", help="Fichier JSONL des résultats")
+    args = parser.parse_args()
+
+    from llama_stack_client import Client
+
+    items = load_dataset(args.dataset)
+    client = Client(base_url=args.url)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    if args.context_budgets:
+        return run_budget_sweep(client, items, args)
+
+    pool = AgentPool(client, max_turns_per_session=args.session_max_turns)
+    print(f"🚀 Évaluation de {len(items)} questions sur '{args.vector_db}' avec {args.workers} workers")
+
+    lock = threading.Lock()
+    with open(args.output, "w") as out:
+        def on_result(result):
+            with lock:
+                out.write(json.dumps(asdict(result), ensure_ascii=False) + "\n")
+                out.flush()
+                status = "❌" if result.error else "✅"
+                print(f"{status} [{result.id}] {result.question[:60]} ({format_ms(result.total_s)})")
+
+        start = time.perf_counter()
+        results = run_batch(pool, args.model, args.instructions, [args.vector_db], items,
+                            workers=args.workers, on_result=on_result)
+        wall_time = time.perf_counter() - start
+
+    summary = summarize_results(results, wall_time, args.workers)
+    summary["agent_pool"] = pool.stats()
+    summary_path = os.path.splitext(args.output)[0] + ".summary.json"
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print_summary(summary)
+    print(f"💾 Résultats: {args.output} | Résumé: {summary_path}")
+
+
+def run_budget_sweep(client, items, args):
+    """Évalue le dataset pour chaque budget de contexte (--context-budgets)"""
+    from keyword_index import BM25Index, HybridRetriever
+    from retrieval_bench import LlamaStackRetriever
+
+    retriever = LlamaStackRetriever(client, args.vector_db)
+    if args.keyword_index:
+        retriever = HybridRetriever(retriever, BM25Index.load(args.keyword_index))
+    count_tokens, tokenizer = load_token_counter()
+    budgets = [int(b) for b in args.context_budgets.split(",") if b.strip()]
+    print(f"🚀 {len(items)} questions x {len(budgets)} budgets de contexte, k={args.retrieval_k}, tokens: {tokenizer}")
+
+    rows = []
+    base = os.path.splitext(args.output)[0]
+    for budget in budgets:
+        packer = ContextPacker(budget, count_tokens)
+        output = f"{base}.budget-{budget or 'max'}.jsonl"
+        with open(output, "w") as out:
+            lock = threading.Lock()
+
+            def on_result(result):
+                with lock:
+                    out.write(json.dumps(asdict(result), ensure_ascii=False) + "\n")
+                    out.flush()
+
+            start = time.perf_counter()
+            results = run_packed_batch(client, args.model, args.instructions, retriever, packer, items,
+                                       k=args.retrieval_k, workers=args.workers, on_result=on_result)
+            wall_time = time.perf_counter() - start
+        summary = summarize_results(results, wall_time, args.workers)
+        summary["packer"] = packer.stats()
+        print(f"\n💰 Budget {budget or 'illimité'} → {output}")
+        print_summary(summary)
+        rows.append((budget, summary))
+
+    print_budget_tradeoff(rows)
+    summary_path = f"{base}.budgets.summary.json"
+    with open(summary_path, "w") as f:
+        json.dump({str(budget): summary for budget, summary in rows}, f, indent=2)
+    print(f"💾 Résumé: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Statistiques de latence partagées par les outils RAG (percentiles, résumés)
+"""
+
+import math
+
+
+def percentile(values, pct):
+    """Percentile par interpolation linéaire (None si aucune valeur)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return ordered[low]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize_latencies(values):
+    """Résumé p50/p95/p99/moyenne/max d'une série de latences (en secondes)"""
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def format_ms(seconds):
+    """Formatage d'une durée en millisecondes pour l'affichage"""
+    if seconds is None:
+        return "N/A"
+    return f"{seconds * 1000:.1f} ms"
+
+
+def peak_rss_mib():
+    """Pic de mémoire résidente du processus (Mio)"""
+    import resource
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: kio, macOS: octets
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
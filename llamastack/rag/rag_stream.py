@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Réponses RAG en streaming sous forme d'événements typés
+
+Au lieu d'afficher chaque événement d'AgentEventLogger avec print(flush=True),
+un tour produit une suite d'événements horodatés (secondes depuis le début du
+tour) qu'une interface de chat peut relayer telle quelle en SSE ou websocket:
+  - retrieval_done: fin de la recherche (knowledge_search ou recherche directe)
+  - first_token: premier token de la réponse (TTFT)
+  - token: fragment de texte
+  - done: réponse complète et durées par phase
+Les fragments sont gardés dans une liste jointe une seule fois à la fin du tour
+(pas de concaténation répétée de chaînes).
+
+Exemple:
+  python3 rag_stream.py "Comment fonctionne la franchise en assurance ?" --vector-db assurance_milvus_db
+  python3 rag_stream.py "Comment fonctionne la franchise ?" --sse
+  python3 rag_stream.py "What does homeowners insurance cover?" --vector-db auto
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+from rag_metrics import format_ms
+
+EVENT_TYPES = ("retrieval_done", "first_token", "token", "done")
+
+
+@dataclass
+class StreamEvent:
+    """Événement d'un tour: type, instant relatif au début du tour, texte ou données"""
+    type: str
+    t: float
+    text: str = None
+    data: dict = None
+
+    def to_dict(self):
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+    def to_json(self):
+        """Message websocket (une trame JSON par événement)"""
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def to_sse(self):
+        """Bloc Server-Sent Events: `event: <type>` puis `data: <json>`"""
+        return f"event: {self.type}\ndata: {self.to_json()}\n\n"
+
+
+def _payload(chunk):
+    event = getattr(chunk, "event", None)
+    return getattr(event, "payload", None)
+
+
+def agent_turn_events(response, start=None):
+    """Événements d'un tour d'agent (create_turn en streaming)
+
+    La recherche correspond à l'étape tool_execution (knowledge_search); la
+    génération court de la fin de la recherche au dernier token.
+    """
+    start = start or time.perf_counter()
+    parts = []
+    first_token = retrieval_start = retrieval_end = None
+    final_text = None
+
+    for chunk in response:
+        payload = _payload(chunk)
+        if payload is None:
+            continue
+        now = time.perf_counter()
+        event_type = getattr(payload, "event_type", None)
+        step_type = getattr(payload, "step_type", None)
+
+        if step_type == "tool_execution":
+            if event_type == "step_start" and retrieval_start is None:
+                retrieval_start = now
+            elif event_type == "step_complete":
+                retrieval_start = retrieval_start or now
+                retrieval_end = now
+                yield StreamEvent("retrieval_done", now - start, data={"retrieval_s": retrieval_end - retrieval_start})
+        elif event_type == "step_progress":
+            delta = getattr(payload, "delta", None)
+            text = getattr(delta, "text", None)
+            if getattr(delta, "type", None) == "text" and text:
+                if first_token is None:
+                    first_token = now
+                    yield StreamEvent("first_token", now - start)
+                parts.append(text)
+                yield StreamEvent("token", now - start, text=text)
+        elif event_type == "turn_complete":
+            message = getattr(getattr(payload, "turn", None), "output_message", None)
+            final_text = getattr(message, "content", None)
+
+    end = time.perf_counter()
+    answer = final_text if isinstance(final_text, str) and final_text else "".join(parts)
+    yield StreamEvent("done", end - start, text=answer, data={
+        "total_s": end - start,
+        "ttft_s": first_token - start if first_token else None,
+        "retrieval_s": retrieval_end - retrieval_start if retrieval_end else None,
+        "generation_s": end - (retrieval_end or start),
+    })
+
+
+def completion_events(response, start=None, retrieved=None):
+    """Événements d'une génération inference.chat_completion en streaming
+
+    `retrieved` est l'instant de fin d'une recherche directe faite par l'appelant
+    depuis `start`: l'événement retrieval_done est alors émis en premier.
+    """
+    start = start or time.perf_counter()
+    if retrieved is not None:
+        yield StreamEvent("retrieval_done", retrieved - start, data={"retrieval_s": retrieved - start})
+    parts = []
+    first_token = None
+
+    for chunk in response:
+        delta = getattr(getattr(chunk, "event", None), "delta", None)
+        text = getattr(delta, "text", None)
+        if not text:
+            continue
+        now = time.perf_counter()
+        if first_token is None:
+            first_token = now
+            yield StreamEvent("first_token", now - start)
+        parts.append(text)
+        yield StreamEvent("token", now - start, text=text)
+
+    end = time.perf_counter()
+    yield StreamEvent("done", end - start, text="".join(parts), data={
+        "total_s": end - start,
+        "ttft_s": first_token - start if first_token else None,
+        "retrieval_s": retrieved - start if retrieved is not None else None,
+        "generation_s": end - (retrieved if retrieved is not None else start),
+    })
+
+
+def answer_events(pool, model_id, instructions, vector_db_ids, question):
+    """Tour d'agent en streaming avec une session du pool (rendue à la fin du tour)"""
+    messages = [{"role": "user", "content": question}]
+    with pool.session(model_id, instructions, vector_db_ids) as session:
+        # Chrono démarré avant create_turn: le TTFT inclut l'envoi du tour, pas seulement l'itération
+        start = time.perf_counter()
+        for event in agent_turn_events(session.create_turn(messages), start):
+            if event.type == "done":
+                session.add_context(event.text)
+            yield event
+
+
+def last_event(events, on_event=None):
+    """Consomme les événements (on_event appelé pour chacun) et renvoie l'événement done"""
+    done = None
+    for event in events:
+        if on_event:
+            on_event(event)
+        if event.type == "done":
+            done = event
+    return done
+
+
+def iter_sse(events):
+    """Flux SSE prêt à écrire dans une réponse HTTP (text/event-stream)"""
+    for event in events:
+        yield event.to_sse()
+
+
+def write_tokens(events, out=None, flush_interval=0.05):
+    """Écrit les tokens au fil de l'eau, avec un flush au plus toutes les flush_interval secondes
+
+    Renvoie l'événement done (réponse complète et durées).
+    """
+    out = out or sys.stdout
+    last_flush = time.perf_counter()
+    done = None
+    for event in events:
+        if event.type == "token":
+            out.write(event.text)
+            now = time.perf_counter()
+            if now - last_flush >= flush_interval:
+                out.flush()
+                last_flush = now
+        elif event.type == "done":
+            done = event
+    out.write("\n")
+    out.flush()
+    return done
+
+
+def print_timings(done):
+    """Durées par phase d'un tour (événement done)"""
+    data = done.data
+    print(f"⏱️  Recherche: {format_ms(data['retrieval_s'])} | Premier token: {format_ms(data['ttft_s'])} "
+          f"| Génération: {format_ms(data['generation_s'])} | Total: {format_ms(data['total_s'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réponse RAG en streaming (événements typés)")
+    parser.add_argument("question", help="Question posée à l'agent RAG")
+    parser.add_argument("--url", default=os.getenv("LLAMA_STACK_URL", "http://lsd-llama-32-1b-instruct-service:8321"), help="URL de LlamaStack")
+    parser.add_argument("--model", default=os.getenv("MODEL_ID", "llama-32-1b-instruct"), help="Modèle LLM")
+    parser.add_argument("--vector-db", default=os.getenv("VECTOR_DB_ID", "assurance_milvus_db"),
+                        help="Base vectorielle (auto: choisie par vector_router.py selon la question)")
+    parser.add_argument("--instructions", default=None, help="Prompt système de l'agent")
+    parser.add_argument("--sse", action="store_true", help="Écrit le flux au format Server-Sent Events")
+    args = parser.parse_args()
+
+    from agent_pool import get_agent_pool
+    from rag_eval import DEFAULT_INSTRUCTIONS
+
+    pool = get_agent_pool(args.url)
+    vector_db_ids = [args.vector_db]
+    if args.vector_db == "auto":
+        from vector_router import VectorRouter
+        vector_db_ids = VectorRouter(pool.client).route(args.question)
+    events = answer_events(pool, args.model, args.instructions or DEFAULT_INSTRUCTIONS, vector_db_ids, args.question)
+    if args.sse:
+        for block in iter_sse(events):
+            sys.stdout.write(block)
+            sys.stdout.flush()
+        return
+
+    print(f"❓ {args.question}")
+    print("💬 Réponse:")
+    print_timings(write_tokens(events))
+
+
+if __name__ == "__main__":
+    main()
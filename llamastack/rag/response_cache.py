@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Cache de réponses côté client pour les questions récurrentes (FAQ assurance)
+
+Deux niveaux:
+  - exact:      clé normalisée (modèle, prompt système, messages, paramètres d'échantillonnage)
+  - sémantique: optionnel, similarité cosinus entre embeddings de la dernière question
+                pour un même contexte (modèle, prompt système, historique, paramètres)
+
+Les entrées expirent après un TTL et sont évincées en LRU au-delà d'un nombre
+d'entrées ou d'une empreinte mémoire maximale.
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Normalisation des questions: Unicode NFKC, minuscules, espaces et ponctuation finale"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = " ".join(text.split())
+    return text.rstrip(" ?!.;:")
+
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def llamastack_embedder(client, model_id="granite-embedding-125m", cache=None):
+    """Fonction d'embedding basée sur l'API inference de LlamaStack (via un EmbeddingCache si fourni)"""
+    def embed(text):
+        return list(client.inference.embeddings(model_id=model_id, contents=[text]).embeddings[0])
+    if cache is not None:
+        from embedding_cache import cached_embedder
+        return cached_embedder(cache, model_id, embed)
+    return embed
+
+
+class _Entry:
+    __slots__ = ("value", "context_key", "embedding", "expires_at", "size")
+
+    def __init__(self, value, context_key, embedding, expires_at):
+        self.value = value
+        self.context_key = context_key
+        self.embedding = embedding
+        self.expires_at = expires_at
+        self.size = len(str(value).encode()) + (8 * len(embedding) if embedding else 0) + 256
+
+
+class ResponseCache:
+    """Cache LRU + TTL de réponses, avec niveau sémantique optionnel"""
+
+    def __init__(self, ttl=3600.0, max_entries=1024, max_bytes=64 * 1024 * 1024,
+                 embed_fn=None, similarity_threshold=0.92):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.contexts = {}
+        self.bytes = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def keys(self, model, messages, system_prompt=None, sampling=None):
+        """(clé exacte, clé de contexte) pour une requête"""
+        messages = [
+            {"role": m.get("role"), "content": normalize_text(str(m.get("content", "")))}
+            for m in messages
+        ]
+        context = {
+            "model": model,
+            "system": normalize_text(system_prompt) if system_prompt else None,
+            "history": messages[:-1],
+            "sampling": sampling or {},
+        }
+        context_key = _digest(context)
+        return _digest([context_key, messages[-1] if messages else None]), context_key
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= entry.size
+        bucket = self.contexts.get(entry.context_key)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self.contexts[entry.context_key]
+
+    def _expired(self, key, entry, now):
+        if entry.expires_at < now:
+            self._remove(key)
+            self.expirations += 1
+            return True
+        return False
+
+    def _semantic_lookup(self, context_key, embedding, now):
+        best_key, best_score = None, self.similarity_threshold
+        for key in list(self.contexts.get(context_key, ())):
+            entry = self.entries[key]
+            if self._expired(key, entry, now) or entry.embedding is None:
+                continue
+            score = cosine_similarity(embedding, entry.embedding)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _last_question(self, messages):
+        return str(messages[-1].get("content", "")) if messages else ""
+
+    def get(self, model, messages, system_prompt=None, sampling=None):
+        """Réponse en cache (niveau exact puis sémantique) ou None"""
+        key, context_key = self.keys(model, messages, system_prompt, sampling)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and not self._expired(key, entry, now):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            has_candidates = self.embed_fn is not None and context_key in self.contexts
+
+        if has_candidates:
+            embedding = self.embed_fn(self._last_question(messages))
+            with self.lock:
+                match = self._semantic_lookup(context_key, embedding, now)
+                if match is not None:
+                    self.entries.move_to_end(match)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return self.entries[match].value
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, model, messages, response, system_prompt=None, sampling=None):
+        """Enregistre une réponse et applique les limites LRU / mémoire"""
+        key, context_key = self.keys(model, messages, system_prompt, sampling)
+        embedding = self.embed_fn(self._last_question(messages)) if self.embed_fn else None
+        entry = _Entry(response, context_key, embedding, time.time() + self.ttl)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.contexts.setdefault(context_key, set()).add(key)
+            self.bytes += entry.size
+            while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def stats(self):
+        """Métriques hit/miss et occupation du cache"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Benchmark de recherche vectorielle (vector_io.query): qualité et latence
+
+Un jeu de requêtes étiquetées (JSONL: {"id", "query", "relevant_docs"} ou
+"relevant_keywords") est exécuté contre une base vectorielle pour chaque valeur
+de k. Le benchmark rapporte le recall@k, le MRR et les percentiles de latence,
+puis mesure le débit (QPS) sous concurrence croissante pour trouver le plafond
+de la base.
+
+Deux backends:
+  - llamastack: client.vector_io.query sur une base existante (Milvus-lite via MILVUS_DB_PATH)
+  - local:      base vectorielle en mémoire (vector_store.py) indexée depuis un corpus JSONL,
+                avec balayage des paramètres de chunking (--chunk-sizes / --overlaps)
+
+Avec --modes, chaque base est aussi interrogée par mots-clés (BM25) et en
+hybride (vecteurs + BM25 fusionnés par RRF, keyword_index.py).
+
+Exemples:
+  python3 retrieval_bench.py --backend local --chunk-sizes 32,64,128 --overlaps 0,16
+  python3 retrieval_bench.py --backend local --modes vector,keyword,hybrid --k 1,3,5
+  python3 retrieval_bench.py --backend llamastack --vector-db assurance_milvus_db --concurrency 1,4,16
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from keyword_index import BM25Index, HybridRetriever
+from rag_metrics import format_ms, summarize_latencies
+from vector_store import LocalVectorStore, load_corpus
+
+MODES = ("vector", "keyword", "hybrid")
+
+
+def load_queries(path):
+    """Requêtes étiquetées JSONL"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _field(obj, name, default=None):
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+class LlamaStackRetriever:
+    """Recherche via client.vector_io.query, résultats au format des chunks locaux"""
+
+    def __init__(self, client, vector_db_id):
+        self.client = client
+        self.vector_db_id = vector_db_id
+
+    def query(self, query, k=5):
+        response = self.client.vector_io.query(
+            vector_db_id=self.vector_db_id,
+            query=query,
+            params={"max_chunks": k},
+        )
+        chunks = _field(response, "chunks") or _field(response, "results") or []
+        scores = _field(response, "scores") or [None] * len(chunks)
+        results = []
+        for chunk, score in zip(chunks, scores):
+            content = _field(chunk, "content", "")
+            results.append({
+                "content": content if isinstance(content, str) else str(content),
+                "metadata": _field(chunk, "metadata", {}) or {},
+                "score": score,
+            })
+        return results[:k]
+
+
+def mode_retrievers(vector_retriever, keyword_index, modes, candidates=20):
+    """[(mode, retriever)] pour les modes demandés"""
+    retrievers = {
+        "vector": lambda: vector_retriever,
+        "keyword": lambda: keyword_index,
+        "hybrid": lambda: HybridRetriever(vector_retriever, keyword_index, candidates=candidates),
+    }
+    return [(mode, retrievers[mode]()) for mode in modes]
+
+
+def relevance(chunks, item):
+    """(recall, rang du premier chunk pertinent) pour une requête étiquetée
+
+    Avec relevant_docs, la pertinence se juge sur metadata.document_id et le
+    recall compte les documents distincts retrouvés; sinon sur la présence des
+    relevant_keywords dans le contenu.
+    """
+    relevant_docs = set(item.get("relevant_docs", []))
+    keywords = [k.lower() for k in item.get("relevant_keywords", [])]
+    found = set()
+    first_rank = None
+
+    for rank, chunk in enumerate(chunks, 1):
+        if relevant_docs:
+            doc_id = chunk["metadata"].get("document_id")
+            hits = {doc_id} & relevant_docs
+        else:
+            content = chunk["content"].lower()
+            hits = {k for k in keywords if k in content}
+        if hits and first_rank is None:
+            first_rank = rank
+        found |= hits
+
+    expected = len(relevant_docs) if relevant_docs else len(keywords)
+    return (len(found) / expected if expected else None), first_rank
+
+
+def evaluate(retriever, queries, ks):
+    """recall@k, MRR@k et latence pour chaque k"""
+    report = []
+    for k in ks:
+        recalls, reciprocal_ranks, latencies, errors = [], [], [], 0
+        for item in queries:
+            start = time.perf_counter()
+            try:
+                chunks = retriever.query(item["query"], k)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            recall, rank = relevance(chunks, item)
+            if recall is not None:
+                recalls.append(recall)
+            reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        report.append({
+            "k": k,
+            "queries": len(queries),
+            "errors": errors,
+            "recall": sum(recalls) / len(recalls) if recalls else None,
+            "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks) if reciprocal_ranks else None,
+            "latency_s": summarize_latencies(latencies),
+        })
+    return report
+
+
+def concurrency_sweep(retriever, queries, levels, k=5, rounds=5):
+    """QPS et latence par niveau de concurrence (rounds passages du jeu de requêtes)"""
+    workload = [item["query"] for item in queries] * rounds
+    report = []
+    for users in levels:
+        def timed(query):
+            start = time.perf_counter()
+            try:
+                retriever.query(query, k)
+            except Exception:
+                return None
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            latencies = list(executor.map(timed, workload))
+        wall_time = time.perf_counter() - start
+        ok = [l for l in latencies if l is not None]
+        report.append({
+            "concurrency": users,
+            "requests": len(workload),
+            "errors": len(workload) - len(ok),
+            "wall_time_s": wall_time,
+            "qps": len(ok) / wall_time if wall_time else 0.0,
+            "latency_s": summarize_latencies(ok),
+        })
+    return report
+
+
+def qps_ceiling(sweep):
+    """Niveau de concurrence au meilleur débit"""
+    return max(sweep, key=lambda r: r["qps"]) if sweep else None
+
+
+def print_quality(label, report):
+    print(f"\n📐 {label}")
+    print(f"   {'k':>3} | {'recall@k':>8} | {'MRR':>5} | {'p50':>9} | {'p95':>9} | {'p99':>9}")
+    for row in report:
+        lat = row["latency_s"]
+        recall = f"{row['recall']:.2f}" if row["recall"] is not None else "N/A"
+        mrr = f"{row['mrr']:.2f}" if row["mrr"] is not None else "N/A"
+        errors = f"  ({row['errors']} erreurs)" if row["errors"] else ""
+        print(f"   {row['k']:>3} | {recall:>8} | {mrr:>5} | {format_ms(lat['p50']):>9} | "
+              f"{format_ms(lat['p95']):>9} | {format_ms(lat['p99']):>9}{errors}")
+
+
+def print_sweep(sweep):
+    print("\n🚦 Débit sous concurrence")
+    for row in sweep:
+        lat = row["latency_s"]
+        errors = f"  ({row['errors']} erreurs)" if row["errors"] else ""
+        print(f"   {row['concurrency']:>3} clients: {row['qps']:8.1f} req/s | p50 {format_ms(lat['p50'])} "
+              f"| p95 {format_ms(lat['p95'])}{errors}")
+    best = qps_ceiling(sweep)
+    if best:
+        print(f"   ➡️  Plafond: {best['qps']:.1f} req/s à {best['concurrency']} clients")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de recherche vectorielle (recall@k, MRR, latence, QPS)")
+    parser.add_argument("--backend", choices=["local", "llamastack"], default="local", help="Base interrogée")
+    parser.add_argument("--queries", default="datasets/assurance-retrieval.jsonl", help="Requêtes étiquetées JSONL")
+    parser.add_argument("--k", default="1,3,5,10", help="Valeurs de k (séparées par des virgules)")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Niveaux de concurrence pour le QPS")
+    parser.add_argument("--rounds", type=int, default=5, help="Passages du jeu de requêtes par niveau de concurrence")
+    parser.add_argument("--corpus", default="datasets/assurance-corpus.jsonl", help="Corpus JSONL (backend local)")
+    parser.add_argument("--chunk-sizes", default="64,128", help="Tailles de chunk en mots (backend local)")
+    parser.add_argument("--overlaps", default="0,16", help="Chevauchements en mots (backend local)")
+    parser.add_argument("--url", default=os.getenv("LLAMA_STACK_URL", "http://lsd-llama-32-1b-instruct-service:8321"), help="URL de LlamaStack")
+    parser.add_argument("--vector-db", default=os.getenv("VECTOR_DB_ID", "assurance_milvus_db"), help="Base vectorielle (backend llamastack)")
+    parser.add_argument("--modes", default="vector", help=f"Modes de recherche comparés (parmi {', '.join(MODES)})")
+    parser.add_argument("--keyword-index", default=os.getenv("KEYWORD_INDEX_PATH"), help="Index BM25 de l'ingestion (backend llamastack)")
+    parser.add_argument("--candidates", type=int, default=20, help="Résultats de chaque recherche avant fusion (mode hybrid)")
+    parser.add_argument("--json", help="Fichier JSON du rapport")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    ks = parse_ints(args.k)
+    modes = [m for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"modes inconnus: {', '.join(unknown)}")
+    levels = parse_ints(args.concurrency)
+    sweep_k = min(5, max(ks))
+    results = {"backend": args.backend, "queries": len(queries), "settings": []}
+
+    if args.backend == "llamastack":
+        from llama_stack_client import Client
+        retriever = LlamaStackRetriever(Client(base_url=args.url), args.vector_db)
+        print(f"🗄️  Base '{args.vector_db}' via {args.url} ({len(queries)} requêtes)")
+        keyword_index = None
+        if set(modes) & {"keyword", "hybrid"}:
+            if not args.keyword_index:
+                parser.error("--keyword-index est requis pour les modes keyword et hybrid avec llamastack")
+            keyword_index = BM25Index.load(args.keyword_index)
+            print(f"🔤 Index BM25 {args.keyword_index}: {len(keyword_index)} chunks")
+        # Le chunking est fixé à l'ingestion: seul k varie
+        settings = [("ingestion", retriever, keyword_index)]
+    else:
+        documents = load_corpus(args.corpus)
+        print(f"🗄️  Base locale en mémoire: {len(documents)} documents ({len(queries)} requêtes)")
+        settings = []
+        for size in parse_ints(args.chunk_sizes):
+            for overlap in parse_ints(args.overlaps):
+                if overlap >= size:
+                    continue
+                store = LocalVectorStore()
+                start = time.perf_counter()
+                count = store.add_documents(documents, chunk_size=size, overlap=overlap)
+                print(f"   chunks de {size} mots (chevauchement {overlap}): {count} chunks indexés "
+                      f"en {format_ms(time.perf_counter() - start)}")
+                keyword_index = BM25Index()
+                keyword_index.add(store.chunks)
+                settings.append((f"chunk_size={size} overlap={overlap}", store, keyword_index))
+
+    for setting, vector_retriever, keyword_index in settings:
+        for mode, retriever in mode_retrievers(vector_retriever, keyword_index, modes, args.candidates):
+            label = f"{setting} [{mode}]" if len(modes) > 1 or mode != "vector" else setting
+            quality = evaluate(retriever, queries, ks)
+            print_quality(label, quality)
+            results["settings"].append({"label": label, "mode": mode, "quality": quality})
+
+    # Débit mesuré sur la dernière configuration (celle de l'ingestion pour llamastack), dernier mode
+    setting, vector_retriever, keyword_index = settings[-1]
+    mode, retriever = mode_retrievers(vector_retriever, keyword_index, modes[-1:], args.candidates)[0]
+    label = f"{setting} [{mode}]"
+    print(f"\n⚙️  Concurrence sur '{label}' (k={sweep_k}, {args.rounds} passages)")
+    sweep = concurrency_sweep(retriever, queries, levels, k=sweep_k, rounds=args.rounds)
+    print_sweep(sweep)
+    results["concurrency"] = {"label": label, "k": sweep_k, "levels": sweep, "ceiling": qps_ceiling(sweep)}
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Rapport: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Profil de démarrage des outils client RAG
+
+Décompose le temps passé avant la première requête utile: imports des
+modules, import de llama_stack_client, construction du client, appels de
+découverte (models.list, vector_dbs.list) et première requête. Avec
+STARTUP_PROFILE=1, test-rag.py et test-assurance-rag.py affichent ce profil en
+fin d'exécution.
+
+En ligne de commande, chaque exécution est lancée dans un processus neuf
+(imports à froid), comme une invocation cron; avec DISCOVERY_CACHE_PATH, les
+exécutions suivantes lisent la découverte sur disque au lieu de la refaire.
+
+Exemple:
+  DISCOVERY_CACHE_PATH=/tmp/discovery.json python3 startup_profile.py --runs 3 --vector-db assurance_milvus_db
+"""
+
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from rag_metrics import format_ms
+
+# Modules importés par les scripts de test et d'évaluation RAG
+TOOL_MODULES = ("rag_eval", "agent_pool", "response_cache", "embedding_cache", "keyword_index", "retrieval_bench")
+
+
+class StartupProfiler:
+    """Durée de chaque phase de démarrage, dans l'ordre d'exécution"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases.append((name, time.perf_counter() - start))
+
+    def import_modules(self, modules):
+        """Importe les modules un par un (0 s pour ceux déjà chargés)"""
+        for module in modules:
+            with self.phase(f"import {module}"):
+                importlib.import_module(module)
+
+    def report(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.start
+            phases = [{"phase": name, "s": seconds} for name, seconds in self.phases]
+        return {"total_s": elapsed, "phases": phases, "other_s": elapsed - sum(p["s"] for p in phases)}
+
+
+def startup_profiler():
+    """Profiler actif si STARTUP_PROFILE=1, sinon None"""
+    return StartupProfiler() if os.getenv("STARTUP_PROFILE", "0") == "1" else None
+
+
+def profile_phase(profiler, name):
+    """Phase mesurée si un profiler est actif, sans effet sinon"""
+    return profiler.phase(name) if profiler is not None else nullcontext()
+
+
+def print_startup_profile(report):
+    """Affichage des phases de démarrage, de la plus coûteuse à la moins coûteuse"""
+    print(f"🚦 Profil de démarrage ({format_ms(report['total_s'])} au total):")
+    for p in sorted(report["phases"], key=lambda p: p["s"], reverse=True):
+        share = p["s"] / report["total_s"] if report["total_s"] else 0.0
+        print(f"   - {p['phase']}: {format_ms(p['s'])} ({share:.0%})")
+
+
+def profile_once(url, vector_db_id):
+    """Démarrage complet dans le processus courant: imports, client, découverte, première requête"""
+    from discovery_cache import list_models, list_vector_dbs, make_client, open_discovery_cache
+
+    profiler = StartupProfiler()
+    profiler.import_modules(TOOL_MODULES)
+    client = make_client(url, profiler)
+    cache = open_discovery_cache()
+    list_models(client, cache, profiler)
+    list_vector_dbs(client, cache, profiler)
+    if vector_db_id:
+        with profiler.phase("première requête (vector_io.query)"):
+            client.vector_io.query(vector_db_id=vector_db_id, query="assurance", params={"max_chunks": 1})
+    return profiler.report()
+
+
+def print_runs(reports):
+    """Tableau phase x exécution"""
+    names = []
+    for report in reports:
+        names += [p["phase"] for p in report["phases"] if p["phase"] not in names]
+    header = " | ".join(f"{f'exéc. {i}':>9}" for i in range(1, len(reports) + 1))
+    print(f"\n{'Phase':<40} | {header}")
+    durations = [dict([(p["phase"], p["s"]) for p in report["phases"]], total=report["total_s"]) for report in reports]
+    for name in names + ["total"]:
+        cells = " | ".join(f"{format_ms(d.get(name)):>9}" for d in durations)
+        print(f"{name:<40} | {cells}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil de démarrage des outils client RAG")
+    parser.add_argument("--url", default=os.getenv("LLAMA_STACK_URL", "http://lsd-llama-32-1b-instruct-service:8321"), help="URL de LlamaStack")
+    parser.add_argument("--vector-db", default=os.getenv("VECTOR_DB_ID"), help="Base pour la première requête (aucune si absent)")
+    parser.add_argument("--runs", type=int, default=2, help="Exécutions dans des processus neufs")
+    parser.add_argument("--clear", action="store_true", help="Vide le cache de découverte avant la première exécution")
+    parser.add_argument("--once", action="store_true", help="Une exécution dans ce processus, rapport JSON sur stdout")
+    args = parser.parse_args()
+
+    if args.once:
+        print(json.dumps(profile_once(args.url, args.vector_db)))
+        return
+
+    from discovery_cache import open_discovery_cache
+
+    cache = open_discovery_cache()
+    if cache is None:
+        print("ℹ️  DISCOVERY_CACHE_PATH non défini: chaque exécution refait la découverte")
+    elif args.clear:
+        cache.invalidate()
+
+    reports = []
+    command = [sys.executable, os.path.abspath(__file__), "--once", "--url", args.url]
+    if args.vector_db:
+        command += ["--vector-db", args.vector_db]
+    for run in range(1, args.runs + 1):
+        start = time.perf_counter()
+        proc = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        wall = time.perf_counter() - start
+        if proc.returncode != 0:
+            print(f"❌ Exécution {run} en échec:\n{proc.stderr.strip()}")
+            sys.exit(1)
+        report = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"🚀 Exécution {run}: {format_ms(report['total_s'])} jusqu'à la première requête incluse "
+              f"(processus: {format_ms(wall)}, démarrage de Python inclus)")
+        reports.append(report)
+
+    print_runs(reports)
+    if cache is not None:
+        cache = open_discovery_cache()
+        print(f"🗂️  Cache de découverte: {cache.path} ({len(cache.entries)} entrées, TTL {cache.ttl:.0f} s)")
+
+
+if __name__ == "__main__":
+    main()
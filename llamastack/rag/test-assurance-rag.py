@@ -5,8 +5,87 @@ Teste la fonctionnalité RAG avec des documents d'assurance
 """
 
 import os
-import uuid
-from llama_stack_client import Client, Agent, AgentEventLogger
+import time
+from startup_profile import print_startup_profile, profile_phase, startup_profiler
+
+# Profil de démarrage (STARTUP_PROFILE=1), créé avant les imports des outils pour mesurer leur coût
+PROFILER = startup_profiler()
+
+with profile_phase(PROFILER, "import agent_pool"):
+    from agent_pool import get_agent_pool, print_pool_stats
+with profile_phase(PROFILER, "import discovery_cache"):
+    from discovery_cache import find_vector_db, open_discovery_cache, print_discovery_cache_stats
+with profile_phase(PROFILER, "import rag_eval"):
+    from rag_eval import EvalItem, run_batch, summarize_results, print_summary
+    from rag_metrics import format_ms
+with profile_phase(PROFILER, "import embedding_cache"):
+    from embedding_cache import open_embedding_cache, print_embedding_cache_stats
+with profile_phase(PROFILER, "import response_cache"):
+    from response_cache import ResponseCache, llamastack_embedder
+with profile_phase(PROFILER, "import keyword_index"):
+    from keyword_index import BM25Index, HybridRetriever
+with profile_phase(PROFILER, "import retrieval_bench"):
+    from retrieval_bench import LlamaStackRetriever
+
+# Nombre de questions traitées en parallèle
+RAG_WORKERS = int(os.getenv('RAG_WORKERS', '4'))
+
+# Cache de réponses partagé par les tests (questions FAQ récurrentes)
+RESPONSE_CACHE = ResponseCache(
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1024')),
+    max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    similarity_threshold=float(os.getenv('RESPONSE_CACHE_SIMILARITY', '0.92')),
+)
+
+# Cache d'embeddings persistant des questions (EMBEDDING_CACHE_PATH), partagé avec l'ingestion
+EMBEDDING_CACHE = open_embedding_cache()
+
+# Cache disque de la découverte (DISCOVERY_CACHE_PATH)
+DISCOVERY_CACHE = open_discovery_cache()
+
+# Index BM25 construit par l'ingestion (KEYWORD_INDEX_PATH): recherche hybride avec moins de chunks
+KEYWORD_INDEX_PATH = os.getenv('KEYWORD_INDEX_PATH')
+HYBRID_K = int(os.getenv('HYBRID_K', '3'))
+
+def enable_semantic_cache(client):
+    """Active le niveau sémantique du cache si RESPONSE_CACHE_SEMANTIC=1"""
+    if os.getenv('RESPONSE_CACHE_SEMANTIC', '0') == '1' and RESPONSE_CACHE.embed_fn is None:
+        embed_model_id = os.getenv('EMBED_MODEL_ID', 'granite-embedding-125m')
+        RESPONSE_CACHE.embed_fn = llamastack_embedder(client, embed_model_id, cache=EMBEDDING_CACHE)
+        print(f"🧠 Cache sémantique activé ({embed_model_id})")
+
+def ask_agents(pool, items, model_id, instructions, vector_db_id):
+    """Pose les questions en parallèle (RAG_WORKERS) via le pool d'agents et le cache de réponses"""
+    start = time.perf_counter()
+    results = run_batch(
+        pool,
+        model_id,
+        instructions,
+        [vector_db_id],
+        items,
+        workers=RAG_WORKERS,
+        cache=RESPONSE_CACHE,
+    )
+    wall_time = time.perf_counter() - start
+    return results, summarize_results(results, wall_time, RAG_WORKERS)
+
+def print_answer(result):
+    """Affichage d'une réponse avec ses durées par phase"""
+    if result.error:
+        print(f"❌ Erreur: {result.error}")
+        return
+    print("⚡ Réponse (cache):" if result.cached else "💬 Réponse:")
+    print(f"  {result.answer}")
+    if not result.cached:
+        print(f"⏱️  Recherche: {format_ms(result.retrieval_s)} | Premier token: {format_ms(result.ttft_s)} "
+              f"| Génération: {format_ms(result.generation_s)} | Total: {format_ms(result.total_s)}")
+
+def print_cache_stats():
+    """Affichage des métriques du cache de réponses"""
+    stats = RESPONSE_CACHE.stats()
+    print(f"🗃️  Cache de réponses: {stats['hits']} hits ({stats['semantic_hits']} sémantiques), "
+          f"{stats['misses']} miss, taux {stats['hit_rate']:.0%}, {stats['entries']} entrées")
 
 def test_assurance_rag():
     """Test de la fonctionnalité RAG pour l'assurance"""
@@ -23,14 +102,15 @@ def test_assurance_rag():
     print("-" * 60)
     
     try:
-        # Connexion au client LlamaStack
-        client = Client(base_url=LLAMA_STACK_URL)
+        # Connexion au client LlamaStack (partagé par le pool d'agents)
+        pool = get_agent_pool(LLAMA_STACK_URL, profiler=PROFILER)
+        client = pool.client
         print("✅ Connexion à LlamaStack réussie")
+        enable_semantic_cache(client)
         
         # Vérifier que la base vectorielle existe
         print(f"\n🗄️  Vérification de la base '{VECTOR_DB_ID}'...")
-        vector_dbs = client.vector_dbs.list()
-        target_db = next((db for db in vector_dbs if db.identifier == VECTOR_DB_ID), None)
+        target_db, vector_dbs = find_vector_db(client, VECTOR_DB_ID, DISCOVERY_CACHE, PROFILER)
         
         if not target_db:
             print(f"⚠️  Base vectorielle '{VECTOR_DB_ID}' non trouvée")
@@ -43,21 +123,12 @@ def test_assurance_rag():
         
         # Créer un agent RAG spécialisé assurance
         print("\n🤖 Création de l'agent RAG Assurance...")
-        assurance_agent = Agent(
-            client,
-            model=MODEL_ID,
-            instructions="""Tu es un expert en assurance spécialisé dans l'analyse de documents d'assurance. 
+        instructions = """Tu es un expert en assurance spécialisé dans l'analyse de documents d'assurance. 
             Tu peux répondre aux questions sur les polices d'assurance, les garanties, les exclusions, 
             les procédures de sinistre et les aspects réglementaires. Utilise les informations de la 
-            base de connaissances pour fournir des réponses précises et utiles.""",
-            tools=[
-                {
-                    "name": "builtin::rag/knowledge_search",
-                    "args": {"vector_db_ids": [VECTOR_DB_ID]},
-                }
-            ],
-        )
-        print("✅ Agent RAG Assurance créé")
+            base de connaissances pour fournir des réponses précises et utiles."""
+        pool.agent(MODEL_ID, instructions, [VECTOR_DB_ID])
+        print("✅ Agent RAG Assurance configuré")
         
         # Questions spécifiques à l'assurance
         assurance_questions = [
@@ -71,39 +142,35 @@ def test_assurance_rag():
             "Comment fonctionne la franchise en assurance ?"
         ]
         
-        print(f"\n🔍 Test de {len(assurance_questions)} questions d'assurance...")
+        print(f"\n🔍 Test de {len(assurance_questions)} questions d'assurance ({RAG_WORKERS} workers)...")
         
-        for i, question in enumerate(assurance_questions, 1):
-            print(f"\n📝 Question {i}: {question}")
-            
-            # Créer une session
-            session_id = assurance_agent.create_session(session_name=f"assurance_session_{uuid.uuid4().hex[:8]}")
-            
-            # Envoyer la requête
-            response = assurance_agent.create_turn(
-                messages=[{"role": "user", "content": question}],
-                session_id=session_id,
-                stream=True,
-            )
-            
-            # Afficher la réponse
-            print("💬 Réponse:")
-            response_content = ""
-            for log in AgentEventLogger().log(response):
-                if hasattr(log, 'content') and log.content:
-                    response_content += log.content
-                    print(f"  {log.content}", end='', flush=True)
+        items = [EvalItem(id=str(i), question=q) for i, q in enumerate(assurance_questions, 1)]
+        with profile_phase(PROFILER, "premières requêtes RAG"):
+            results, summary = ask_agents(pool, items, MODEL_ID, instructions, VECTOR_DB_ID)
+        
+        for i, result in enumerate(results, 1):
+            print(f"\n📝 Question {i}: {result.question}")
+            print_answer(result)
             
             # Analyser la réponse
-            if response_content.strip():
-                print(f"\n✅ Réponse reçue ({len(response_content)} caractères)")
+            if result.answer.strip():
+                print(f"✅ Réponse reçue ({len(result.answer)} caractères)")
             else:
-                print(f"\n⚠️  Aucune réponse reçue")
+                print(f"⚠️  Aucune réponse reçue")
             
-            print("\n" + "-" * 40)
+            print("-" * 40)
+        
+        print()
+        print_summary(summary)
+        questions_ok = summary["errors"] == 0
         
         # Test de requête directe sur la base vectorielle
         print("\n🔍 Test de requête directe sur la base vectorielle...")
+        hybrid = None
+        if KEYWORD_INDEX_PATH and os.path.exists(KEYWORD_INDEX_PATH):
+            keyword_index = BM25Index.load(KEYWORD_INDEX_PATH)
+            hybrid = HybridRetriever(LlamaStackRetriever(client, VECTOR_DB_ID), keyword_index)
+            print(f"🔤 Recherche hybride (vecteurs + BM25, {len(keyword_index)} chunks indexés), k={HYBRID_K}")
         assurance_queries = [
             "assurance automobile garanties",
             "sinistre procédure déclaration",
@@ -113,6 +180,18 @@ def test_assurance_rag():
         
         for query in assurance_queries:
             print(f"\n🔎 Requête: '{query}'")
+            if hybrid:
+                try:
+                    start = time.perf_counter()
+                    chunks = hybrid.query(query, HYBRID_K)
+                    print(f"✅ {len(chunks)} résultats en {format_ms(time.perf_counter() - start)}")
+                    for j, chunk in enumerate(chunks[:2], 1):
+                        vector_rank, keyword_rank = chunk["ranks"]
+                        print(f"  Résultat {j} (rang vecteurs: {vector_rank or '-'}, BM25: {keyword_rank or '-'}): "
+                              f"{chunk['content'][:150]}...")
+                except Exception as e:
+                    print(f"❌ Erreur lors de la requête hybride: {e}")
+                continue
             try:
                 query_result = client.vector_io.query(
                     vector_db_id=VECTOR_DB_ID,
@@ -129,6 +208,10 @@ def test_assurance_rag():
             except Exception as e:
                 print(f"❌ Erreur lors de la requête: {e}")
         
+        if not questions_ok:
+            print("\n⚠️  Certaines questions ont échoué")
+            return False
+        
         print("\n🎉 Tests RAG Assurance terminés avec succès!")
         return True
         
@@ -146,7 +229,8 @@ def test_assurance_scenarios():
     print(f"\n🎭 Test de scénarios d'assurance...")
     
     try:
-        client = Client(base_url=LLAMA_STACK_URL)
+        pool = get_agent_pool(LLAMA_STACK_URL)
+        enable_semantic_cache(pool.client)
         
         # Scénarios d'assurance
         scenarios = [
@@ -168,36 +252,20 @@ def test_assurance_scenarios():
             }
         ]
         
-        assurance_agent = Agent(
-            client,
-            model=MODEL_ID,
-            instructions="Tu es un expert en assurance. Réponds aux questions en te basant sur les documents d'assurance disponibles.",
-            tools=[
-                {
-                    "name": "builtin::rag/knowledge_search",
-                    "args": {"vector_db_ids": [VECTOR_DB_ID]},
-                }
-            ],
-        )
-        
-        for scenario in scenarios:
+        instructions = "Tu es un expert en assurance. Réponds aux questions en te basant sur les documents d'assurance disponibles."
+        
+        items = [EvalItem(id=scenario['name'], question=scenario['question']) for scenario in scenarios]
+        results, summary = ask_agents(pool, items, MODEL_ID, instructions, VECTOR_DB_ID)
+        
+        for scenario, result in zip(scenarios, results):
             print(f"\n🎭 Scénario: {scenario['name']}")
             print(f"❓ Question: {scenario['question']}")
-            
-            session_id = assurance_agent.create_session(session_name=f"scenario_{uuid.uuid4().hex[:8]}")
-            response = assurance_agent.create_turn(
-                messages=[{"role": "user", "content": scenario['question']}],
-                session_id=session_id,
-                stream=True,
-            )
-            
-            print("💬 Réponse:")
-            for log in AgentEventLogger().log(response):
-                if hasattr(log, 'content') and log.content:
-                    print(f"  {log.content}", end='', flush=True)
-            print("\n")
+            print_answer(result)
         
-        return True
+        print()
+        print_summary(summary)
+        
+        return summary["errors"] == 0
         
     except Exception as e:
         print(f"❌ Erreur lors du test des scénarios: {e}")
@@ -219,6 +287,15 @@ if __name__ == "__main__":
     print("=" * 70)
     print(f"RAG Assurance: {'✅ SUCCESS' if rag_success else '❌ FAILED'}")
     print(f"Scénarios Assurance: {'✅ SUCCESS' if scenarios_success else '❌ FAILED'}")
+    print_cache_stats()
+    if EMBEDDING_CACHE is not None:
+        print_embedding_cache_stats(EMBEDDING_CACHE.stats())
+        EMBEDDING_CACHE.close()
+    print_pool_stats(get_agent_pool(os.getenv('LLAMA_STACK_URL', 'http://lsd-llama-32-1b-instruct-service:8321')).stats())
+    if DISCOVERY_CACHE is not None:
+        print_discovery_cache_stats(DISCOVERY_CACHE.stats())
+    if PROFILER:
+        print_startup_profile(PROFILER.report())
     
     if rag_success and scenarios_success:
         print("\n🎉 Tous les tests assurance sont passés avec succès!")
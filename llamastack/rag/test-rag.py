@@ -5,8 +5,22 @@ Basé sur la documentation Red Hat OpenShift AI
 """
 
 import os
-import uuid
-from llama_stack_client import Client, Agent, AgentEventLogger
+
+from startup_profile import print_startup_profile, profile_phase, startup_profiler
+
+# Profil de démarrage (STARTUP_PROFILE=1), créé avant les imports des outils pour mesurer leur coût
+PROFILER = startup_profiler()
+
+with profile_phase(PROFILER, "import agent_pool"):
+    from agent_pool import get_agent_pool, print_pool_stats
+with profile_phase(PROFILER, "import discovery_cache"):
+    from discovery_cache import find_vector_db, list_models, open_discovery_cache, print_discovery_cache_stats
+with profile_phase(PROFILER, "import rag_eval"):
+    from rag_eval import EvalItem, run_batch
+    from rag_metrics import format_ms
+
+# Cache disque de la découverte (DISCOVERY_CACHE_PATH)
+DISCOVERY_CACHE = open_discovery_cache()
 
 def test_rag_functionality():
     """Test de la fonctionnalité RAG avec LlamaStack"""
@@ -22,13 +36,14 @@ def test_rag_functionality():
     print("-" * 50)
     
     try:
-        # Connexion au client LlamaStack
-        client = Client(base_url=LLAMA_STACK_URL)
+        # Connexion au client LlamaStack (partagé par le pool d'agents)
+        pool = get_agent_pool(LLAMA_STACK_URL, profiler=PROFILER)
+        client = pool.client
         print("✅ Connexion à LlamaStack réussie")
         
         # Lister les modèles disponibles
         print("\n📋 Modèles disponibles:")
-        models = client.models.list()
+        models = list_models(client, DISCOVERY_CACHE, PROFILER)
         for model in models:
             print(f"  - {model.identifier} ({model.model_type})")
         
@@ -42,12 +57,11 @@ def test_rag_functionality():
         
         # Vérifier les bases vectorielles disponibles
         print("\n🗄️  Bases vectorielles disponibles:")
-        vector_dbs = client.vector_dbs.list()
+        target_db, vector_dbs = find_vector_db(client, VECTOR_DB_ID, DISCOVERY_CACHE, PROFILER)
         for db in vector_dbs:
             print(f"  - {db.identifier}")
         
         # Vérifier que la base vectorielle existe
-        target_db = next((db for db in vector_dbs if db.identifier == VECTOR_DB_ID), None)
         if not target_db:
             print(f"❌ Base vectorielle '{VECTOR_DB_ID}' non trouvée")
             return False
@@ -56,18 +70,9 @@ def test_rag_functionality():
         
         # Créer un agent RAG
         print("\n🤖 Création de l'agent RAG...")
-        rag_agent = Agent(
-            client,
-            model=llm_model.identifier,
-            instructions="Tu es un assistant IA spécialisé dans l'analyse de documents. Utilise les informations de la base de connaissances pour répondre aux questions.",
-            tools=[
-                {
-                    "name": "builtin::rag/knowledge_search",
-                    "args": {"vector_db_ids": [VECTOR_DB_ID]},
-                }
-            ],
-        )
-        print("✅ Agent RAG créé")
+        instructions = "Tu es un assistant IA spécialisé dans l'analyse de documents. Utilise les informations de la base de connaissances pour répondre aux questions."
+        pool.agent(llm_model.identifier, instructions, [VECTOR_DB_ID])
+        print("✅ Agent RAG configuré")
         
         # Test de requête RAG
         print("\n🔍 Test de requête RAG...")
@@ -77,25 +82,21 @@ def test_rag_functionality():
             "Y a-t-il des détails techniques importants dans les documents ?"
         ]
         
-        for i, question in enumerate(test_questions, 1):
-            print(f"\n📝 Question {i}: {question}")
-            
-            # Créer une session
-            session_id = rag_agent.create_session(session_name=f"test_session_{uuid.uuid4().hex[:8]}")
-            
-            # Envoyer la requête
-            response = rag_agent.create_turn(
-                messages=[{"role": "user", "content": question}],
-                session_id=session_id,
-                stream=True,
-            )
-            
-            # Afficher la réponse
+        # Questions traitées en parallèle (RAG_WORKERS)
+        items = [EvalItem(id=str(i), question=q) for i, q in enumerate(test_questions, 1)]
+        with profile_phase(PROFILER, "premières requêtes RAG"):
+            results = run_batch(pool, llm_model.identifier, instructions, [VECTOR_DB_ID], items,
+                                workers=int(os.getenv('RAG_WORKERS', '4')))
+        
+        for i, result in enumerate(results, 1):
+            print(f"\n📝 Question {i}: {result.question}")
+            if result.error:
+                print(f"❌ Erreur: {result.error}")
+                return False
             print("💬 Réponse:")
-            for log in AgentEventLogger().log(response):
-                if hasattr(log, 'content') and log.content:
-                    print(f"  {log.content}", end='', flush=True)
-            print("\n")
+            print(f"  {result.answer}")
+            print(f"⏱️  Recherche: {format_ms(result.retrieval_s)} | Génération: {format_ms(result.generation_s)}")
+        print_pool_stats(pool.stats())
         
         # Test de requête directe sur la base vectorielle
         print("\n🔍 Test de requête directe sur la base vectorielle...")
@@ -127,7 +128,8 @@ def test_vector_db_operations():
     print(f"\n🗄️  Test des opérations sur la base vectorielle...")
     
     try:
-        client = Client(base_url=LLAMA_STACK_URL)
+        # Client partagé par le pool d'agents (pas de seconde connexion)
+        client = get_agent_pool(LLAMA_STACK_URL, profiler=PROFILER).client
         
         # Lister les providers disponibles
         print("📋 Providers de base vectorielle disponibles:")
@@ -168,6 +170,10 @@ if __name__ == "__main__":
     print("=" * 60)
     print(f"RAG Functionality: {'✅ SUCCESS' if rag_success else '❌ FAILED'}")
     print(f"Vector DB Operations: {'✅ SUCCESS' if vector_success else '❌ FAILED'}")
+    if DISCOVERY_CACHE is not None:
+        print_discovery_cache_stats(DISCOVERY_CACHE.stats())
+    if PROFILER:
+        print_startup_profile(PROFILER.report())
     
     if rag_success and vector_success:
         print("\n🎉 Tous les tests sont passés avec succès!")
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Routage multi-collections des requêtes RAG dans un seul processus client
+
+Au lieu d'un VECTOR_DB_ID par processus, le routeur choisit les bases
+vectorielles de chaque requête par règles de langue et de cas d'usage
+(documents d'assurance FR ou EN, documents généraux), puis interroge
+vector_io.query sur chacune et fusionne les classements par RRF (les scores
+bruts de deux collections ne sont pas comparables).
+
+Les métadonnées des bases viennent d'un seul vector_dbs.list() (rafraîchi
+après metadata_ttl) au lieu d'une recherche par requête. Chaque collection est
+chargée à sa première requête et garde ses résultats récents dans un cache LRU
+avec TTL qui lui est propre: une collection très sollicitée n'évince pas les
+résultats des autres.
+
+Exemples:
+  python3 vector_router.py "Comment fonctionne la franchise ?" "What does homeowners insurance cover?"
+  python3 vector_router.py --dataset datasets/assurance-questions.jsonl --repeat 2
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from discovery_cache import list_vector_dbs
+from keyword_index import reciprocal_rank_fusion
+from rag_metrics import format_ms
+from response_cache import normalize_text
+from retrieval_bench import LlamaStackRetriever
+from vector_store import chunk_key, tokenize
+
+_WORD_RE = re.compile(r"[a-zà-ÿ']+")
+
+# Mots fréquents propres à chaque langue (les accents comptent pour le français)
+FRENCH_WORDS = frozenset("""
+le la les des du un une est sont et ou que qui quel quelle quelles quels comment pourquoi
+dois je mon ma mes votre vos nous vous dans pour avec sur en cas quoi combien faut
+""".split())
+ENGLISH_WORDS = frozenset("""
+the a an is are and or what which who how why when do does my your our in on for with of
+to can should if this that much many
+""".split())
+
+# Racines des termes du métier de l'assurance (après vector_store.tokenize)
+INSURANCE_TERMS = (
+    "assur", "insur", "sinistre", "claim", "franchise", "deductible", "garanti", "coverage",
+    "polic", "contrat", "premium", "resiliation", "indemni", "habitation", "homeowner",
+    "prescription", "exclusion", "beneficiair", "beneficiar", "cambriol", "theft", "degat",
+    "voleur", "incendi", "accident", "dommage", "damage", "inond", "flood", "tempete", "grele",
+    "catastroph", "rembours", "cotis", "avenant", "constat", "expertis", "burglar",
+)
+
+# Mots courts du métier, comparés au mot entier ("vol" ne doit pas attraper "volume")
+INSURANCE_WORDS = frozenset(("vol", "vole", "volee", "bri", "bris", "stolen"))
+
+# Règles évaluées dans l'ordre: la première qui correspond donne les bases de la requête
+DEFAULT_ROUTES = [
+    {"name": "assurance-fr", "language": "fr", "terms": INSURANCE_TERMS, "words": INSURANCE_WORDS,
+     "vector_db_ids": ["assurance_fr_milvus_db", "assurance_milvus_db"]},
+    {"name": "assurance-en", "terms": INSURANCE_TERMS, "words": INSURANCE_WORDS,
+     "vector_db_ids": ["assurance_milvus_db"]},
+    {"name": "general", "vector_db_ids": ["my_milvus_db"]},
+]
+
+
+def detect_language(text, default="fr"):
+    """"fr" ou "en" selon les mots outils et les accents de la question"""
+    lowered = unicodedata.normalize("NFC", text or "").lower()
+    words = _WORD_RE.findall(lowered)
+    french = sum(1 for w in words if w in FRENCH_WORDS or any(c in "àâçéèêëîïôùûüÿ" for c in w))
+    english = sum(1 for w in words if w in ENGLISH_WORDS)
+    if french == english:
+        return default
+    return "fr" if french > english else "en"
+
+
+def load_routes(path):
+    """Règles de routage JSON ou YAML (liste ou clé "routes")"""
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return data.get("routes", []) if isinstance(data, dict) else data
+
+
+def collection_chunk_key(chunk):
+    """Clé de fusion multi-collections: une même position dans deux bases reste deux résultats"""
+    return (chunk.get("vector_db_id"), chunk_key(chunk))
+
+
+def match_route(routes, question, language=None, usecase=None):
+    """Première règle correspondant à la langue, au cas d'usage (nom de règle) ou aux termes
+
+    "terms" sont des racines (préfixes des mots), "words" des mots entiers.
+    """
+    language = language or detect_language(question)
+    words = tokenize(question)
+    for route in routes:
+        if usecase is not None:
+            if route.get("name") == usecase or route.get("usecase") == usecase:
+                return route
+            continue
+        if route.get("language") and route["language"] != language:
+            continue
+        terms = tuple(route.get("terms") or ())
+        exact = set(route.get("words") or ())
+        if (terms or exact) and not any(w in exact or (terms and w.startswith(terms)) for w in words):
+            continue
+        return route
+    return None
+
+
+class _Collection:
+    """État d'une collection chargée: retriever, métadonnées et résultats récents (LRU)"""
+
+    def __init__(self, vector_db_id, retriever, metadata, load_s):
+        self.vector_db_id = vector_db_id
+        self.retriever = retriever
+        self.metadata = metadata
+        self.load_s = load_s
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class VectorRouter:
+    """Sert plusieurs bases vectorielles depuis un client LlamaStack partagé"""
+
+    def __init__(self, client, routes=None, cache_entries=256, ttl=300.0, metadata_ttl=600.0,
+                 retriever_factory=None, discovery_cache=None):
+        self.client = client
+        self.discovery_cache = discovery_cache
+        self.routes = routes or DEFAULT_ROUTES
+        self.cache_entries = cache_entries
+        self.ttl = ttl
+        self.metadata_ttl = metadata_ttl
+        self.retriever_factory = retriever_factory or (lambda db_id: LlamaStackRetriever(client, db_id))
+        self.lock = threading.Lock()
+        self.catalog_lock = threading.Lock()
+        self.catalog = None
+        self.catalog_expires = 0.0
+        self.catalog_loads = 0
+        self.collections = {}
+        self.route_counts = {}
+
+    def _catalog(self):
+        """Métadonnées de toutes les bases (un seul vector_dbs.list() par metadata_ttl, cache disque optionnel)"""
+        with self.catalog_lock:
+            if self.catalog is None or time.monotonic() >= self.catalog_expires:
+                catalog = {}
+                for db in list_vector_dbs(self.client, self.discovery_cache):
+                    catalog[db.identifier] = {
+                        "embedding_model": db.embedding_model,
+                        "embedding_dimension": db.embedding_dimension,
+                        "provider_id": db.provider_id,
+                    }
+                self.catalog = catalog
+                self.catalog_expires = time.monotonic() + self.metadata_ttl
+                self.catalog_loads += 1
+            return self.catalog
+
+    def collection(self, vector_db_id):
+        """Collection chargée à la première demande (None si la base n'existe pas)"""
+        with self.lock:
+            state = self.collections.get(vector_db_id)
+        if state is not None:
+            return state
+        start = time.perf_counter()
+        metadata = self._catalog().get(vector_db_id)
+        if metadata is None:
+            return None
+        retriever = self.retriever_factory(vector_db_id)
+        with self.lock:
+            state = self.collections.get(vector_db_id)
+            if state is None:
+                state = _Collection(vector_db_id, retriever, metadata, time.perf_counter() - start)
+                self.collections[vector_db_id] = state
+        return state
+
+    def route(self, question, language=None, usecase=None):
+        """Bases existantes pour une question (règle de routage, puis filtrage par le catalogue)"""
+        route = match_route(self.routes, question, language, usecase)
+        if route is None:
+            raise ValueError(f"Aucune règle de routage pour: {question[:60]}")
+        with self.lock:
+            self.route_counts[route.get("name")] = self.route_counts.get(route.get("name"), 0) + 1
+        catalog = self._catalog()
+        vector_db_ids = [db_id for db_id in route["vector_db_ids"] if db_id in catalog]
+        if not vector_db_ids:
+            raise ValueError(f"Aucune base de la règle '{route.get('name')}' n'existe: {route['vector_db_ids']}")
+        return vector_db_ids
+
+    def _query_collection(self, state, question, k):
+        key = (normalize_text(question), k)
+        now = time.monotonic()
+        with self.lock:
+            cached = state.results.get(key)
+            if cached is not None and cached[0] > now:
+                state.results.move_to_end(key)
+                state.hits += 1
+                return cached[1]
+            state.misses += 1
+        results = [dict(chunk, vector_db_id=state.vector_db_id) for chunk in state.retriever.query(question, k)]
+        with self.lock:
+            state.results[key] = (now + self.ttl, results)
+            state.results.move_to_end(key)
+            while len(state.results) > self.cache_entries:
+                state.results.popitem(last=False)
+                state.evictions += 1
+        return results
+
+    def query(self, question, k=5, vector_db_ids=None, language=None, usecase=None):
+        """Top-k chunks des bases routées (ou imposées), fusionnés par RRF sur les rangs"""
+        vector_db_ids = vector_db_ids or self.route(question, language, usecase)
+        result_lists = []
+        for vector_db_id in vector_db_ids:
+            state = self.collection(vector_db_id)
+            if state is None:
+                raise ValueError(f"Base vectorielle inconnue: {vector_db_id}")
+            result_lists.append(self._query_collection(state, question, k))
+        if len(result_lists) == 1:
+            return result_lists[0][:k]
+        return reciprocal_rank_fusion(result_lists, key_fn=collection_chunk_key)[:k]
+
+    def invalidate(self, vector_db_id=None):
+        """Vide les résultats d'une base (après réingestion) ou de toutes, et le catalogue"""
+        with self.lock:
+            for db_id, state in self.collections.items():
+                if vector_db_id is None or db_id == vector_db_id:
+                    state.results.clear()
+        with self.catalog_lock:
+            self.catalog_expires = 0.0
+
+    def stats(self):
+        """Compteurs par collection, chargements du catalogue et répartition des routes"""
+        with self.lock:
+            collections = {}
+            for db_id, state in self.collections.items():
+                lookups = state.hits + state.misses
+                collections[db_id] = {
+                    "entries": len(state.results),
+                    "hits": state.hits,
+                    "misses": state.misses,
+                    "hit_rate": state.hits / lookups if lookups else 0.0,
+                    "evictions": state.evictions,
+                    "load_s": state.load_s,
+                    "embedding_model": state.metadata.get("embedding_model"),
+                }
+            return {
+                "catalog_loads": self.catalog_loads,
+                "routes": dict(self.route_counts),
+                "collections": collections,
+            }
+
+
+class RoutedRetriever:
+    """Interface .query(question, k) (HybridRetriever, benchmarks) sur le routeur ou une base donnée"""
+
+    def __init__(self, router, vector_db_id=None):
+        self.router = router
+        self.vector_db_id = vector_db_id
+
+    def query(self, query, k=5):
+        return self.router.query(query, k, [self.vector_db_id] if self.vector_db_id else None)
+
+
+def print_router_stats(stats):
+    """Affichage du catalogue, des routes et des caches par collection"""
+    routes = ", ".join(f"{name}: {count}" for name, count in stats["routes"].items()) or "aucune"
+    print(f"🧭 Routeur: {stats['catalog_loads']} chargement(s) du catalogue, routes {routes}")
+    for db_id, c in stats["collections"].items():
+        print(f"   - {db_id}: {c['hits']} hits / {c['misses']} miss ({c['hit_rate']:.0%}), "
+              f"{c['entries']} entrées, chargée en {format_ms(c['load_s'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Routage des requêtes RAG sur plusieurs bases vectorielles")
+    parser.add_argument("questions", nargs="*", help="Questions à router")
+    parser.add_argument("--dataset", default=None, help="Dataset JSONL de questions (rag_eval.py)")
+    parser.add_argument("--url", default=os.getenv("LLAMA_STACK_URL", "http://lsd-llama-32-1b-instruct-service:8321"), help="URL de LlamaStack")
+    parser.add_argument("--routes", default=os.getenv("VECTOR_ROUTES"), help="Règles de routage JSON/YAML (défaut: assurance FR/EN, général)")
+    parser.add_argument("--k", type=int, default=3, help="Chunks par requête")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes sur les questions (les suivantes touchent le cache)")
+    args = parser.parse_args()
+
+    from discovery_cache import make_client, open_discovery_cache
+
+    questions = list(args.questions)
+    if args.dataset:
+        from rag_eval import load_dataset
+        questions += [item.question for item in load_dataset(args.dataset)]
+    router = VectorRouter(make_client(args.url), load_routes(args.routes) if args.routes else None,
+                          discovery_cache=open_discovery_cache())
+
+    for n in range(args.repeat):
+        start = time.perf_counter()
+        for question in questions:
+            try:
+                t0 = time.perf_counter()
+                results = router.query(question, args.k)
+                dbs = sorted({r["vector_db_id"] for r in results})
+                if n == 0:
+                    print(f"🧭 [{detect_language(question)}] {question[:60]} → {', '.join(dbs) or '-'} "
+                          f"({len(results)} chunks, {format_ms(time.perf_counter() - t0)})")
+            except ValueError as e:
+                print(f"⚠️  {e}")
+        print(f"⏱️  Passe {n + 1}: {len(questions)} requêtes en {format_ms(time.perf_counter() - start)}")
+    print_router_stats(router.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Base vectorielle locale en mémoire (remplaçant de Milvus-lite pour les benchmarks hors cluster)
+
+Les documents sont découpés en chunks de mots avec chevauchement, vectorisés
+(embedding par hachage des mots par défaut, ou fonction d'embedding fournie,
+par exemple llamastack_embedder) puis interrogés par similarité cosinus.
+Les résultats ont la même forme que les chunks de vector_io.query:
+{"content", "metadata": {"document_id", ...}, "score"}.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import re
+import threading
+import unicodedata
+import zlib
+
+DEFAULT_DIM = 512
+
+_WORD_RE = re.compile(r"\w+")
+
+# Mots outils ignorés par l'embedding par hachage (ils dominent sinon la similarité)
+STOPWORDS = frozenset("""
+au aux avec ce ces cet cette comment dan de des du elle en est et il ils je la le les leur
+lui mais me mon ne nou on ou par pas pour qu que quel quelle quelles quels qui sa se ses
+son sont sur ta te ton tu un une vou votre vos etre avoir fait faire
+""".split())
+
+
+def tokenize(text):
+    """Mots normalisés (minuscules, sans accents, pluriels simples et mots outils retirés)"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    words = []
+    for word in _WORD_RE.findall(text):
+        if len(word) > 3 and word.endswith(("s", "x")):
+            word = word[:-1]
+        if len(word) > 1 and word not in STOPWORDS:
+            words.append(word)
+    return words
+
+
+def chunk_key(chunk):
+    """Identifiant stable d'un chunk: chunk_id, sinon document et position, sinon empreinte du contenu
+
+    Les chunks insérés par le rag_tool LlamaStack n'ont pas de chunk_index: la
+    position n'est utilisée que si elle est connue, pour ne pas confondre tous
+    les chunks d'un même document.
+    """
+    metadata = chunk.get("metadata") or {}
+    if metadata.get("chunk_id") is not None:
+        return str(metadata["chunk_id"])
+    if metadata.get("document_id") is not None and metadata.get("chunk_index") is not None:
+        return f"{metadata['document_id']}#{metadata['chunk_index']:06d}"
+    return hashlib.sha1(chunk["content"].encode()).hexdigest()
+
+
+def hashing_embedder(dim=DEFAULT_DIM):
+    """Embedding déterministe sans modèle: sac de mots et bigrammes hachés dans `dim` dimensions"""
+    def embed(text):
+        vector = [0.0] * dim
+        words = tokenize(text)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = zlib.crc32(feature.encode())
+            vector[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return vector
+    return embed
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+def chunk_words(text, chunk_size=128, overlap=0):
+    """Découpe un texte en chunks de `chunk_size` mots avec `overlap` mots de chevauchement"""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_size - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_size]))
+        if start + chunk_size >= len(words):
+            break
+    return chunks
+
+
+def load_corpus(path):
+    """Corpus JSONL: une ligne par document {"document_id", "text", ...métadonnées}"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class LocalVectorStore:
+    """Index vectoriel en mémoire, interrogeable depuis plusieurs threads"""
+
+    def __init__(self, embed_fn=None):
+        self.embed_fn = embed_fn or hashing_embedder()
+        self.lock = threading.Lock()
+        self.chunks = []
+        self.vectors = []
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def insert(self, chunks):
+        """Ajoute des chunks {"content", "metadata"} (embeddings calculés à l'insertion)"""
+        vectors = [_normalize(self.embed_fn(chunk["content"])) for chunk in chunks]
+        with self.lock:
+            self.chunks.extend(chunks)
+            self.vectors.extend(vectors)
+
+    def add_documents(self, documents, chunk_size=128, overlap=0):
+        """Découpe et indexe des documents {"document_id", "text"}; retourne le nombre de chunks"""
+        chunks = []
+        for doc in documents:
+            metadata = {k: v for k, v in doc.items() if k != "text"}
+            for i, content in enumerate(chunk_words(doc["text"], chunk_size, overlap)):
+                chunks.append({"content": content, "metadata": dict(metadata, chunk_index=i)})
+        self.insert(chunks)
+        return len(chunks)
+
+    def query(self, query, k=5):
+        """Top-k chunks par similarité cosinus"""
+        q = _normalize(self.embed_fn(query))
+        with self.lock:
+            scored = ((sum(a * b for a, b in zip(q, v)), i) for i, v in enumerate(self.vectors))
+            top = heapq.nlargest(k, scored)
+            return [dict(self.chunks[i], score=score) for score, i in top]
@@ -3,34 +3,50 @@
 Test script pour le modèle Llama-3.2-1B-Instruct déployé sur OpenShift AI
 """
 
-import requests
+import argparse
 import json
-import time
 
 # Configuration du modèle déployé
-import os
-from urllib.parse import urljoin
+from llama_client import (
+    SSE_DONE,
+    PooledHTTPClient,
+    StreamMetrics,
+    build_endpoints,
+    chat_payload,
+    chunk_text,
+    completion_payload,
+    format_ms,
+    get_model_url,
+    parse_sse_line,
+    print_stream_summary,
+    stream_options,
+    summarize_latencies,
+)
+from llama_readiness import print_readiness, wait_until_ready
 
-# Chargement des variables d'environnement
-OPENSHIFT_PROJECT = os.getenv("OPENSHIFT_PROJECT", "llama-instruct-32-1b-demo")
-OPENSHIFT_CLUSTER_DOMAIN = os.getenv("OPENSHIFT_CLUSTER_DOMAIN")
+# Construction de l'URL du modèle (LLAMA_MODEL_URL ou OPENSHIFT_PROJECT/OPENSHIFT_CLUSTER_DOMAIN)
+MODEL_URL = get_model_url()
+CHAT_ENDPOINT = None
+COMPLETION_ENDPOINT = None
+MODELS_ENDPOINT = None
 
-if not OPENSHIFT_CLUSTER_DOMAIN:
-    print("❌ Variable OPENSHIFT_CLUSTER_DOMAIN non définie dans .env")
-    print("Configurez votre fichier .env avec le bon domaine de cluster")
-    exit(1)
+# Session HTTP partagée (keep-alive) pour tous les tests
+HTTP_CLIENT = None
 
-# Construction de l'URL du modèle
-MODEL_URL = f"https://llama-32-1b-instruct-{OPENSHIFT_PROJECT}.apps.{OPENSHIFT_CLUSTER_DOMAIN}"
-CHAT_ENDPOINT = f"{MODEL_URL}/v1/chat/completions"
-COMPLETION_ENDPOINT = f"{MODEL_URL}/v1/completions"
-MODELS_ENDPOINT = f"{MODEL_URL}/v1/models"
+def configure_endpoints(model_url):
+    """Initialise les endpoints du modèle à partir de l'URL de base"""
+    global MODEL_URL, CHAT_ENDPOINT, COMPLETION_ENDPOINT, MODELS_ENDPOINT
+    endpoints = build_endpoints(model_url)
+    MODEL_URL = model_url
+    CHAT_ENDPOINT = endpoints["chat"]
+    COMPLETION_ENDPOINT = endpoints["completion"]
+    MODELS_ENDPOINT = endpoints["models"]
 
 def test_models_endpoint():
     """Test de l'endpoint /v1/models pour vérifier que le modèle est disponible"""
     print("🔍 Test de l'endpoint /v1/models...")
     try:
-        response = requests.get(MODELS_ENDPOINT, timeout=30)
+        response = HTTP_CLIENT.get(MODELS_ENDPOINT, timeout=30)
         print(f"✅ Status: {response.status_code}")
         if response.status_code == 200:
             models = response.json()
@@ -47,29 +63,13 @@ def test_chat_completion():
     """Test de l'endpoint /v1/chat/completions"""
     print("\n💬 Test de l'endpoint /v1/chat/completions...")
     
-    payload = {
-        "model": "llama-32-1b-instruct",
-        "messages": [
-            {
-                "role": "system",
-                "content": "Tu es un assistant IA utile et amical. Réponds en français de manière claire et concise."
-            },
-            {
-                "role": "user",
-                "content": "Salut ! Peux-tu me dire en quoi consiste le modèle Llama-3.2-1B-Instruct ?"
-            }
-        ],
-        "max_tokens": 200,
-        "temperature": 0.7,
-        "stream": False
-    }
+    payload = chat_payload(max_tokens=200, temperature=0.7)
     
     try:
         print("📤 Envoi de la requête...")
-        response = requests.post(
+        response = HTTP_CLIENT.post(
             CHAT_ENDPOINT,
             json=payload,
-            headers={"Content-Type": "application/json"},
             timeout=60
         )
         
@@ -93,20 +93,13 @@ def test_completion():
     """Test de l'endpoint /v1/completions (format legacy)"""
     print("\n📝 Test de l'endpoint /v1/completions...")
     
-    payload = {
-        "model": "llama-32-1b-instruct",
-        "prompt": "Explique-moi ce qu'est l'intelligence artificielle en 2 phrases:",
-        "max_tokens": 100,
-        "temperature": 0.5,
-        "stream": False
-    }
+    payload = completion_payload(max_tokens=100, temperature=0.5)
     
     try:
         print("📤 Envoi de la requête...")
-        response = requests.post(
+        response = HTTP_CLIENT.post(
             COMPLETION_ENDPOINT,
             json=payload,
-            headers={"Content-Type": "application/json"},
             timeout=60
         )
         
@@ -126,28 +119,89 @@ def test_completion():
         print(f"❌ Exception: {e}")
         return False
 
-def main():
+def run_stream_test(endpoint, payload):
+    """Envoie une requête en streaming et mesure TTFT, latence inter-token et débit de décodage"""
+    try:
+        print("📤 Envoi de la requête en streaming...")
+        metrics = StreamMetrics()
+        with HTTP_CLIENT.stream_post(
+            endpoint,
+            json=stream_options(payload),
+            timeout=60
+        ) as response:
+            print(f"✅ Status: {response.status_code}")
+            if response.status_code != 200:
+                print(f"❌ Erreur: {response.text}")
+                return False
+
+            print("🤖 Réponse du modèle: ", end='', flush=True)
+            for line in response.iter_lines():
+                chunk = parse_sse_line(line)
+                if chunk is SSE_DONE:
+                    break
+                if chunk is not None:
+                    metrics.feed(chunk)
+                    print(chunk_text(chunk), end='', flush=True)
+            metrics.finish()
+
+        print()
+        print(f"   - Tokens générés: {metrics.completion_tokens}")
+        print_stream_summary(
+            summarize_latencies([metrics.ttft] if metrics.ttft is not None else []),
+            summarize_latencies(metrics.inter_token_latencies),
+            summarize_latencies([metrics.decode_tokens_per_s] if metrics.decode_tokens_per_s else []),
+        )
+        return metrics.ttft is not None
+
+    except Exception as e:
+        print(f"❌ Exception: {e}")
+        return False
+
+def test_chat_completion_stream():
+    """Test de l'endpoint /v1/chat/completions en streaming (TTFT, latence inter-token)"""
+    print("\n⚡ Test de l'endpoint /v1/chat/completions en streaming...")
+    return run_stream_test(CHAT_ENDPOINT, chat_payload(max_tokens=200, temperature=0.7))
+
+def test_completion_stream():
+    """Test de l'endpoint /v1/completions en streaming (TTFT, latence inter-token)"""
+    print("\n⚡ Test de l'endpoint /v1/completions en streaming...")
+    return run_stream_test(COMPLETION_ENDPOINT, completion_payload(max_tokens=100, temperature=0.5))
+
+def print_connection_stats(stats):
+    """Affichage de la réutilisation des connexions (coût réseau vs latence du modèle)"""
+    print(f"🔌 Connexions ({stats['protocol']}, pool {stats['pool_size']}): "
+          f"{stats['new_connections']} ouvertes, {stats['reused_connections']} réutilisées "
+          f"sur {stats['requests']} requêtes")
+    print(f"   - Latence moyenne avec ouverture de connexion: {format_ms(stats['latency_new_connection_s']['mean'])}")
+    print(f"   - Latence moyenne sur connexion réutilisée: {format_ms(stats['latency_reused_s']['mean'])}")
+
+def main(ready_timeout=600):
     """Fonction principale de test"""
     print("🚀 Test du modèle Llama-3.2-1B-Instruct sur OpenShift AI")
     print("=" * 60)
     
+    # Attendre que le modèle soit prêt (/v1/models + génération de warmup, backoff exponentiel)
+    print(f"⏳ Attente de la disponibilité du modèle (échéance {ready_timeout} s)...")
+    readiness = wait_until_ready(HTTP_CLIENT, MODEL_URL, deadline=ready_timeout)
+    print_readiness(readiness)
+    
     # Test 1: Vérification des modèles disponibles
-    models_ok = test_models_endpoint()
+    models_ok = readiness.ready and test_models_endpoint()
     
     if not models_ok:
         print("\n❌ Le modèle n'est pas accessible. Vérifiez le statut de l'InferenceService.")
         return
     
-    # Attendre un peu que le modèle soit complètement chargé
-    print("\n⏳ Attente de 10 secondes pour que le modèle soit prêt...")
-    time.sleep(10)
-    
     # Test 2: Test de chat completion
     chat_ok = test_chat_completion()
     
     # Test 3: Test de completion
     completion_ok = test_completion()
     
+    # Test 4 et 5: streaming (TTFT et latence inter-token)
+    chat_stream_ok = test_chat_completion_stream()
+    completion_stream_ok = test_completion_stream()
+    
     # Résumé des tests
     print("\n" + "=" * 60)
     print("📊 RÉSUMÉ DES TESTS")
@@ -155,11 +209,40 @@ def main():
     print(f"✅ Endpoint /v1/models: {'OK' if models_ok else 'ÉCHEC'}")
     print(f"✅ Chat completion: {'OK' if chat_ok else 'ÉCHEC'}")
     print(f"✅ Completion: {'OK' if completion_ok else 'ÉCHEC'}")
+    print(f"✅ Chat completion (streaming): {'OK' if chat_stream_ok else 'ÉCHEC'}")
+    print(f"✅ Completion (streaming): {'OK' if completion_stream_ok else 'ÉCHEC'}")
+    print_connection_stats(HTTP_CLIENT.connection_stats())
     
-    if all([models_ok, chat_ok, completion_ok]):
+    if all([models_ok, chat_ok, completion_ok, chat_stream_ok, completion_stream_ok]):
         print("\n🎉 TOUS LES TESTS SONT PASSÉS ! Le modèle Llama fonctionne parfaitement !")
     else:
         print("\n⚠️  Certains tests ont échoué. Vérifiez la configuration du modèle.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Test du modèle Llama-3.2-1B-Instruct",
+                                     epilog="--load --help affiche les options du test de charge")
+    parser.add_argument("--url", default=None, help="URL de base du modèle (défaut: LLAMA_MODEL_URL ou route OpenShift)")
+    parser.add_argument("--load", action="store_true", help="Mode test de charge asynchrone au lieu des tests unitaires")
+    parser.add_argument("--http2", action="store_true", help="Utiliser HTTP/2 (nécessite httpx[http2])")
+    parser.add_argument("--ready-timeout", type=float, default=600, help="Échéance d'attente de disponibilité du modèle (s)")
+    args, _ = parser.parse_known_args()
+    if args.load:
+        # llama_loadgen (aiohttp) n'est importé qu'en mode charge
+        from llama_loadgen import add_load_arguments, run_from_args
+        add_load_arguments(parser)
+    else:
+        parser.add_argument("--pool-size", type=int, default=10, help="Taille du pool de connexions keep-alive")
+    args = parser.parse_args()
+
+    model_url = get_model_url(args.url)
+    if not model_url:
+        print("❌ Variable OPENSHIFT_CLUSTER_DOMAIN non définie dans .env")
+        print("Configurez votre fichier .env avec le bon domaine de cluster (ou LLAMA_MODEL_URL / --url)")
+        exit(1)
+    configure_endpoints(model_url)
+
+    if args.load:
+        run_from_args(args, MODEL_URL)
+    else:
+        with PooledHTTPClient(pool_size=args.pool_size, http2=args.http2) as HTTP_CLIENT:
+            main(args.ready_timeout)
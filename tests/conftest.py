@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Les modules RAG s'importent par leur nom, comme depuis llamastack/rag
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "llamastack", "rag")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,30 @@
+from keyword_index import reciprocal_rank_fusion
+from prompt_assembly import PromptAssembler
+from vector_store import chunk_key
+
+# Chunks insérés par le rag_tool LlamaStack: document_id sans chunk_index
+RAG_TOOL_CHUNKS = [
+    {"content": "La franchise reste à la charge de l'assuré.", "metadata": {"document_id": "contrat.pdf"}},
+    {"content": "Le vol est couvert après effraction.", "metadata": {"document_id": "contrat.pdf"}},
+]
+
+
+def test_same_document_chunks_without_index_have_distinct_keys():
+    assert chunk_key(RAG_TOOL_CHUNKS[0]) != chunk_key(RAG_TOOL_CHUNKS[1])
+
+
+def test_order_chunks_keeps_same_document_chunks_without_index():
+    ordered = PromptAssembler("Instructions").order_chunks(RAG_TOOL_CHUNKS)
+    assert sorted(c["content"] for c in ordered) == sorted(c["content"] for c in RAG_TOOL_CHUNKS)
+
+
+def test_rrf_keeps_same_document_chunks_without_index():
+    fused = reciprocal_rank_fusion([RAG_TOOL_CHUNKS, RAG_TOOL_CHUNKS[::-1]])
+    assert len(fused) == 2
+
+
+def test_chunk_id_then_position():
+    with_id = {"content": "a", "metadata": {"document_id": "d", "chunk_index": 3, "chunk_id": "d:abc:3"}}
+    with_index = {"content": "a", "metadata": {"document_id": "d", "chunk_index": 3}}
+    assert chunk_key(with_id) == "d:abc:3"
+    assert chunk_key(with_index) == "d#000003"
@@ -0,0 +1,28 @@
+import asyncio
+import json
+from argparse import Namespace
+
+from llama_bulk import run_bulk
+from llama_stub_server import LatencyModel, StubServer
+
+
+def bulk_args(input_path, output_path):
+    return Namespace(input=str(input_path), output=str(output_path), max_tokens=8, temperature=0.0,
+                     initial_concurrency=2, min_concurrency=1, max_concurrency=4, latency_tolerance=2.0,
+                     max_retries=1, timeout=10.0, limit=None, progress_interval=60.0)
+
+
+def test_resume_from_truncated_output(tmp_path):
+    input_path = tmp_path / "prompts.jsonl"
+    output_path = tmp_path / "resultats.jsonl"
+    input_path.write_text("".join(json.dumps({"id": i, "prompt": f"Question {i}"}) + "\n" for i in ("ok", "trunc", "new")))
+    # Arrêt brutal pendant l'écriture de la ligne "trunc"
+    done = {"id": "ok", "output": "texte", "error": None, "latency_s": 0.01, "usage": None}
+    output_path.write_text(json.dumps(done) + "\n" + '{"id": "trunc')
+
+    with StubServer(LatencyModel(base_ms=1.0, decode_ms_per_token=0.1)) as server:
+        summary = asyncio.run(run_bulk(server.url, bulk_args(input_path, output_path)))
+
+    rows = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert summary["skipped"] == 1 and summary["ok"] == 2
+    assert sorted(row["id"] for row in rows) == ["new", "ok", "trunc"]
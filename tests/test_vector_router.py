@@ -0,0 +1,25 @@
+from vector_router import VectorRouter
+
+COLLECTIONS = ("assurance_fr_milvus_db", "assurance_milvus_db")
+
+
+class _Retriever:
+    def __init__(self, vector_db_id):
+        self.vector_db_id = vector_db_id
+
+    def query(self, question, k=5):
+        # Même document et mêmes positions dans les deux bases
+        return [{"content": f"{self.vector_db_id} {i}", "score": 10.0 - i,
+                 "metadata": {"document_id": "guide.pdf", "chunk_index": i}} for i in range(k)]
+
+
+class _Router(VectorRouter):
+    def _catalog(self):
+        return {db_id: {} for db_id in COLLECTIONS}
+
+
+def test_multi_collection_fusion_keeps_each_collection_hit():
+    router = _Router(client=None, retriever_factory=_Retriever)
+    results = router.query("On a eu un vol, que faire ?", k=4, vector_db_ids=list(COLLECTIONS))
+    assert len(results) == 4
+    assert {r["vector_db_id"] for r in results} == set(COLLECTIONS)